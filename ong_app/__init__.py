@@ -3,6 +3,12 @@ import os
 from flask import Flask
 import logging
 
+from .odoo_connector import release_odoo_client
+from .stock_jobs import init_stock_jobs
+from .odoo_refdata import start_reference_data_warm_up
+from .book_search import init_book_search
+from .odoo_mirror import init_odoo_mirror
+
 # Import blueprints from other files Comment translated
 from .routes_main import main_bp
 from .routes_books import books_bp
@@ -19,8 +25,30 @@ def create_app(test_config=None):
 
     # Default configuration Comment translated
     app.config.from_mapping(
-        SECRET_KEY=os.environ.get('SECRET_KEY', 'dev_secret_key_change_this_later!') # Default kept in English
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'dev_secret_key_change_this_later!'), # Default kept in English
+        # Initial-stock receipts run in background workers (see stock_jobs.py)
+        STOCK_JOBS_ENABLED=os.environ.get('STOCK_JOBS_ENABLED', '1') == '1',
+        STOCK_JOBS_DB=os.path.join(app.instance_path, 'stock_jobs.sqlite3'),
+        STOCK_JOBS_WORKERS=int(os.environ.get('STOCK_JOBS_WORKERS', 2)),
+        STOCK_JOBS_MAX_ATTEMPTS=int(os.environ.get('STOCK_JOBS_MAX_ATTEMPTS', 5)),
+        # Seconds without a heartbeat before a running job counts as abandoned
+        STOCK_JOBS_LEASE=int(os.environ.get('STOCK_JOBS_LEASE', 300)),
+        # Load tags/locations/picking types/UoM into the reference-data cache at start-up (see odoo_refdata.py)
+        ODOO_REFDATA_WARM_UP=os.environ.get('ODOO_REFDATA_WARM_UP', '1') == '1',
+        # Local full-text index of the catalogue, synced by write_date polling (see book_search.py)
+        BOOK_SEARCH_ENABLED=os.environ.get('BOOK_SEARCH_ENABLED', '1') == '1',
+        BOOK_SEARCH_DB=os.path.join(app.instance_path, 'book_search.sqlite3'),
+        BOOK_SEARCH_SYNC_INTERVAL=int(os.environ.get('BOOK_SEARCH_SYNC_INTERVAL', 30)),
+        # Local read mirror of products/partners/pickings/sale orders for the list views (see odoo_mirror.py)
+        ODOO_MIRROR_ENABLED=os.environ.get('ODOO_MIRROR_ENABLED', '1') == '1',
+        ODOO_MIRROR_DB=os.path.join(app.instance_path, 'odoo_mirror.sqlite3'),
+        ODOO_MIRROR_SYNC_INTERVAL=int(os.environ.get('ODOO_MIRROR_SYNC_INTERVAL', 15)),
+        ODOO_MIRROR_MAX_LAG=int(os.environ.get('ODOO_MIRROR_MAX_LAG', 120)),
+        # LC_COLLATE of the Odoo database (postgres image default), so mirrored pages sort like Odoo's
+        ODOO_MIRROR_COLLATION=os.environ.get('ODOO_MIRROR_COLLATION', 'en_US.UTF-8'),
     )
+    if test_config:
+        app.config.from_mapping(test_config)
 
     # Ensure the 'instance' folder exists Comment translated
     try:
@@ -34,6 +62,9 @@ def create_app(test_config=None):
     # Log message translated
     logging.info("Flask application created (create_app start).")
 
+    # Return the pooled Odoo client taken by each request
+    app.teardown_appcontext(release_odoo_client)
+
     # --- Register Blueprints (with detailed logs) --- Comment translated
     try:
         # Log message translated
@@ -65,6 +96,28 @@ def create_app(test_config=None):
         # Log message translated
         logging.error(f"FATAL ERROR REGISTERING BLUEPRINT!!!: {e}", exc_info=True)
 
+    # Background queue for initial-stock receipts (needs the instance folder)
+    try:
+        init_stock_jobs(app)
+    except Exception as e:
+        logging.error(f"Could not start the stock job queue, initial stock will run inline: {e}", exc_info=True)
+
+    # Local book search index (needs the instance folder)
+    try:
+        init_book_search(app)
+    except Exception as e:
+        logging.error(f"Could not start the local book search index: {e}", exc_info=True)
+
+    # Local read mirror for the list views (needs the instance folder)
+    try:
+        init_odoo_mirror(app)
+    except Exception as e:
+        logging.error(f"Could not start the local Odoo mirror, list views will read from Odoo: {e}", exc_info=True)
+
+    # Reference-data cache warm-up (background thread, start-up never waits for Odoo)
+    if app.config.get('ODOO_REFDATA_WARM_UP'):
+        start_reference_data_warm_up()
+
     # Optional test route Comment translated
     @app.route('/hello-init')
     def hello():
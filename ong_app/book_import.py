@@ -0,0 +1,371 @@
+# ong_app/book_import.py
+"""
+Bulk book import (CSV or JSON upload).
+
+The upload is read row by row (never loaded whole in memory) and processed in
+chunks: one duplicate search per chunk, one multi-record create per chunk,
+and at the end ONE multi-line receipt picking with the initial stock of every
+created book. If the file turns out to be unreadable halfway (bad encoding,
+broken JSON line), the rows read before are still imported and stocked, and
+the report says where reading stopped.
+
+Accepted columns / keys: title (mandatory), author, isbn, donor_id, quantity.
+"""
+import csv
+import io
+import json
+import logging
+
+from odoorpc.error import RPCError
+
+from .odoo_batch import RpcBatch, StepTimer
+from .odoo_inventory_utils import add_initial_stock_bulk_via_receipt
+
+# Rows per duplicate search + create call
+IMPORT_CHUNK_SIZE = 200
+# Characters read from the upload at a time when streaming JSON
+JSON_READ_SIZE = 64 * 1024
+
+# Row outcomes shown in the import report
+ROW_CREATED = 'created'
+ROW_DUPLICATE = 'duplicate'
+ROW_INVALID = 'invalid'
+ROW_ERROR = 'error'
+
+
+class BookImportError(ValueError):
+    """The uploaded file cannot be read (unknown format, broken JSON...)."""
+
+
+def open_upload_text(file_storage):
+    """
+    Text stream over an uploaded file, decoded as UTF-8 without reading it all.
+
+    Werkzeug spools uploads into a SpooledTemporaryFile, which only implements
+    readable()/seekable() from Python 3.11 on; TextIOWrapper needs them, so on
+    older versions (the Docker image runs 3.10) the file object it spools into
+    is wrapped instead.
+
+    :param file_storage: werkzeug FileStorage from request.files.
+    """
+    stream = file_storage.stream
+    if not hasattr(stream, 'readable'):
+        stream = getattr(stream, '_file', stream)
+    # utf-8-sig drops the BOM that spreadsheet exports usually add
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+# What to do after a read error, when importing the corrected file again is safe
+RETRY_WHOLE_FILE_HINT = "fix the file and import it again (rows already imported are reported as duplicates)"
+
+
+def iter_until_read_error(rows, report, log_prefix, retry_hint=RETRY_WHOLE_FILE_HINT):
+    """
+    Yields the rows of an upload until reading fails; the error is stored in
+    report['read_error'] instead of being raised, so the caller can finish
+    the work of the rows already read (stock, confirmation...).
+
+    Only errors of the reading itself are caught: decoding (UnicodeDecodeError),
+    parsing (BookImportError and the other import errors, csv.Error).
+
+    :param rows: Iterable of (row_number, raw_row_dict).
+    :param report: Import report dict receiving 'read_error'.
+    :param log_prefix: Prefix of the log message (e.g. '[book_import]').
+    :param retry_hint: End of the message, telling how to import the rest.
+    """
+    row_number = None
+    try:
+        for row_number, raw_row in rows:
+            yield row_number, raw_row
+    except (ValueError, csv.Error) as e:
+        detail = 'it must be UTF-8 encoded' if isinstance(e, UnicodeDecodeError) else str(e)
+        where = f" after row {row_number}" if row_number else ''
+        logging.warning(f"{log_prefix} Reading the upload stopped{where}: {e}")
+        report['read_error'] = (f"Could not read the rest of the file{where}: {detail}. "
+                                f"The rows before were processed; {retry_hint}.")
+
+
+def iter_import_rows(file_storage):
+    """
+    Yields (row_number, raw_row_dict) from an uploaded file, streaming it.
+
+    :param file_storage: werkzeug FileStorage from request.files.
+    :raises BookImportError: If the extension is not .csv, .json or .jsonl.
+    """
+    filename = (file_storage.filename or '').lower()
+    text_stream = open_upload_text(file_storage)
+    if filename.endswith('.csv'):
+        return _iter_csv_rows(text_stream)
+    if filename.endswith(('.json', '.jsonl', '.ndjson')):
+        return _iter_json_rows(text_stream)
+    raise BookImportError(f"Unsupported file type '{file_storage.filename}'. Use .csv, .json or .jsonl.")
+
+
+def _iter_csv_rows(text_stream):
+    reader = csv.DictReader(text_stream)
+    # Row 1 is the header, so data rows start at 2 (as in a spreadsheet)
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, row
+
+
+def _iter_json_rows(text_stream):
+    """Accepts a JSON array of objects or JSON Lines (one object per line), decoded incrementally."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    in_array = False
+    row_number = 0
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith('[') and not in_array and row_number == 0:
+            buffer = buffer[1:]
+            in_array = True
+            continue
+        if in_array and buffer.startswith(']'):
+            return
+        if buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise BookImportError(f"Invalid JSON after row {row_number}: {e}")
+            else:
+                buffer = buffer[end:]
+                row_number += 1
+                yield row_number, obj
+                continue
+        elif eof:
+            return
+        # Object incomplete (or buffer empty): read more of the upload
+        chunk = text_stream.read(JSON_READ_SIZE)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _normalize_row(raw_row, default_quantity):
+    """
+    Returns (row, error). row has title/author/isbn/donor_id/quantity.
+    Column names are case-insensitive.
+    """
+    if not isinstance(raw_row, dict):
+        return None, "Row is not an object with columns."
+    data = {_clean(key).lower(): value for key, value in raw_row.items() if key is not None}
+
+    title = _clean(data.get('title'))
+    if not title:
+        return None, "Book title is mandatory."
+
+    donor_id = None
+    donor_value = _clean(data.get('donor_id'))
+    if donor_value:
+        try:
+            donor_id = int(donor_value)
+        except ValueError:
+            return None, f"Donor ID '{donor_value}' invalid."
+
+    quantity = default_quantity
+    quantity_value = _clean(data.get('quantity'))
+    if quantity_value:
+        try:
+            quantity = float(quantity_value)
+        except ValueError:
+            return None, f"Quantity '{quantity_value}' invalid."
+        if quantity <= 0:
+            return None, "Quantity must be greater than 0."
+
+    row = {
+        'title': title,
+        'author': _clean(data.get('author')),
+        'isbn': _clean(data.get('isbn')),
+        'donor_id': donor_id,
+        'quantity': quantity,
+    }
+    return row, None
+
+
+def import_book_rows(client, rows, target_location_id, pending_tag_id, default_quantity=1.0,
+                     chunk_size=IMPORT_CHUNK_SIZE, timer=None):
+    """
+    Creates the books of an import and registers their initial stock in one receipt.
+
+    :param client: Connected odoorpc client instance.
+    :param rows: Iterable of (row_number, raw_row_dict), e.g. from iter_import_rows().
+    :param target_location_id: ID of the internal stock.location receiving the books.
+    :param pending_tag_id: Tag set on every created book (product_tag_ids).
+    :param default_quantity: Initial stock when a row has no quantity.
+    :param chunk_size: Rows per duplicate search + create call.
+    :param timer: Optional StepTimer collecting per-step timings.
+    :return: Report dict: 'rows' (row_number, title, isbn, status, message, product_id),
+             'counts' per status, 'picking_id', 'stock_error' and 'read_error'
+             (the file could not be read to the end).
+    """
+    if timer is None:
+        timer = StepTimer('import_books')
+
+    report = {
+        'rows': [],
+        'counts': {ROW_CREATED: 0, ROW_DUPLICATE: 0, ROW_INVALID: 0, ROW_ERROR: 0},
+        'picking_id': None,
+        'stock_error': None,
+        'read_error': None,
+    }
+    # Book key (ISBN, or title when there is none) -> first row number in the file
+    seen_keys = {}
+    donor_names = {}
+    stock_lines = []
+    chunk = []
+
+    def add_result(row_number, title, isbn, status, message='', product_id=None):
+        report['rows'].append({'row_number': row_number, 'title': title, 'isbn': isbn,
+                               'status': status, 'message': message, 'product_id': product_id})
+        report['counts'][status] += 1
+
+    # A read error stops the loop, but the rows read so far are still created and stocked
+    for row_number, raw_row in iter_until_read_error(rows, report, '[book_import]'):
+        row, error = _normalize_row(raw_row, default_quantity)
+        if error:
+            title = ''
+            if isinstance(raw_row, dict):
+                title = next((_clean(v) for k, v in raw_row.items() if _clean(k).lower() == 'title'), '')
+            add_result(row_number, title, '', ROW_INVALID, error)
+            continue
+
+        key = ('isbn', row['isbn']) if row['isbn'] else ('title', row['title'])
+        if key in seen_keys:
+            add_result(row_number, row['title'], row['isbn'], ROW_DUPLICATE,
+                       f"Repeated in the file (row {seen_keys[key]}).")
+            continue
+        seen_keys[key] = row_number
+
+        row['row_number'] = row_number
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _import_chunk(client, chunk, pending_tag_id, donor_names, stock_lines, add_result, timer)
+            chunk = []
+    if chunk:
+        _import_chunk(client, chunk, pending_tag_id, donor_names, stock_lines, add_result, timer)
+
+    # ONE receipt picking for the initial stock of every created book
+    if stock_lines:
+        # Log message translated
+        logging.info(f"[book_import] Registering initial stock of {len(stock_lines)} book(s) in a single receipt...")
+        picking_id = add_initial_stock_bulk_via_receipt(
+            client, stock_lines, target_location_id, timer=timer,
+            origin=f'Bulk Book Import (Flask): {len(stock_lines)} book(s)',
+        )
+        if picking_id:
+            report['picking_id'] = picking_id
+        else:
+            report['stock_error'] = "The books were created, but THERE WAS A PROBLEM registering the initial stock. Check logs and Odoo."
+
+    # Chunks report their rows late: show them in file order
+    report['rows'].sort(key=lambda result: result['row_number'])
+    logging.info(f"[book_import] Finished: {report['counts']}, receipt picking {report['picking_id']}")
+    return report
+
+
+def _import_chunk(client, chunk, pending_tag_id, donor_names, stock_lines, add_result, timer):
+    """Duplicate check + multi-record create for one chunk of valid rows."""
+    isbns = [row['isbn'] for row in chunk if row['isbn']]
+    titles = [row['title'] for row in chunk if not row['isbn']]
+    new_donor_ids = sorted({row['donor_id'] for row in chunk if row['donor_id'] is not None} - set(donor_names))
+
+    # Independent reads in ONE parallel round-trip
+    prefetch = RpcBatch(client, timer=timer, label=f'import chunk prefetch ({len(chunk)} rows)')
+    if isbns:
+        prefetch.add_kw('by_isbn', 'product.product', 'search_read',
+                        [[('default_code', 'in', isbns)]], {'fields': ['default_code']})
+    if titles:
+        prefetch.add_kw('by_title', 'product.product', 'search_read',
+                        [[('name', 'in', titles)]], {'fields': ['name']})
+    if new_donor_ids:
+        prefetch.add_kw('donors', 'res.partner', 'read', [new_donor_ids], {'fields': ['name']})
+    prefetch.run()
+
+    try:
+        existing_isbns = {p['default_code']: p['id'] for p in prefetch.result('by_isbn')} if isbns else {}
+        existing_titles = {p['name']: p['id'] for p in prefetch.result('by_title')} if titles else {}
+        if new_donor_ids:
+            for donor in prefetch.result('donors'):
+                donor_names[donor['id']] = donor['name']
+    except Exception as e:
+        # Log message translated
+        logging.error(f"[book_import] Error searching duplicates/donors for a chunk: {e}", exc_info=True)
+        for row in chunk:
+            add_result(row['row_number'], row['title'], row['isbn'], ROW_ERROR, f"Error checking duplicates: {e}")
+        return
+
+    to_create = []
+    for row in chunk:
+        existing_id = existing_isbns.get(row['isbn']) if row['isbn'] else existing_titles.get(row['title'])
+        if existing_id:
+            add_result(row['row_number'], row['title'], row['isbn'], ROW_DUPLICATE,
+                       "Already exists in Odoo. Duplicate not created.", existing_id)
+            continue
+        if row['donor_id'] is not None and row['donor_id'] not in donor_names:
+            add_result(row['row_number'], row['title'], row['isbn'], ROW_INVALID,
+                       f"Donor ID {row['donor_id']} not found.")
+            continue
+        to_create.append(row)
+
+    if not to_create:
+        return
+
+    vals_list = [_book_product_vals(row, donor_names, pending_tag_id) for row in to_create]
+    try:
+        # Multi-record create: one RPC for the whole chunk (product_tag_ids included)
+        with timer.step(f'create {len(vals_list)} products'):
+            new_ids = client.execute_kw('product.product', 'create', [vals_list])
+    except RPCError as e:
+        # Log message translated
+        logging.error(f"[book_import] RPC Error creating {len(vals_list)} books: {e}", exc_info=True)
+        for row in to_create:
+            add_result(row['row_number'], row['title'], row['isbn'], ROW_ERROR, f"Odoo RPC Error creating book: {e}")
+        return
+    except Exception as e:
+        logging.error(f"[book_import] Unexpected error creating {len(vals_list)} books: {e}", exc_info=True)
+        for row in to_create:
+            add_result(row['row_number'], row['title'], row['isbn'], ROW_ERROR, f"Unexpected error creating book: {e}")
+        return
+
+    if not isinstance(new_ids, list):
+        new_ids = [new_ids]
+    for row, vals, new_id in zip(to_create, vals_list, new_ids):
+        add_result(row['row_number'], row['title'], row['isbn'], ROW_CREATED, "Created and marked Pending.", new_id)
+        stock_lines.append({
+            'product_id': new_id,
+            'quantity': row['quantity'],
+            'product_uom_id': vals['uom_id'],
+            # Odoo's display_name is "[ISBN] Title" when an internal reference exists
+            'name': f"[{row['isbn']}] {row['title']}" if row['isbn'] else row['title'],
+        })
+
+
+def _book_product_vals(row, donor_names, pending_tag_id):
+    """Same product values as the single-book form (add_book_submit)."""
+    description_parts = []
+    if row['author']:
+        description_parts.append(f"Author: {row['author']}")
+    if row['donor_id'] is not None:
+        description_parts.append(f"Donor: {donor_names[row['donor_id']]} (ID: {row['donor_id']})")
+    return {
+        'name': row['title'],
+        'default_code': row['isbn'] or False,
+        'description_sale': ". ".join(description_parts) if description_parts else False,
+        'standard_price': 0.0,
+        'list_price': 1.0,
+        'type': 'product',
+        'categ_id': 1,
+        'uom_id': 1,
+        'uom_po_id': 1,
+        'sale_ok': False,
+        'purchase_ok': False,
+        'product_tag_ids': [(4, pending_tag_id)],
+    }
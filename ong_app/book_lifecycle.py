@@ -0,0 +1,172 @@
+# ong_app/book_lifecycle.py
+"""
+Workflow of a donated book, defined once.
+
+A book's state is the workflow tag (product.tag) of its product template:
+
+    pending --approve--> approved --ready--> ready --transit_ec/ve--> in_transit_* --deliver--> delivered
+    pending/approved --reject--> rejected
+    approved --ship--> (no workflow tag: the book is in a batch shipment)
+
+For every transition and every state it can start from, the Many2many
+commands are compiled at import time: one (3, tag) for the tag the book
+really has plus (4, target tag). Applying a transition to any number of
+books is then one read (current tags) and one write per distinct command
+list.
+"""
+import logging
+
+from .dashboard import invalidate_tag_counts
+from .odoo_context import forget_records, odoo_model, read_records
+
+# State -> product.tag ID
+STATES = {
+    'pending': 4,
+    'approved': 5,
+    'rejected': 6,
+    'ready': 7,
+    # Generic 'In Transit' tag, still accepted as a source of 'deliver'
+    'in_transit': 8,
+    'delivered': 9,
+    'in_transit_ec': 10,
+    'in_transit_ve': 11,
+}
+TAG_STATES = {tag_id: state for state, tag_id in STATES.items()}
+
+# States shown in the shipping pipeline (ready, in transit, delivered)
+LOGISTICS_STATES = ('ready', 'in_transit_ec', 'in_transit_ve', 'delivered', 'in_transit')
+IN_TRANSIT_STATES = ('in_transit', 'in_transit_ec', 'in_transit_ve')
+
+# product.product fields needed to know a book's state and update it
+STATE_FIELDS = ['product_tmpl_id', 'name', 'product_tag_ids']
+
+
+class Transition:
+    """
+    One workflow step.
+
+    :param name: Transition name used by routes and the bulk API.
+    :param sources: States the book may be in.
+    :param target: State reached, or None to only drop the source tag.
+    :param label: Past-tense text for messages ("approved", "marked as Delivered"...).
+    """
+
+    def __init__(self, name, sources, target, label):
+        self.name = name
+        self.sources = tuple(sources)
+        self.target = target
+        self.label = label
+        # Compiled once: for each source state, unlink its tag and link the target
+        self.link = ((4, STATES[target]),) if target else ()
+        self.plans = {source: ((3, STATES[source]),) + self.link for source in self.sources}
+
+    def commands_for(self, current_states):
+        """
+        Commands moving a book in current_states (its workflow states, usually
+        one) through this transition; None if it is not in a source state.
+        """
+        sources = [state for state in self.sources if state in current_states]
+        if not sources:
+            return None
+        if len(sources) == 1:
+            return self.plans[sources[0]]
+        # Several source tags at once (inconsistent data): unlink all of them
+        return tuple((3, STATES[source]) for source in sources) + self.link
+
+
+TRANSITIONS = {transition.name: transition for transition in (
+    Transition('approve', ['pending'], 'approved', 'approved'),
+    Transition('reject', ['pending', 'approved'], 'rejected', 'rejected'),
+    Transition('ready', ['approved'], 'ready', 'marked as Ready for Shipment'),
+    Transition('transit', ['ready'], 'in_transit', 'marked as In Transit'),
+    Transition('transit_ec', ['ready'], 'in_transit_ec', 'marked as In Transit'),
+    Transition('transit_ve', ['ready'], 'in_transit_ve', 'marked as In Transit'),
+    Transition('deliver', IN_TRANSIT_STATES, 'delivered', 'marked as Delivered'),
+    Transition('ship', ['approved'], None, 'added to a batch shipment'),
+)}
+
+
+def book_states(record):
+    """Workflow states of a product.product record read with STATE_FIELDS."""
+    return [TAG_STATES[tag_id] for tag_id in record.get('product_tag_ids') or [] if tag_id in TAG_STATES]
+
+
+def state_label(states):
+    """Readable list of states for messages ("In Transit Ec, ...")."""
+    return ', '.join(state.replace('_', ' ').title() for state in states) or 'no workflow state'
+
+
+class TransitionResult:
+    """
+    Outcome of apply_transition, per book.
+
+    updated: [(product_id, name)] written; unchanged: already in the target
+    state; invalid: [(product_id, name, states)] not in a source state;
+    not_found: product IDs without product/template.
+    """
+
+    def __init__(self, transition):
+        self.transition = transition
+        self.updated = []
+        self.unchanged = []
+        self.invalid = []
+        self.not_found = []
+
+
+def plan_transition(transition, records):
+    """
+    Groups books by the exact commands they need.
+
+    :param transition: Transition
+    :param records: product.product records read with STATE_FIELDS.
+    :return: ({commands: [template IDs]}, TransitionResult without not_found)
+    """
+    result = TransitionResult(transition)
+    writes = {}
+    for record in records:
+        name = record.get('name') or f"ID {record['id']}"
+        states = book_states(record)
+        if transition.target and transition.target in states:
+            result.unchanged.append((record['id'], name))
+            continue
+        commands = transition.commands_for(states)
+        if commands is None:
+            result.invalid.append((record['id'], name, states))
+            continue
+        template_ids = writes.setdefault(commands, [])
+        if record['product_tmpl_id'][0] not in template_ids:
+            template_ids.append(record['product_tmpl_id'][0])
+        result.updated.append((record['id'], name))
+    return writes, result
+
+
+def apply_transition(product_ids, transition_name):
+    """
+    Moves books through a transition with the request's Odoo client: ONE read
+    of their current tags, then one write per distinct command list.
+
+    :param product_ids: product.product IDs.
+    :param transition_name: Key of TRANSITIONS.
+    :return: TransitionResult
+    :raises KeyError: Unknown transition.
+    """
+    transition = TRANSITIONS[transition_name]
+    if isinstance(product_ids, int):
+        product_ids = [product_ids]
+    records = [record for record in read_records('product.product', product_ids, STATE_FIELDS)
+               if record.get('product_tmpl_id')]
+    writes, result = plan_transition(transition, records)
+    found_ids = {record['id'] for record in records}
+    result.not_found = [product_id for product_id in product_ids if product_id not in found_ids]
+
+    TemplateModel = odoo_model('product.template')
+    for commands, template_ids in writes.items():
+        logging.info(f"[book_lifecycle] '{transition.name}': writing {list(commands)} on template(s) {template_ids}.")
+        TemplateModel.write(template_ids, {'product_tag_ids': list(commands)})
+    # Tags changed: a later read in this request must see the new state, and so must the home page counts
+    forget_records('product.product', [product_id for product_id, _ in result.updated])
+    if writes:
+        invalidate_tag_counts()
+    logging.info(f"[book_lifecycle] '{transition.name}': {len(result.updated)} updated, {len(result.unchanged)} unchanged,"
+                 f" {len(result.invalid)} in another state, {len(result.not_found)} not found.")
+    return result
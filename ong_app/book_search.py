@@ -0,0 +1,295 @@
+# ong_app/book_search.py
+"""
+Local full-text search index of the book catalogue.
+
+product.product name, default_code (ISBN) and description_sale (author/donor
+text) are copied into a SQLite FTS5 table, so searching never touches Odoo.
+A daemon thread keeps the copy in sync by polling Odoo for products (and
+product templates) whose write_date changed since the last poll; archived
+products are removed and, from time to time, products deleted in Odoo are
+pruned.
+
+If the local SQLite has no FTS5 support, a plain LIKE search over the same
+table is used instead.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+
+from .odoo_batch import iter_changed_records
+from .odoo_connector import odoo_session
+
+# Products read from Odoo per search_read while syncing
+SYNC_BATCH_SIZE = 1000
+# Seconds between two checks for products deleted in Odoo
+PRUNE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    default_code TEXT,
+    description_sale TEXT,
+    write_date TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    name, default_code, description_sale,
+    content='books', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+_SYNC_FIELDS = ['id', 'name', 'default_code', 'description_sale', 'write_date', 'active']
+
+
+class BookSearchIndex:
+    """
+    SQLite copy of the catalogue with an FTS5 index.
+
+    :param db_path: Path of the SQLite file (created if missing).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+            try:
+                conn.executescript(_FTS_SCHEMA)
+                self.fts_enabled = True
+            except sqlite3.OperationalError as e:
+                logging.warning(f"[book_search] FTS5 not available in this SQLite ({e}). Falling back to LIKE search.")
+                self.fts_enabled = False
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # --- Sync state ---
+
+    def get_state(self, key, default=None):
+        with self._connection() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_state(self, key, value):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def count(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    # --- Writes ---
+
+    def apply(self, records):
+        """Upserts active records and removes archived ones, in one transaction."""
+        if not records:
+            return
+        with self._connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                ids = [record['id'] for record in records]
+                self._delete(conn, ids)
+                rows = [
+                    (record['id'], record['name'] or '', record['default_code'] or None,
+                     record['description_sale'] or None, record['write_date'])
+                    for record in records if record.get('active', True)
+                ]
+                conn.executemany(
+                    "INSERT INTO books (id, name, default_code, description_sale, write_date) VALUES (?, ?, ?, ?, ?)",
+                    rows)
+                if self.fts_enabled:
+                    conn.executemany(
+                        "INSERT INTO books_fts (rowid, name, default_code, description_sale) VALUES (?, ?, ?, ?)",
+                        [row[:4] for row in rows])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def remove_missing(self, existing_ids):
+        """Deletes the books whose ID is not in existing_ids. Returns how many were removed."""
+        existing_ids = set(existing_ids)
+        with self._connection() as conn:
+            indexed_ids = [row[0] for row in conn.execute("SELECT id FROM books")]
+            missing = [book_id for book_id in indexed_ids if book_id not in existing_ids]
+            if missing:
+                conn.execute("BEGIN")
+                self._delete(conn, missing)
+                conn.execute("COMMIT")
+        return len(missing)
+
+    def _delete(self, conn, ids):
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            if self.fts_enabled:
+                # External-content FTS5 tables need the old values to remove their tokens
+                conn.execute(
+                    "INSERT INTO books_fts (books_fts, rowid, name, default_code, description_sale)"
+                    f" SELECT 'delete', id, name, default_code, description_sale FROM books WHERE id IN ({placeholders})",
+                    chunk)
+            conn.execute(f"DELETE FROM books WHERE id IN ({placeholders})", chunk)
+
+    # --- Reads ---
+
+    def search(self, query, limit=50):
+        """
+        Books matching every word of query (prefix match), best matches first.
+
+        :param query: Free text typed by the volunteer (title, ISBN, author, donor...).
+        :param limit: Maximum number of results.
+        :return: List of dicts (id, name, default_code, description_sale).
+        """
+        words = re.findall(r'\w+', query or '')
+        if not words:
+            return []
+        with self._connection() as conn:
+            if self.fts_enabled:
+                # Each word quoted (no FTS syntax injection) and prefix-matched
+                match = " ".join(f'"{word}"*' for word in words)
+                rows = conn.execute(
+                    "SELECT b.id, b.name, b.default_code, b.description_sale FROM books_fts"
+                    " JOIN books b ON b.id = books_fts.rowid"
+                    " WHERE books_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (match, limit)).fetchall()
+            else:
+                conditions = " AND ".join(
+                    "(name LIKE ? OR default_code LIKE ? OR description_sale LIKE ?)" for _ in words)
+                params = []
+                for word in words:
+                    params += [f"%{word}%"] * 3
+                rows = conn.execute(
+                    f"SELECT id, name, default_code, description_sale FROM books WHERE {conditions}"
+                    " ORDER BY name LIMIT ?",
+                    (*params, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+
+def sync_book_index(index, client):
+    """
+    Copies the products changed since the last sync into the index.
+
+    Uses write_date >= last seen write_date (upserts are idempotent, so
+    records written in that same second are simply re-read). name and
+    description_sale are stored on product.template, and editing them does
+    not touch the variant's write_date: the variants of the templates written
+    since the last sync are re-read as well.
+
+    :return: Number of product records read from Odoo.
+    """
+    last_write_date = index.get_state('last_write_date')
+    domain = [('write_date', '>=', last_write_date)] if last_write_date else []
+    total = 0
+    newest = last_write_date
+    for records in iter_changed_records(client, 'product.product', domain, _SYNC_FIELDS, batch_size=SYNC_BATCH_SIZE):
+        index.apply(records)
+        total += len(records)
+        newest = max(newest or '', records[-1]['write_date'])
+    if newest and newest != last_write_date:
+        index.set_state('last_write_date', newest)
+
+    last_template_write_date = index.get_state('last_template_write_date')
+    # First sync: every product was just read, templates are watched from there on
+    template_watermark = last_template_write_date or newest
+    # (nothing to watch from while the catalogue is empty)
+    if template_watermark:
+        template_newest = template_watermark
+        for templates in iter_changed_records(client, 'product.template', [('write_date', '>=', template_watermark)],
+                                       ['id', 'write_date'], batch_size=SYNC_BATCH_SIZE):
+            template_newest = max(template_newest, templates[-1]['write_date'])
+            for records in iter_changed_records(client, 'product.product',
+                                         [('product_tmpl_id', 'in', [template['id'] for template in templates])],
+                                         _SYNC_FIELDS, batch_size=SYNC_BATCH_SIZE):
+                index.apply(records)
+                total += len(records)
+        if template_newest != last_template_write_date:
+            index.set_state('last_template_write_date', template_newest)
+
+    if total:
+        logging.info(f"[book_search] {total} product(s) synced into the search index (up to write_date {newest}).")
+    return total
+
+
+def prune_book_index(index, client):
+    """Removes from the index the products deleted in Odoo (one search of IDs)."""
+    existing_ids = client.execute_kw('product.product', 'search', [[]], {'context': {'active_test': False}})
+    removed = index.remove_missing(existing_ids)
+    if removed:
+        logging.info(f"[book_search] {removed} product(s) deleted in Odoo removed from the search index.")
+    return removed
+
+
+class BookSearchSync:
+    """Daemon thread polling Odoo for changed products every interval seconds."""
+
+    def __init__(self, index, interval=30):
+        self.index = index
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._last_prune = 0.0
+
+    def start(self):
+        threading.Thread(target=self._loop, name='book-search-sync', daemon=True).start()
+        logging.info(f"[book_search] Sync thread started (every {self.interval}s).")
+
+    def notify(self):
+        """Sync right away (e.g. after books were created)."""
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            try:
+                with odoo_session() as client:
+                    if client is None:
+                        logging.warning("[book_search] No Odoo connection, search index not synced.")
+                    else:
+                        sync_book_index(self.index, client)
+                        if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                            prune_book_index(self.index, client)
+                            self._last_prune = time.monotonic()
+            except Exception as e:
+                logging.error(f"[book_search] Error syncing the search index: {e}", exc_info=True)
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+
+def init_book_search(app):
+    """Create the index (and start its sync thread) if BOOK_SEARCH_ENABLED."""
+    if not app.config.get('BOOK_SEARCH_ENABLED'):
+        logging.info("[book_search] Local book search disabled.")
+        return
+    index = BookSearchIndex(app.config['BOOK_SEARCH_DB'])
+    sync = BookSearchSync(index, interval=app.config['BOOK_SEARCH_SYNC_INTERVAL'])
+    sync.start()
+    app.extensions['book_search'] = (index, sync)
+
+
+def get_book_search_index():
+    """Return the BookSearchIndex of the current app, or None if disabled."""
+    index_and_sync = current_app.extensions.get('book_search')
+    return index_and_sync[0] if index_and_sync else None
+
+
+def notify_book_search_sync():
+    """Ask the sync thread of the current app to poll Odoo now (no-op if disabled)."""
+    index_and_sync = current_app.extensions.get('book_search')
+    if index_and_sync:
+        index_and_sync[1].notify()
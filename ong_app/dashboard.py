@@ -0,0 +1,134 @@
+# ong_app/dashboard.py
+"""
+Book counters of the home page.
+
+All tag counts come from ONE read_group over product_tag_ids (plus one
+search_count per group of tags counted together, in the same round-trip) and
+are kept for DASHBOARD_CACHE_TTL seconds. Once expired, the old counts are
+still served while a background thread fetches fresh ones, so the home page
+does not wait for Odoo except on the very first load.
+
+Code that changes workflow tags calls invalidate_tag_counts(), so the next
+home page of this process shows the new counts (other worker processes catch
+up within DASHBOARD_CACHE_TTL).
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+
+from .odoo_batch import RpcBatch
+from .odoo_connector import odoo_session
+
+# Seconds the counts are considered fresh
+DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 30))
+
+
+def fetch_tag_counts(client, tag_ids, any_of=()):
+    """
+    Number of product templates carrying each tag, in a single round-trip.
+
+    A template with two of the tags is counted under both, so a group of tags
+    that must not be summed (e.g. the in-transit tags) goes in any_of: it is
+    counted once per template carrying any of them.
+
+    :param client: Connected odoorpc client instance.
+    :param tag_ids: IDs of the product.tag records to count.
+    :param any_of: Tuples of tag IDs counted together.
+    :return: Dict {tag_id or tuple of any_of: count}, with 0 for tags without products.
+    """
+    batch = RpcBatch(client, label='tag counts')
+    batch.add_kw('tags', 'product.template', 'read_group',
+                 [[('product_tag_ids', 'in', list(tag_ids))], ['product_tag_ids'], ['product_tag_ids']],
+                 {'lazy': False})
+    for group_ids in any_of:
+        batch.add_kw(group_ids, 'product.template', 'search_count', [[('product_tag_ids', 'in', list(group_ids))]])
+    batch.run()
+    counts = {tag_id: 0 for tag_id in tag_ids}
+    for group_ids in any_of:
+        counts[group_ids] = batch.result(group_ids)
+    for group in batch.result('tags'):
+        tag = group.get('product_tag_ids')
+        # Grouping by a many2many gives one group per tag: (id, name)
+        if tag and tag[0] in counts:
+            counts[tag[0]] = group['__count']
+    return counts
+
+
+class TagCountsCache:
+    """
+    Stale-while-refresh holder of the tag counts.
+
+    :param tag_ids: Tags counted on every refresh.
+    :param ttl: Seconds before a background refresh is triggered.
+    :param any_of: Tuples of tag IDs counted together (see fetch_tag_counts).
+    """
+
+    def __init__(self, tag_ids, ttl=DASHBOARD_CACHE_TTL, any_of=()):
+        self.tag_ids = list(tag_ids)
+        self.any_of = [tuple(group_ids) for group_ids in any_of]
+        self.ttl = ttl
+        self._counts = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        _caches.add(self)
+
+    def get(self, client):
+        """
+        Returns (counts, age_in_seconds). Only the first call (nothing cached
+        yet) queries Odoo with the request's client; expired counts are
+        returned as they are and refreshed in the background.
+        """
+        with self._lock:
+            counts, fetched_at = self._counts, self._fetched_at
+        if counts is None:
+            counts = self._store(fetch_tag_counts(client, self.tag_ids, self.any_of))
+            return counts, 0.0
+        age = time.monotonic() - fetched_at
+        if age > self.ttl:
+            self._refresh_in_background()
+        return counts, age
+
+    def invalidate(self):
+        """Next get() waits for fresh counts (e.g. right after a tag change)."""
+        with self._lock:
+            self._counts = None
+
+    def _store(self, counts):
+        with self._lock:
+            self._counts = counts
+            self._fetched_at = time.monotonic()
+        return counts
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='dashboard-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with odoo_session() as client:
+                if client is None:
+                    logging.warning("[dashboard] No Odoo connection, keeping the previous counts.")
+                    return
+                self._store(fetch_tag_counts(client, self.tag_ids, self.any_of))
+                logging.info("[dashboard] Tag counts refreshed in the background.")
+        except Exception as e:
+            logging.warning(f"[dashboard] Background refresh failed, keeping the previous counts: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+# Every TagCountsCache of the process, for invalidate_tag_counts()
+_caches = weakref.WeakSet()
+
+
+def invalidate_tag_counts():
+    """Drops the cached tag counts: call after adding or changing workflow tags."""
+    for cache in list(_caches):
+        cache.invalidate()
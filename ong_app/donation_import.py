@@ -0,0 +1,379 @@
+# ong_app/donation_import.py
+"""
+Bulk monetary donation import (bank statement CSV export).
+
+The export is read row by row and processed in chunks, as the other imports:
+donors are matched in memory through the donor index (donor_id column, else
+email, else an unambiguous name), each chunk is checked for rows imported
+before with ONE search_read and its sale orders are created with ONE
+multi-record create. At the end ALL the created orders are confirmed with a
+single action_confirm on the list of IDs, together with the orders of the file
+that an earlier import left as drafts (its confirmation failed).
+
+Idempotency: every order carries an import key in client_order_ref ('BANK:'
++ the bank reference of the transaction, or a hash of date/amount/payer/
+description and of the row's rank among the identical rows of the file when
+the export has no reference). Rows whose key is already in Odoo, or whose
+bank reference is repeated in the file, are reported as duplicates, so
+importing the same statement twice creates nothing the second time.
+
+Columns (case-insensitive, first one found): date, amount, reference
+(transaction_id), donor_id, email, name (payer, counterparty), description
+(communication). Comma, semicolon and tab separated files are accepted.
+"""
+import csv
+import hashlib
+import itertools
+import logging
+import re
+from datetime import datetime
+
+from odoorpc.error import RPCError
+
+from .book_import import ROW_CREATED, ROW_DUPLICATE, ROW_ERROR, ROW_INVALID, iter_until_read_error, open_upload_text
+from .donor_index import get_donor_index, normalize, normalize_email
+from .odoo_batch import StepTimer
+
+# Rows per duplicate search + create call
+DONATION_IMPORT_CHUNK_SIZE = 200
+# Prefix of the import keys stored in sale.order.client_order_ref
+IMPORT_KEY_PREFIX = 'BANK:'
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%d.%m.%y')
+
+# Accepted column names, first one found wins
+COLUMN_ALIASES = {
+    'date': ('date', 'booking_date', 'value_date', 'transaction_date'),
+    'amount': ('amount', 'credit', 'credit_amount'),
+    'reference': ('reference', 'transaction_id', 'bank_reference', 'ref'),
+    'donor_id': ('donor_id', 'partner_id'),
+    'email': ('email', 'donor_email'),
+    'name': ('name', 'donor', 'payer', 'counterparty', 'counterparty_name'),
+    'description': ('description', 'communication', 'memo', 'details'),
+}
+
+
+class DonationImportError(ValueError):
+    """The uploaded file cannot be read (unknown format...)."""
+
+
+def iter_statement_rows(file_storage):
+    """
+    Yields (row_number, raw_row_dict) from an uploaded CSV, streaming it.
+
+    :param file_storage: werkzeug FileStorage from request.files.
+    :raises DonationImportError: If the extension is not .csv.
+    """
+    if not (file_storage.filename or '').lower().endswith('.csv'):
+        raise DonationImportError(f"Unsupported file type '{file_storage.filename}'. Use .csv.")
+    text_stream = open_upload_text(file_storage)
+    return _iter_csv_rows(text_stream)
+
+
+def _iter_csv_rows(text_stream):
+    header = text_stream.readline()
+    # Bank exports often use ';' (decimal comma) or tabs
+    delimiter = max((',', ';', '\t'), key=header.count)
+    reader = csv.DictReader(itertools.chain([header], text_stream), delimiter=delimiter)
+    # Row 1 is the header, so data rows start at 2 (as in a spreadsheet)
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, row
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def parse_amount(text):
+    """
+    Amount of a bank export: "1'234.50", "1 234,50", "1.234,50", "1,234.50", "CHF 50".
+
+    :raises ValueError: If no number can be read.
+    """
+    text = re.sub(r"[^\d,.\-]", '', text or '')
+    if ',' in text and '.' in text:
+        # The last separator is the decimal one
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '.')
+    return float(text)
+
+
+def parse_date(text):
+    """Odoo datetime string ('YYYY-MM-DD HH:MM:SS') of a bank export date. :raises ValueError:"""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    raise ValueError(text)
+
+
+def import_key(row, occurrence=1):
+    """
+    client_order_ref of a row: its bank reference, or a hash of what identifies the transaction.
+
+    :param occurrence: Rank of the row among the rows of the file with the same hashed
+                       values (two equal gifts on the same day are two donations).
+                       Ignored when the row has a bank reference.
+    """
+    if row['reference']:
+        return f"{IMPORT_KEY_PREFIX}{row['reference']}"
+    fingerprint = '|'.join([row['date'], f"{row['amount']:.2f}", normalize(row['payer']), normalize(row['description'])])
+    if occurrence > 1:
+        # The first occurrence keeps the plain hash (keys of earlier imports stay valid)
+        fingerprint = f"{fingerprint}|{occurrence}"
+    return f"{IMPORT_KEY_PREFIX}h:{hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:20]}"
+
+
+def _normalize_row(raw_row):
+    """
+    Returns (row, error). row has date, amount, reference, donor_id, email,
+    payer (name column) and description.
+    """
+    if not isinstance(raw_row, dict):
+        return None, "Row is not an object with columns."
+    data = {_clean(key).lower().replace(' ', '_'): value for key, value in raw_row.items() if key is not None}
+
+    def column(name):
+        return next((_clean(data[alias]) for alias in COLUMN_ALIASES[name] if _clean(data.get(alias))), '')
+
+    amount_text = column('amount')
+    if not amount_text:
+        return None, "Amount is mandatory."
+    try:
+        amount = parse_amount(amount_text)
+    except ValueError:
+        return None, f"Amount '{amount_text}' invalid."
+    if amount <= 0:
+        return None, "Not a donation (amount is not positive)."
+
+    date_text = column('date')
+    if not date_text:
+        return None, "Date is mandatory."
+    try:
+        date = parse_date(date_text)
+    except ValueError:
+        return None, f"Date '{date_text}' invalid."
+
+    donor_id = None
+    donor_text = column('donor_id')
+    if donor_text:
+        try:
+            donor_id = int(donor_text)
+        except ValueError:
+            return None, f"Donor ID '{donor_text}' invalid."
+
+    row = {
+        'date': date,
+        'amount': round(amount, 2),
+        'reference': column('reference'),
+        'donor_id': donor_id,
+        'email': normalize_email(column('email')),
+        'payer': column('name'),
+        'description': column('description'),
+    }
+    return row, None
+
+
+def match_donor(client, row):
+    """
+    Donor of a row from the in-memory donor index: donor_id, else email, else
+    a name shared by no other donor.
+
+    :return: (Contact or None, error message or None)
+    """
+    index = get_donor_index()
+    if row['donor_id'] is not None:
+        donor = index.get(client, row['donor_id'])
+        return (donor, None) if donor else (None, f"Donor ID {row['donor_id']} not found.")
+    if row['email']:
+        donor = index.find_by_email(client, row['email'])
+        if donor:
+            return donor, None
+    if row['payer']:
+        donors = index.find_by_name(client, row['payer'])
+        if len(donors) == 1:
+            return donors[0], None
+        if len(donors) > 1:
+            return None, f"Several donors are called '{row['payer']}': add a donor_id or email column."
+    return None, "No matching donor (register the donor first, or add a donor_id/email column)."
+
+
+def donation_order_vals(product_id, donor_id, amount, date_order, description='', donor_name='', import_ref=None):
+    """
+    sale.order values of one monetary donation (same order as the donation form).
+
+    :param product_id: ID of the "Monetary Donation" service product.
+    :param import_ref: Import key stored in client_order_ref, if any.
+    """
+    vals = {
+        'partner_id': donor_id,
+        'date_order': date_order,
+        'state': 'draft',
+        'note': description or f"Monetary donation registered from Flask application on {datetime.now().strftime('%Y-%m-%d')}.",
+        'order_line': [
+            (0, 0, {
+                'product_id': product_id,
+                'name': f"Monetary Donation - {donor_name}" if donor_name else f"Monetary Donation (Product ID: {product_id})",
+                'product_uom_qty': 1,
+                'price_unit': amount,
+                'product_uom': 1,
+            })
+        ],
+    }
+    if import_ref:
+        vals['client_order_ref'] = import_ref
+    return vals
+
+
+def import_donation_rows(client, rows, product_id, chunk_size=DONATION_IMPORT_CHUNK_SIZE, timer=None):
+    """
+    Creates the sale orders of a bank statement and confirms them all at once.
+
+    :param client: Connected odoorpc client instance.
+    :param rows: Iterable of (row_number, raw_row_dict), e.g. from iter_statement_rows().
+    :param product_id: ID of the "Monetary Donation" service product.
+    :param chunk_size: Rows per duplicate search + create call.
+    :param timer: Optional StepTimer collecting per-step timings.
+    :return: Report dict: 'rows' (row_number, date, amount, donor, status, message, order_id),
+             'counts' per status, 'total_amount' created, 'confirm_error' and 'read_error'
+             (the file could not be read to the end; the orders created before are confirmed).
+    """
+    if timer is None:
+        timer = StepTimer('import_donations')
+
+    report = {
+        'rows': [],
+        'counts': {ROW_CREATED: 0, ROW_DUPLICATE: 0, ROW_INVALID: 0, ROW_ERROR: 0},
+        'total_amount': 0.0,
+        'confirm_error': None,
+        'read_error': None,
+    }
+    # Import key -> first row number in the file
+    seen_keys = {}
+    # Hashed import key -> rows of the file with those values so far
+    occurrences = {}
+    # Orders to confirm at the end: created by this import, or drafts left by an earlier one
+    created_ids = []
+    chunk = []
+
+    def add_result(row_number, date, amount, donor, status, message='', order_id=None):
+        report['rows'].append({'row_number': row_number, 'date': date, 'amount': amount, 'donor': donor,
+                               'status': status, 'message': message, 'order_id': order_id})
+        report['counts'][status] += 1
+
+    # A read error stops the loop, but the orders created so far are still confirmed
+    for row_number, raw_row in iter_until_read_error(rows, report, '[donation_import]'):
+        row, error = _normalize_row(raw_row)
+        if error:
+            add_result(row_number, '', None, '', ROW_INVALID, error)
+            continue
+        row['key'] = import_key(row)
+        if not row['reference']:
+            occurrences[row['key']] = occurrences.get(row['key'], 0) + 1
+            row['key'] = import_key(row, occurrences[row['key']])
+        if row['key'] in seen_keys:
+            add_result(row_number, row['date'], row['amount'], row['payer'], ROW_DUPLICATE,
+                       f"Repeated in the file (row {seen_keys[row['key']]}).")
+            continue
+        seen_keys[row['key']] = row_number
+
+        donor, error = match_donor(client, row)
+        if error:
+            add_result(row_number, row['date'], row['amount'], row['payer'] or row['email'], ROW_INVALID, error)
+            continue
+        row['donor'] = donor
+        row['row_number'] = row_number
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _import_chunk(client, chunk, product_id, created_ids, report, add_result, timer)
+            chunk = []
+    if chunk:
+        _import_chunk(client, chunk, product_id, created_ids, report, add_result, timer)
+
+    # ONE confirmation for every order of the statement
+    if created_ids:
+        try:
+            with timer.step(f'action_confirm {len(created_ids)} orders'):
+                client.execute_kw('sale.order', 'action_confirm', [created_ids])
+            # Log message translated
+            logging.info(f"[donation_import] {len(created_ids)} order(s) confirmed in one call.")
+        except Exception as e:
+            # Log message translated
+            logging.error(f"[donation_import] Error confirming {len(created_ids)} orders: {e}", exc_info=True)
+            report['confirm_error'] = (f"The donations were created but could not be confirmed automatically: {e}. "
+                                       "They are still drafts in Odoo (importing the file again will not duplicate them).")
+
+    # Chunks report their rows late: show them in file order
+    report['rows'].sort(key=lambda result: result['row_number'])
+    logging.info(f"[donation_import] Finished: {report['counts']}, total {report['total_amount']:.2f}")
+    return report
+
+
+def _import_chunk(client, chunk, product_id, created_ids, report, add_result, timer):
+    """Already-imported check (one search_read) + multi-record create for one chunk of matched rows."""
+    try:
+        with timer.step(f'search {len(chunk)} import keys'):
+            existing = client.execute_kw('sale.order', 'search_read',
+                                         [[('client_order_ref', 'in', [row['key'] for row in chunk])]],
+                                         {'fields': ['client_order_ref', 'state']})
+        existing = {order['client_order_ref']: order for order in existing}
+    except Exception as e:
+        # Log message translated
+        logging.error(f"[donation_import] Error searching already imported donations for a chunk: {e}", exc_info=True)
+        for row in chunk:
+            add_result(row['row_number'], row['date'], row['amount'], row['donor'].name, ROW_ERROR,
+                       f"Error checking duplicates: {e}")
+        return
+
+    to_create = []
+    for row in chunk:
+        if row['key'] in existing:
+            order = existing[row['key']]
+            if order['state'] == 'draft':
+                # Left a draft by an import whose confirmation failed: confirmed with this one
+                created_ids.append(order['id'])
+                message = "Already imported but still a draft (same bank transaction). Not created again, confirmed now."
+            else:
+                message = "Already imported (same bank transaction). Not created again."
+            add_result(row['row_number'], row['date'], row['amount'], row['donor'].name, ROW_DUPLICATE,
+                       message, order['id'])
+            continue
+        to_create.append(row)
+
+    if not to_create:
+        return
+
+    vals_list = [donation_order_vals(product_id, row['donor'].id, row['amount'], row['date'],
+                                     row['description'], row['donor'].name, row['key'])
+                 for row in to_create]
+    try:
+        # Multi-record create: one RPC for the whole chunk
+        with timer.step(f'create {len(vals_list)} orders'):
+            new_ids = client.execute_kw('sale.order', 'create', [vals_list])
+    except RPCError as e:
+        # Log message translated
+        logging.error(f"[donation_import] RPC Error creating {len(vals_list)} orders: {e}", exc_info=True)
+        for row in to_create:
+            add_result(row['row_number'], row['date'], row['amount'], row['donor'].name, ROW_ERROR,
+                       f"Odoo RPC Error creating donation: {e}")
+        return
+    except Exception as e:
+        logging.error(f"[donation_import] Unexpected error creating {len(vals_list)} orders: {e}", exc_info=True)
+        for row in to_create:
+            add_result(row['row_number'], row['date'], row['amount'], row['donor'].name, ROW_ERROR,
+                       f"Unexpected error creating donation: {e}")
+        return
+
+    if not isinstance(new_ids, list):
+        new_ids = [new_ids]
+    for row, new_id in zip(to_create, new_ids):
+        add_result(row['row_number'], row['date'], row['amount'], row['donor'].name, ROW_CREATED, "Created.", new_id)
+        created_ids.append(new_id)
+        report['total_amount'] += row['amount']
@@ -0,0 +1,292 @@
+# ong_app/donation_stats.py
+"""
+Donation totals per donor, per month and per campaign.
+
+The totals are computed by Odoo with read_group on sale.order (confirmed
+orders only), never by pulling the orders into Python: one read_group per
+dimension, run in parallel with RpcBatch.
+
+They are kept in memory. After DONATION_STATS_TTL seconds the next request
+triggers a background refresh that first asks for the latest write_date of
+sale.order (one tiny call) and stops there if nothing was written. Otherwise
+only the groups touched by the orders written since the last refresh are
+recomputed: a read_group over those orders tells which donors/months/
+campaigns changed, and a second read_group recomputes just them. Everything
+is recomputed every DONATION_STATS_FULL_REFRESH seconds (an order moved from
+one donor to another is only fully accounted for then).
+"""
+import csv
+import io
+import logging
+import os
+import threading
+import time
+
+from .odoo_batch import RpcBatch
+from .odoo_connector import odoo_session
+
+# Seconds the totals are served before a background refresh is triggered
+DONATION_STATS_TTL = int(os.environ.get('DONATION_STATS_TTL', 60))
+# Seconds between two full recomputations
+DONATION_STATS_FULL_REFRESH = int(os.environ.get('DONATION_STATS_FULL_REFRESH', 3600))
+# Rows written per chunk of a streamed CSV export
+CSV_CHUNK_ROWS = 500
+
+# Donations counted: confirmed sale orders (all sale orders are donations in this app)
+DONATION_DOMAIN = [('state', 'in', ['sale', 'done'])]
+
+# Dimension -> (read_group groupby, column title)
+DIMENSIONS = {
+    'donor': ('partner_id', 'Donor'),
+    'month': ('date_order:month', 'Month'),
+    'campaign': ('campaign_id', 'Campaign'),
+}
+
+
+def _or(domains):
+    """Odoo domain matching any of domains (prefix '|' notation)."""
+    result = ['|'] * (len(domains) - 1)
+    for domain in domains:
+        result.extend(domain)
+    return result
+
+
+def _month_range(group):
+    """
+    (from, to) datetimes of a date_order:month group: its '__range' (Odoo 16),
+    else the first date_order leaves of its '__domain' (the group's own
+    domain comes before the domain of the query).
+    """
+    bounds = (group.get('__range') or {}).get(DIMENSIONS['month'][0])
+    if bounds:
+        return bounds.get('from'), bounds.get('to')
+    start = end = None
+    for leaf in group.get('__domain') or []:
+        if isinstance(leaf, (list, tuple)) and len(leaf) == 3 and leaf[0] == 'date_order':
+            if leaf[1] == '>=' and start is None:
+                start = leaf[2]
+            elif leaf[1] == '<' and end is None:
+                end = leaf[2]
+    return start, end
+
+
+def _group_row(dimension, group):
+    """One row of the totals: key, label, count, amount (and the month range)."""
+    groupby = DIMENSIONS[dimension][0]
+    value = group.get(groupby)
+    row = {'count': group.get('__count', 0), 'amount': group.get('amount_total') or 0.0}
+    if dimension == 'month':
+        start, end = _month_range(group)
+        # 'YYYY-MM' sorts chronologically
+        row.update(key=(start or '')[:7] or value, label=value or 'No date', range=(start, end))
+    else:
+        # Many2one groups come as [id, name], or False when empty
+        row.update(key=value[0] if value else False,
+                   label=value[1] if value else ('No campaign' if dimension == 'campaign' else 'No donor'))
+    return row
+
+
+def _group_domain(dimension, row):
+    """Domain selecting the orders of one group (to recompute only that group)."""
+    if dimension == 'month':
+        start, end = row['range']
+        if not start or not end:
+            return [('date_order', '=', False)]
+        return ['&', ('date_order', '>=', start), ('date_order', '<', end)]
+    return [(DIMENSIONS[dimension][0], '=', row['key'])]
+
+
+def _read_group_kw(domain, dimension):
+    return ('sale.order', 'read_group',
+            [domain, ['amount_total:sum'], [DIMENSIONS[dimension][0]]], {'lazy': False})
+
+
+def fetch_totals(client, domain=None):
+    """
+    Totals of every dimension, one read_group each, in parallel.
+
+    :param client: Connected odoorpc client instance.
+    :param domain: Orders to group (DONATION_DOMAIN by default).
+    :return: Dict {dimension: {key: row}}
+    """
+    batch = RpcBatch(client, label='donation totals')
+    for dimension in DIMENSIONS:
+        batch.add_kw(dimension, *_read_group_kw(domain or DONATION_DOMAIN, dimension))
+    batch.run()
+    return {dimension: {row['key']: row for row in (_group_row(dimension, group) for group in batch.result(dimension))}
+            for dimension in DIMENSIONS}
+
+
+def fetch_last_write(client):
+    """Latest write_date of sale.order (any state), or None."""
+    rows = client.execute_kw('sale.order', 'search_read', [[]],
+                             {'fields': ['write_date'], 'order': 'write_date desc', 'limit': 1})
+    return rows[0]['write_date'] if rows else None
+
+
+class DonationStats:
+    """
+    Stale-while-refresh holder of the donation totals.
+
+    :param ttl: Seconds before a background refresh is triggered.
+    :param full_refresh: Seconds between two full recomputations.
+    """
+
+    def __init__(self, ttl=DONATION_STATS_TTL, full_refresh=DONATION_STATS_FULL_REFRESH):
+        self.ttl = ttl
+        self.full_refresh = full_refresh
+        self._totals = None
+        # Latest sale.order write_date included in the totals
+        self._watermark = None
+        self._checked_at = 0.0
+        self._computed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self, client, dimension):
+        """
+        Rows of one dimension (donor, month, campaign), biggest amount first
+        (months: most recent first), and the age of the data in seconds.
+        Only the very first call queries Odoo with the request's client.
+        """
+        with self._lock:
+            totals, checked_at = self._totals, self._checked_at
+        if totals is None:
+            totals = self._compute(client)
+        elif time.monotonic() - checked_at > self.ttl:
+            self._refresh_in_background()
+        rows = list(totals[dimension].values())
+        if dimension == 'month':
+            rows.sort(key=lambda row: row['key'] or '', reverse=True)
+        else:
+            rows.sort(key=lambda row: (-row['amount'], row['label']))
+        return rows, time.monotonic() - checked_at if checked_at else 0.0
+
+    def summary(self, client):
+        """Overall number of donations and amount."""
+        rows, _ = self.get(client, 'month')
+        return {'count': sum(row['count'] for row in rows), 'amount': sum(row['amount'] for row in rows)}
+
+    def invalidate(self):
+        """Next get() waits for a full recomputation."""
+        with self._lock:
+            self._totals = None
+
+    def _compute(self, client):
+        start = time.perf_counter()
+        watermark = fetch_last_write(client)
+        totals = fetch_totals(client)
+        now = time.monotonic()
+        with self._lock:
+            self._totals = totals
+            self._watermark = watermark
+            self._checked_at = self._computed_at = now
+        logging.info(f"[donation_stats] Totals computed in {(time.perf_counter() - start) * 1000.0:.0f}ms"
+                     f" ({len(totals['donor'])} donors, {len(totals['month'])} months).")
+        return totals
+
+    def _update(self, client):
+        """Recomputes only the groups touched by the orders written since the watermark."""
+        with self._lock:
+            watermark = self._watermark
+            totals = {dimension: dict(rows) for dimension, rows in self._totals.items()}
+        last_write = fetch_last_write(client)
+        if last_write == watermark:
+            with self._lock:
+                self._checked_at = time.monotonic()
+            return
+
+        # Groups of the orders written since the last refresh (whatever their state now)
+        changed = fetch_totals(client, [('write_date', '>=', watermark)] if watermark else [])
+        batch = RpcBatch(client, label='donation totals update')
+        for dimension, rows in changed.items():
+            if rows:
+                domain = DONATION_DOMAIN + _or([_group_domain(dimension, row) for row in rows.values()])
+                batch.add_kw(dimension, *_read_group_kw(domain, dimension))
+        batch.run()
+        for dimension, rows in changed.items():
+            if not rows:
+                continue
+            fresh = {row['key']: row for row in (_group_row(dimension, group) for group in batch.result(dimension))}
+            for key in rows:
+                # Groups without confirmed orders any more (e.g. cancelled) disappear
+                if key in fresh:
+                    totals[dimension][key] = fresh[key]
+                else:
+                    totals[dimension].pop(key, None)
+        with self._lock:
+            self._totals = totals
+            self._watermark = last_write
+            self._checked_at = time.monotonic()
+        logging.info(f"[donation_stats] Totals updated: {', '.join(f'{len(rows)} {dimension}(s)' for dimension, rows in changed.items())} recomputed.")
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='donation-stats-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with odoo_session() as client:
+                if client is None:
+                    logging.warning("[donation_stats] No Odoo connection, keeping the previous totals.")
+                    return
+                if time.monotonic() - self._computed_at > self.full_refresh:
+                    self._compute(client)
+                else:
+                    self._update(client)
+        except Exception as e:
+            logging.warning(f"[donation_stats] Background refresh failed, keeping the previous totals: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+def iter_csv(header, rows, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    CSV text of rows, yielded CSV_CHUNK_ROWS lines at a time (for a streamed response).
+
+    :param header: Column titles.
+    :param rows: Iterable of lists (may itself be a generator reading Odoo page by page).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for number, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if number % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_donation_orders(client, batch_size=1000):
+    """
+    Confirmed donations as CSV rows, read batch_size at a time (by increasing ID),
+    so an export of any size never holds more than one batch.
+    """
+    last_id = 0
+    while True:
+        orders = client.execute_kw(
+            'sale.order', 'search_read', [DONATION_DOMAIN + [('id', '>', last_id)]],
+            {'fields': ['name', 'partner_id', 'date_order', 'amount_total', 'campaign_id'],
+             'order': 'id asc', 'limit': batch_size})
+        for order in orders:
+            yield [order['id'], order['name'], order['partner_id'][1] if order['partner_id'] else '',
+                   order['date_order'] or '', f"{order['amount_total']:.2f}",
+                   order['campaign_id'][1] if order['campaign_id'] else '']
+        if len(orders) < batch_size:
+            return
+        last_id = orders[-1]['id']
+
+
+# Single instance shared by all requests (and the background refresh thread)
+_stats = DonationStats()
+
+
+def get_donation_stats():
+    """The process-wide DonationStats instance."""
+    return _stats
@@ -0,0 +1,287 @@
+# ong_app/donor_import.py
+"""
+Bulk donor/volunteer import (CSV or vCard upload).
+
+The upload is read row by row (never loaded whole in memory) and processed in
+chunks, as the book import: emails and phones are normalized, each chunk is
+checked against Odoo with ONE search_read on email in [...] and its new
+contacts are created with ONE multi-record create. Every row gets a line in
+the report.
+
+CSV columns (case-insensitive): name (or first_name + last_name, mandatory),
+email, phone. vCards (.vcf): FN (or N), the first EMAIL and the first TEL.
+"""
+import csv
+import logging
+import re
+
+from odoorpc.error import RPCError
+
+from .book_import import ROW_CREATED, ROW_DUPLICATE, ROW_ERROR, ROW_INVALID, iter_until_read_error, open_upload_text
+from .donor_index import normalize_email
+from .odoo_batch import StepTimer
+
+# Rows per duplicate search + create call
+DONOR_IMPORT_CHUNK_SIZE = 500
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class DonorImportError(ValueError):
+    """The uploaded file cannot be read (unknown format...)."""
+
+
+def normalize_phone(phone):
+    """
+    Phone as stored by the import: separators removed, international prefix
+    '00' written as '+' ('0041 (79) 123-45-67' -> '+41791234567').
+    """
+    phone = (phone or '').strip()
+    if not phone:
+        return ''
+    digits = re.sub(r'[^\d+]', '', phone)
+    if digits.startswith('00'):
+        digits = '+' + digits[2:]
+    # A '+' is only meaningful in front
+    return digits[:1] + digits[1:].replace('+', '')
+
+
+def iter_donor_rows(file_storage):
+    """
+    Yields (row_number, raw_row_dict) from an uploaded file, streaming it.
+
+    :param file_storage: werkzeug FileStorage from request.files.
+    :raises DonorImportError: If the extension is not .csv, .vcf or .vcard.
+    """
+    filename = (file_storage.filename or '').lower()
+    text_stream = open_upload_text(file_storage)
+    if filename.endswith('.csv'):
+        return _iter_csv_rows(text_stream)
+    if filename.endswith(('.vcf', '.vcard')):
+        return _iter_vcard_rows(text_stream)
+    raise DonorImportError(f"Unsupported file type '{file_storage.filename}'. Use .csv or .vcf.")
+
+
+def _iter_csv_rows(text_stream):
+    reader = csv.DictReader(text_stream)
+    # Row 1 is the header, so data rows start at 2 (as in a spreadsheet)
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, row
+
+
+def _unfold(text_stream):
+    """vCard lines with folded continuations (lines starting with a space/tab) joined back."""
+    current = None
+    for line in text_stream:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _vcard_value(value):
+    return value.replace('\\n', ' ').replace('\\N', ' ').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\').strip()
+
+
+def _iter_vcard_rows(text_stream):
+    """One row per BEGIN:VCARD ... END:VCARD block, numbered from 1."""
+    card = None
+    card_number = 0
+    for line in _unfold(text_stream):
+        name, _, value = line.partition(':')
+        # 'item1.EMAIL;TYPE=INTERNET' -> 'EMAIL'
+        prop = name.split(';')[0].split('.')[-1].upper()
+        if prop == 'BEGIN' and value.strip().upper() == 'VCARD':
+            card = {}
+        elif prop == 'END' and value.strip().upper() == 'VCARD':
+            if card is not None:
+                card_number += 1
+                yield card_number, card
+            card = None
+        elif card is None:
+            continue
+        elif prop == 'FN':
+            card['name'] = _vcard_value(value)
+        elif prop == 'N' and not card.get('name'):
+            # N:Family;Given;Additional;Prefix;Suffix
+            parts = [_vcard_value(part) for part in re.split(r'(?<!\\);', value)]
+            given = ' '.join(part for part in parts[1:3] if part)
+            card['name'] = ' '.join(part for part in (given, parts[0] if parts else '') if part)
+        elif prop == 'EMAIL' and not card.get('email'):
+            card['email'] = _vcard_value(value)
+        elif prop == 'TEL' and not card.get('phone'):
+            card['phone'] = _vcard_value(value)
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _normalize_row(raw_row):
+    """
+    Returns (row, error). row has name, email (normalized, '' if none),
+    typed_email (as in the file) and phone (normalized).
+    Column names are case-insensitive.
+    """
+    if not isinstance(raw_row, dict):
+        return None, "Row is not an object with columns."
+    data = {_clean(key).lower().replace(' ', '_'): value for key, value in raw_row.items() if key is not None}
+
+    name = _clean(data.get('name')) or ' '.join(
+        part for part in (_clean(data.get('first_name')), _clean(data.get('last_name'))) if part)
+    if not name:
+        return None, "Full Name is mandatory."
+
+    typed_email = _clean(data.get('email'))
+    email = normalize_email(typed_email)
+    if email and not _EMAIL_RE.match(email):
+        return None, f"Email '{typed_email}' invalid."
+
+    row = {
+        'name': name,
+        'email': email,
+        'typed_email': typed_email,
+        'phone': normalize_phone(_clean(data.get('phone') or data.get('mobile'))),
+    }
+    return row, None
+
+
+def import_donor_rows(client, rows, chunk_size=DONOR_IMPORT_CHUNK_SIZE, timer=None):
+    """
+    Creates the contacts of an import, skipping emails already in Odoo or repeated in the file.
+
+    :param client: Connected odoorpc client instance.
+    :param rows: Iterable of (row_number, raw_row_dict), e.g. from iter_donor_rows().
+    :param chunk_size: Rows per duplicate search + create call.
+    :param timer: Optional StepTimer collecting per-step timings.
+    :return: Report dict: 'rows' (row_number, name, email, status, message, partner_id),
+             'counts' per status, 'created' (dicts of the created partners) and 'read_error'
+             (the file could not be read to the end; the rows read before are in the report).
+    """
+    if timer is None:
+        timer = StepTimer('import_donors')
+
+    report = {
+        'rows': [],
+        'counts': {ROW_CREATED: 0, ROW_DUPLICATE: 0, ROW_INVALID: 0, ROW_ERROR: 0},
+        'created': [],
+        'read_error': None,
+    }
+    # Normalized email -> first row number in the file
+    seen_emails = {}
+    chunk = []
+
+    def add_result(row_number, name, email, status, message='', partner_id=None):
+        report['rows'].append({'row_number': row_number, 'name': name, 'email': email,
+                               'status': status, 'message': message, 'partner_id': partner_id})
+        report['counts'][status] += 1
+
+    # A read error stops the loop; the contacts created so far are still reported (and indexed)
+    rows = iter_until_read_error(
+        rows, report, '[donor_import]',
+        retry_hint="import again only the rows after the last one of the report below "
+                   "(contacts without an email cannot be recognised as duplicates)")
+    for row_number, raw_row in rows:
+        row, error = _normalize_row(raw_row)
+        if error:
+            name = ''
+            if isinstance(raw_row, dict):
+                name = next((_clean(v) for k, v in raw_row.items() if _clean(k).lower() == 'name'), '')
+            add_result(row_number, name, '', ROW_INVALID, error)
+            continue
+
+        if row['email']:
+            if row['email'] in seen_emails:
+                add_result(row_number, row['name'], row['email'], ROW_DUPLICATE,
+                           f"Repeated in the file (row {seen_emails[row['email']]}).")
+                continue
+            seen_emails[row['email']] = row_number
+
+        row['row_number'] = row_number
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _import_chunk(client, chunk, report, add_result, timer)
+            chunk = []
+    if chunk:
+        _import_chunk(client, chunk, report, add_result, timer)
+
+    # Chunks report their rows late: show them in file order
+    report['rows'].sort(key=lambda result: result['row_number'])
+    logging.info(f"[donor_import] Finished: {report['counts']}")
+    return report
+
+
+def _import_chunk(client, chunk, report, add_result, timer):
+    """Duplicate check (one search_read) + multi-record create for one chunk of valid rows."""
+    emails = sorted({row['email'] for row in chunk if row['email']})
+    existing = {}
+    if emails:
+        try:
+            # Odoo compares emails exactly: ask for the lower-case form and for the
+            # form typed in the file, then match on the normalized email
+            candidates = sorted(set(emails) | {row['typed_email'] for row in chunk if row['email']})
+            with timer.step(f'search {len(emails)} emails'):
+                partners = client.execute_kw('res.partner', 'search_read', [[('email', 'in', candidates)]],
+                                             {'fields': ['email'], 'order': 'id asc'})
+            for partner in partners:
+                existing.setdefault(normalize_email(partner['email']), partner['id'])
+        except Exception as e:
+            # Log message translated
+            logging.error(f"[donor_import] Error searching duplicates for a chunk: {e}", exc_info=True)
+            for row in chunk:
+                add_result(row['row_number'], row['name'], row['email'], ROW_ERROR, f"Error checking duplicates: {e}")
+            return
+
+    to_create = []
+    for row in chunk:
+        existing_id = existing.get(row['email']) if row['email'] else None
+        if existing_id:
+            add_result(row['row_number'], row['name'], row['email'], ROW_DUPLICATE,
+                       "A contact with this email already exists in Odoo. Not added again.", existing_id)
+            continue
+        to_create.append(row)
+
+    if not to_create:
+        return
+
+    vals_list = [_partner_vals(row) for row in to_create]
+    try:
+        # Multi-record create: one RPC for the whole chunk
+        with timer.step(f'create {len(vals_list)} partners'):
+            new_ids = client.execute_kw('res.partner', 'create', [vals_list])
+    except RPCError as e:
+        # Log message translated
+        logging.error(f"[donor_import] RPC Error creating {len(vals_list)} partners: {e}", exc_info=True)
+        for row in to_create:
+            add_result(row['row_number'], row['name'], row['email'], ROW_ERROR, f"Odoo RPC Error creating contact: {e}")
+        return
+    except Exception as e:
+        logging.error(f"[donor_import] Unexpected error creating {len(vals_list)} partners: {e}", exc_info=True)
+        for row in to_create:
+            add_result(row['row_number'], row['name'], row['email'], ROW_ERROR, f"Unexpected error creating contact: {e}")
+        return
+
+    if not isinstance(new_ids, list):
+        new_ids = [new_ids]
+    for row, new_id in zip(to_create, new_ids):
+        add_result(row['row_number'], row['name'], row['email'], ROW_CREATED, "Created.", new_id)
+        report['created'].append({'id': new_id, 'name': row['name'], 'email': row['email'],
+                                  'phone': row['phone'], 'is_company': False})
+
+
+def _partner_vals(row):
+    """Same partner values as the single-donor form (add_donor_submit)."""
+    return {
+        'name': row['name'],
+        'email': row['email'] or False,
+        'phone': row['phone'] or False,
+        'comment': 'Contact imported from ONG Flask App',
+        'company_type': 'person',
+    }
@@ -0,0 +1,402 @@
+# ong_app/donor_index.py
+"""
+In-memory index of the contacts (res.partner), one per worker process.
+
+The donor pickers (routes_donors.search_donors_api), the donor list and the
+duplicate-email check of add_donor_submit are answered from here instead of
+Odoo. Lookups are pure in-memory operations:
+
+- prefix search: a sorted array of search keys (the normalized name from
+  each of its words, and the normalized email) with a parallel array of
+  partner IDs, searched with bisect;
+- duplicate check: a dict on the normalized email (all contacts, companies
+  included, as the old search on email);
+- donor list: the donors (not companies) kept sorted by name, so a page is
+  a slice.
+
+Each contact is a Contact object with __slots__ (no per-object dict), so the
+footprint stays around a few hundred bytes per contact.
+
+The index is loaded once with search_read in batches. After
+DONOR_INDEX_TTL seconds the next lookup triggers a background refresh that
+only reads the partners whose write_date moved since the last one (archived
+partners and partners turned into companies included, so they leave the
+donor views). Deleted partners cannot be seen that way: the whole index is
+reloaded every DONOR_INDEX_FULL_RELOAD seconds. Partners created through
+this app are added right away.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+import unicodedata
+from array import array
+
+from .odoo_connector import odoo_session
+
+# Seconds before the next lookup triggers an incremental refresh in the background
+DONOR_INDEX_TTL = int(os.environ.get('DONOR_INDEX_TTL', 60))
+# Seconds between two full reloads (the only way to notice deleted partners)
+DONOR_INDEX_FULL_RELOAD = int(os.environ.get('DONOR_INDEX_FULL_RELOAD', 3600))
+# Partners read per search_read while loading
+DONOR_INDEX_BATCH_SIZE = 5000
+# Above this many changed partners, a refresh rebuilds the index instead of patching it
+DONOR_INDEX_MAX_INCREMENTAL = 2000
+
+CONTACT_FIELDS = ['id', 'name', 'email', 'phone', 'is_company', 'write_date']
+
+
+def normalize(text):
+    """Lower-case, accent-free version of text used for matching ('Jose' finds 'José')."""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().strip()
+
+
+def normalize_email(email):
+    """Key of the email map: trimmed and lower-cased ('' when empty)."""
+    return (email or '').strip().lower()
+
+
+class Contact:
+    """One res.partner of the index. Read by the templates like the old dicts."""
+
+    __slots__ = ('id', 'name', 'email', 'phone', 'is_company', 'key')
+
+    def __init__(self, record):
+        self.id = record['id']
+        self.name = record.get('name') or ''
+        self.email = record.get('email') or False
+        self.phone = record.get('phone') or False
+        self.is_company = bool(record.get('is_company'))
+        # Normalized name: search keys and list order
+        self.key = normalize(self.name)
+
+    def search_keys(self):
+        """Prefix-search keys: the name from each of its words, and the email."""
+        words = self.key.split()
+        # The whole name is self.key itself (no extra string kept for it)
+        keys = {self.key} if self.key else set()
+        keys.update(' '.join(words[i:]) for i in range(1, len(words)))
+        email = normalize_email(self.email)
+        if email:
+            keys.add(email)
+        return keys
+
+    def as_dict(self):
+        return {'id': self.id, 'name': self.name, 'email': self.email, 'phone': self.phone}
+
+
+def _list_order(contact):
+    return (contact.key, contact.id)
+
+
+def fetch_contacts(client, since=None):
+    """
+    Reads the contacts, DONOR_INDEX_BATCH_SIZE at a time.
+
+    :param client: Connected odoorpc client instance.
+    :param since: Odoo write_date; only the partners written at or after it
+                  (archived ones included, to drop them from the index).
+    :return: List of dicts with CONTACT_FIELDS (+ 'active' when since is given).
+    """
+    domain = []
+    fields = list(CONTACT_FIELDS)
+    if since:
+        domain = [('write_date', '>=', since), ('active', 'in', [True, False])]
+        fields.append('active')
+    records = []
+    last_id = 0
+    while True:
+        batch = client.execute_kw(
+            'res.partner', 'search_read', [domain + [('id', '>', last_id)]],
+            {'fields': fields, 'order': 'id asc', 'limit': DONOR_INDEX_BATCH_SIZE})
+        records.extend(batch)
+        if len(batch) < DONOR_INDEX_BATCH_SIZE:
+            return records
+        last_id = batch[-1]['id']
+
+
+class DonorIndex:
+    """
+    Contacts by ID, by normalized email and by sorted search key.
+
+    :param ttl: Seconds before a lookup triggers an incremental refresh.
+    :param full_reload: Seconds between two full reloads.
+    """
+
+    def __init__(self, ttl=DONOR_INDEX_TTL, full_reload=DONOR_INDEX_FULL_RELOAD):
+        self.ttl = ttl
+        self.full_reload = full_reload
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._refreshing = False
+        self._refreshed_at = 0.0
+        self._reloaded_at = 0.0
+        # Latest write_date seen (watermark of the incremental refresh)
+        self._watermark = None
+        self._by_id = {}
+        self._by_email = {}
+        # Sorted search keys of the donors and the partner ID of each key
+        self._keys = []
+        self._key_ids = array('q')
+        # Donors (not companies) sorted by name, for the donor list
+        self._donors = []
+
+    # --- Lookups ---
+
+    def search(self, client, query, limit=20, offset=0):
+        """
+        Donors whose name (from any word) or email starts with query, in key
+        order, followed by the other donors with every query word anywhere in
+        the name or email ('ann' finds 'Anna Ruiz' first, then 'Joanne Diaz';
+        'lopez maria' only the latter way). Each donor appears once, so the
+        offset pages through both lists as one.
+
+        :param client: Connected odoorpc client instance (only used on the very first load).
+        :param query: Text typed by the user (empty: all donors by name).
+        :param limit: Maximum donors returned.
+        :param offset: Donors skipped (next pages while scrolling).
+        :return: (list of Contact, has_more)
+        """
+        self._ensure_loaded(client)
+        text = normalize(query)
+        wanted = offset + limit + 1
+        with self._lock:
+            if not text:
+                matches = self._donors[offset:offset + limit + 1]
+                return matches[:limit], len(matches) > limit
+            found = []
+            seen = set()
+            position = bisect.bisect_left(self._keys, text)
+            while position < len(self._keys) and len(found) < wanted and self._keys[position].startswith(text):
+                partner_id = self._key_ids[position]
+                if partner_id not in seen:
+                    seen.add(partner_id)
+                    found.append(self._by_id[partner_id])
+                position += 1
+            if len(found) < wanted:
+                # The substring scan only runs when the prefix matches do not fill the page
+                words = text.split()
+                for contact in self._donors:
+                    if contact.id in seen:
+                        continue
+                    email = normalize_email(contact.email)
+                    if all(word in contact.key or word in email for word in words):
+                        found.append(contact)
+                        if len(found) >= wanted:
+                            break
+        return found[offset:offset + limit], len(found) > offset + limit
+
+    def find_by_email(self, client, email):
+        """
+        Contact (company or person) with this email, or None.
+
+        :param client: Connected odoorpc client instance (only used on the very first load).
+        """
+        self._ensure_loaded(client)
+        with self._lock:
+            return self._by_email.get(normalize_email(email))
+
+    def get(self, client, partner_id):
+        """
+        Contact with this ID, or None.
+
+        :param client: Connected odoorpc client instance (only used on the very first load).
+        """
+        self._ensure_loaded(client)
+        with self._lock:
+            return self._by_id.get(partner_id)
+
+    def peek(self, partner_id):
+        """Contact with this ID if the index is already loaded (never calls Odoo), else None."""
+        with self._lock:
+            return self._by_id.get(partner_id) if self._loaded else None
+
+    def find_by_name(self, client, name):
+        """
+        Donors whose whole name is name (accents and case ignored); several
+        when the name is shared.
+
+        :param client: Connected odoorpc client instance (only used on the very first load).
+        :return: List of Contact.
+        """
+        self._ensure_loaded(client)
+        text = normalize(name)
+        if not text:
+            return []
+        found = []
+        with self._lock:
+            position = bisect.bisect_left(self._keys, text)
+            while position < len(self._keys) and self._keys[position] == text:
+                # The same key may also be the end of a longer name ('lopez' in 'maria lopez')
+                contact = self._by_id[self._key_ids[position]]
+                if contact.key == text:
+                    found.append(contact)
+                position += 1
+        return found
+
+    def page(self, client, page, page_size):
+        """
+        Donors of one page of the donor list, sorted by name.
+
+        :return: (list of Contact, total number of donors)
+        """
+        self._ensure_loaded(client)
+        start = (page - 1) * page_size
+        with self._lock:
+            return self._donors[start:start + page_size], len(self._donors)
+
+    def count(self):
+        return len(self._donors)
+
+    # --- Updates ---
+
+    def add(self, record):
+        """Adds or replaces one partner (dict with CONTACT_FIELDS), e.g. right after creating it."""
+        with self._lock:
+            if self._loaded:
+                self._put(Contact(record))
+
+    def invalidate(self):
+        """Next lookup waits for a full reload."""
+        with self._lock:
+            self._loaded = False
+
+    def _put(self, contact):
+        self._remove(contact.id, keep_email=normalize_email(contact.email))
+        self._by_id[contact.id] = contact
+        email = normalize_email(contact.email)
+        if email:
+            # Duplicated emails in Odoo: the oldest partner wins, as the old search did
+            current = self._by_email.get(email)
+            if current is None or current.id > contact.id:
+                self._by_email[email] = contact
+        if contact.is_company:
+            return
+        for key in contact.search_keys():
+            position = bisect.bisect_left(self._keys, key)
+            self._keys.insert(position, key)
+            self._key_ids.insert(position, contact.id)
+        bisect.insort(self._donors, contact, key=_list_order)
+
+    def _remove(self, partner_id, keep_email=None):
+        contact = self._by_id.pop(partner_id, None)
+        if contact is None:
+            return
+        email = normalize_email(contact.email)
+        if email and self._by_email.get(email) is contact:
+            del self._by_email[email]
+            # Another partner with the same email takes over (rare; not needed
+            # when the same partner is put back with the same email)
+            others = [] if email == keep_email else [other for other in self._by_id.values() if normalize_email(other.email) == email]
+            if others:
+                self._by_email[email] = min(others, key=lambda other: other.id)
+        if contact.is_company:
+            return
+        for key in contact.search_keys():
+            position = bisect.bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._key_ids[position] == partner_id:
+                    del self._keys[position]
+                    del self._key_ids[position]
+                    break
+                position += 1
+        position = bisect.bisect_left(self._donors, _list_order(contact), key=_list_order)
+        if position < len(self._donors) and self._donors[position] is contact:
+            del self._donors[position]
+
+    # --- Loading ---
+
+    def _ensure_loaded(self, client):
+        with self._lock:
+            loaded, refreshed_at = self._loaded, self._refreshed_at
+        if not loaded:
+            self._reload(client)
+        elif time.monotonic() - refreshed_at > self.ttl:
+            self._refresh_in_background()
+
+    def _reload(self, client):
+        """Rebuilds every structure from a full read (built aside, swapped under the lock)."""
+        start = time.perf_counter()
+        records = fetch_contacts(client)
+        contacts = [Contact(record) for record in records]
+        by_id = {contact.id: contact for contact in contacts}
+        by_email = {}
+        pairs = []
+        for contact in contacts:
+            email = normalize_email(contact.email)
+            # Read in ID order: the first one is the oldest
+            if email and email not in by_email:
+                by_email[email] = contact
+            if not contact.is_company:
+                pairs.extend((key, contact.id) for key in contact.search_keys())
+        pairs.sort()
+        donors = sorted((contact for contact in contacts if not contact.is_company), key=_list_order)
+        now = time.monotonic()
+        with self._lock:
+            self._by_id = by_id
+            self._by_email = by_email
+            self._keys = [key for key, _ in pairs]
+            self._key_ids = array('q', (partner_id for _, partner_id in pairs))
+            self._donors = donors
+            self._watermark = max((record.get('write_date') or '' for record in records), default=None) or None
+            self._loaded = True
+            self._refreshed_at = self._reloaded_at = now
+        logging.info(f"[donor_index] {len(by_id)} contacts ({len(donors)} donors) loaded"
+                     f" in {(time.perf_counter() - start) * 1000.0:.0f}ms.")
+
+    def _update(self, client):
+        """Applies the partners written since the watermark."""
+        with self._lock:
+            since = self._watermark
+        records = fetch_contacts(client, since=since)
+        if len(records) > DONOR_INDEX_MAX_INCREMENTAL:
+            # Inserting in the sorted arrays one by one would cost more than rebuilding them
+            logging.info(f"[donor_index] {len(records)} contacts changed since {since}, reloading the whole index.")
+            self._reload(client)
+            return
+        with self._lock:
+            for record in records:
+                if record.get('active') is False:
+                    self._remove(record['id'])
+                else:
+                    self._put(Contact(record))
+                if record.get('write_date') and (self._watermark is None or record['write_date'] > self._watermark):
+                    self._watermark = record['write_date']
+            self._refreshed_at = time.monotonic()
+        if records:
+            logging.info(f"[donor_index] {len(records)} contact(s) changed since {since}, index updated.")
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='donor-index-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with odoo_session() as client:
+                if client is None:
+                    logging.warning("[donor_index] No Odoo connection, keeping the current index.")
+                    return
+                if time.monotonic() - self._reloaded_at > self.full_reload:
+                    self._reload(client)
+                else:
+                    self._update(client)
+        except Exception as e:
+            logging.warning(f"[donor_index] Background refresh failed, keeping the current index: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+
+_index = DonorIndex()
+
+
+def get_donor_index():
+    """The process-wide DonorIndex."""
+    return _index
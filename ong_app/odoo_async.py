@@ -0,0 +1,265 @@
+# ong_app/odoo_async.py
+"""
+Asynchronous JSON-RPC client for Odoo (stdlib asyncio only).
+
+odoorpc blocks its thread for every call. AsyncOdooClient speaks the same
+/jsonrpc execute_kw protocol over asyncio streams, keeps HTTP/1.1
+connections alive between calls and caps the number of calls in flight,
+so many independent calls overlap on a few sockets.
+
+The Flask views stay synchronous: AsyncOdooRunner runs one event loop in a
+daemon thread, owning one AsyncOdooClient for the whole process, and request
+threads hand it coroutines (RpcBatch does so for its execute_kw calls when
+ODOO_ASYNC_TRANSPORT=1).
+
+Errors returned by Odoo are raised as odoorpc.error.RPCError, so callers keep
+their existing except blocks.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import ssl
+import threading
+from urllib.parse import urlsplit
+
+import odoorpc
+
+from . import odoo_connector
+
+# Run RpcBatch execute_kw calls on the async transport instead of pooled odoorpc clients
+ODOO_ASYNC_TRANSPORT = os.environ.get('ODOO_ASYNC_TRANSPORT', '0') == '1'
+# Maximum number of calls (and therefore open connections) in flight at once
+ODOO_ASYNC_MAX_CONNECTIONS = int(os.environ.get('ODOO_ASYNC_MAX_CONNECTIONS', 8))
+# Seconds to open a connection / to wait for the answer of one call
+ODOO_ASYNC_CONNECT_TIMEOUT = float(os.environ.get('ODOO_ASYNC_CONNECT_TIMEOUT', 10))
+ODOO_ASYNC_READ_TIMEOUT = float(os.environ.get('ODOO_ASYNC_READ_TIMEOUT', 60))
+
+
+class _StaleConnection(Exception):
+    """Internal signal: a kept-alive connection was closed by the server before answering."""
+
+
+class AsyncOdooClient:
+    """
+    Odoo JSON-RPC client for asyncio code.
+
+    >>> async with AsyncOdooClient('http://odoo:8069', 'db', 'user', 'pwd') as odoo:
+    ...     partners, count = await asyncio.gather(
+    ...         odoo.execute_kw('res.partner', 'search_read', [[]], {'fields': ['name'], 'limit': 10}),
+    ...         odoo.execute_kw('res.partner', 'search_count', [[]]))
+
+    :param url: Odoo base URL (e.g. http://odoo:8069).
+    :param db: Database name.
+    :param login: User login.
+    :param password: User password (or API key).
+    :param max_connections: Maximum calls in flight (one connection each).
+    :param connect_timeout: Seconds to open a connection.
+    :param read_timeout: Seconds to wait for the answer of one call.
+    """
+
+    def __init__(self, url, db, login, password, max_connections=ODOO_ASYNC_MAX_CONNECTIONS,
+                 connect_timeout=ODOO_ASYNC_CONNECT_TIMEOUT, read_timeout=ODOO_ASYNC_READ_TIMEOUT):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        # Same rule as odoo_connector._connect: port 443 means SSL
+        self.use_ssl = parts.scheme == 'https' or parts.port == 443
+        self.port = parts.port or (443 if self.use_ssl else 80)
+        self.db = db
+        self.login_name = login
+        self.password = password
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.uid = None
+        self._idle = []
+        self._limit = asyncio.Semaphore(max_connections)
+        self._login_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+
+    async def __aenter__(self):
+        await self.login()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # --- JSON-RPC ---
+
+    async def login(self):
+        """Authenticates once; later calls reuse the uid."""
+        async with self._login_lock:
+            if self.uid is None:
+                uid = await self.call('common', 'login', self.db, self.login_name, self.password)
+                if not uid:
+                    raise odoorpc.error.RPCError(f"Odoo login refused for user '{self.login_name}' on '{self.db}'.")
+                self.uid = uid
+                logging.info(f"[odoo_async] Logged in as uid {uid} on {self.host}:{self.port}/{self.db}.")
+        return self.uid
+
+    async def execute_kw(self, model, method, args=None, kwargs=None):
+        """Async equivalent of odoorpc's client.execute_kw."""
+        if self.uid is None:
+            await self.login()
+        return await self.call('object', 'execute_kw', self.db, self.uid, self.password,
+                               model, method, args or [], kwargs or {})
+
+    async def gather_kw(self, calls):
+        """
+        Runs independent execute_kw calls concurrently.
+
+        :param calls: Dict {key: (model, method, args, kwargs)}.
+        :return: Dict {key: result or the exception that call raised}.
+        """
+        if self.uid is None:
+            await self.login()
+        keys = list(calls)
+        results = await asyncio.gather(*(self.execute_kw(*calls[key]) for key in keys), return_exceptions=True)
+        return dict(zip(keys, results))
+
+    async def call(self, service, method, *args):
+        """One JSON-RPC 'call' on /jsonrpc (services: common, object, db)."""
+        payload = {'jsonrpc': '2.0', 'method': 'call', 'id': next(self._ids),
+                   'params': {'service': service, 'method': method, 'args': list(args)}}
+        response = json.loads(await self._post('/jsonrpc', json.dumps(payload).encode('utf-8')))
+        error = response.get('error')
+        if error:
+            message = (error.get('data') or {}).get('message') or error.get('message') or 'Odoo Server Error'
+            raise odoorpc.error.RPCError(message, error)
+        return response.get('result')
+
+    # --- HTTP/1.1 with keep-alive ---
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    async def _open(self):
+        context = ssl.create_default_context() if self.use_ssl else None
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=context),
+                                      self.connect_timeout)
+
+    async def _post(self, path, body):
+        async with self._limit:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._open()
+            try:
+                try:
+                    keep_alive, data = await asyncio.wait_for(
+                        self._round_trip(reader, writer, path, body), self.read_timeout)
+                except _StaleConnection:
+                    writer.close()
+                    if not reused:
+                        raise ConnectionError("Odoo closed the connection without answering.")
+                    # The server dropped the idle connection before reading the request,
+                    # so it is safe to send it again on a new one
+                    reader, writer = await self._open()
+                    keep_alive, data = await asyncio.wait_for(
+                        self._round_trip(reader, writer, path, body), self.read_timeout)
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return data
+
+    async def _round_trip(self, reader, writer, path, body):
+        writer.write(
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            "Accept: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise _StaleConnection()
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and not status_line.startswith(b'HTTP/1.0')
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = await self._read_chunked(reader)
+        elif 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+        else:
+            # No length: the body ends with the connection
+            data = await reader.read()
+            keep_alive = False
+        if status != 200:
+            raise ConnectionError(f"Odoo answered HTTP {status} on {path}.")
+        return keep_alive, data
+
+    @staticmethod
+    async def _read_chunked(reader):
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip(), 16)
+            if size == 0:
+                # Trailer headers end with an empty line
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+
+class AsyncOdooRunner:
+    """
+    Event loop in a daemon thread, owning one AsyncOdooClient shared by all
+    request threads (one keep-alive connection pool for the whole process).
+
+    :param client_factory: Callable returning the AsyncOdooClient (called inside the loop).
+    """
+
+    def __init__(self, client_factory):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='odoo-async', daemon=True).start()
+        self.client = self.run(self._create(client_factory))
+
+    @staticmethod
+    async def _create(client_factory):
+        return client_factory()
+
+    def run(self, coroutine, timeout=None):
+        """Runs coroutine on the loop and waits (from a normal thread) for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def gather_kw(self, calls, timeout=None):
+        """Synchronous front of AsyncOdooClient.gather_kw for request threads."""
+        return self.run(self.client.gather_kw(calls), timeout)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_async_runner():
+    """The process-wide AsyncOdooRunner, or None if ODOO_ASYNC_TRANSPORT is off or not configured."""
+    global _runner
+    if not ODOO_ASYNC_TRANSPORT:
+        return None
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                if not all([odoo_connector.odoo_url, odoo_connector.odoo_db,
+                            odoo_connector.odoo_user, odoo_connector.odoo_password]):
+                    logging.error("[odoo_async] Odoo environment variables missing, async transport disabled.")
+                    return None
+                _runner = AsyncOdooRunner(lambda: AsyncOdooClient(
+                    odoo_connector.odoo_url, odoo_connector.odoo_db,
+                    odoo_connector.odoo_user, odoo_connector.odoo_password))
+                logging.info(f"[odoo_async] Async transport started (max {ODOO_ASYNC_MAX_CONNECTIONS} calls in flight).")
+    return _runner
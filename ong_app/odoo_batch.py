@@ -0,0 +1,243 @@
+# ong_app/odoo_batch.py
+"""
+Helpers to cut the number of sequential Odoo round-trips in a request.
+
+Odoo's JSON-RPC endpoint executes one call per HTTP request (there is no
+multicall), so independent calls are collapsed into a single round-trip of
+wall-clock time by running them concurrently on pooled clients, or on the
+asyncio transport (odoo_async.py) when ODOO_ASYNC_TRANSPORT=1.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .odoo_async import get_async_runner
+from .odoo_connector import ODOO_POOL_SIZE, odoo_session
+
+# Shared by every batch of the process; never more threads than pooled clients
+_executor = ThreadPoolExecutor(max_workers=ODOO_POOL_SIZE, thread_name_prefix='odoo-batch')
+
+# A batch does not wait long for extra clients: if the pool is busy it simply
+# runs the remaining calls on the request's own client
+EXTRA_CLIENT_TIMEOUT = 0.5
+
+
+class StepTimer:
+    """
+    Records how long each named step of a pipeline took (in milliseconds).
+
+    >>> timer = StepTimer('add_book')
+    >>> with timer.step('create product'):
+    ...     pass
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.timings = {}
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000.0
+
+    @property
+    def total_ms(self):
+        return sum(self.timings.values())
+
+    def summary(self):
+        """One-line 'step=12ms, ...' text for logs."""
+        parts = [f"{name}={ms:.0f}ms" for name, ms in self.timings.items()]
+        return f"[{self.label}] total={self.total_ms:.0f}ms ({', '.join(parts)})"
+
+
+class RpcBatch:
+    """
+    Collects independent Odoo calls and runs them in one parallel round-trip.
+
+    Each queued call receives an odoorpc client as first argument. The first
+    call runs on the request's client; the others borrow clients from the pool.
+    If the async transport is enabled and the batch only holds add_kw calls,
+    they all run concurrently on it instead (no thread or pooled client used).
+    Errors are kept per call and re-raised when that result is read, so the
+    caller can keep its existing try/except blocks around each result.
+
+    :param client: Connected odoorpc client of the current request.
+    :param timer: Optional StepTimer; the batch is recorded as one step.
+    :param label: Name of the step in the timer.
+    """
+
+    def __init__(self, client, timer=None, label='batch'):
+        self.client = client
+        self.timer = timer
+        self.label = label
+        self._calls = {}
+        self._results = {}
+        self._errors = {}
+
+    def add(self, key, func, *args, **kwargs):
+        """Queue `func(client, *args, **kwargs)` under `key`."""
+        self._calls[key] = (func, args, kwargs)
+        return self
+
+    def add_kw(self, key, model, method, args=None, kwargs=None):
+        """Queue a plain `execute_kw(model, method, args, kwargs)` call under `key`."""
+        return self.add(key, _execute_kw, model, method, args or [], kwargs or {})
+
+    def run(self):
+        """Execute every queued call and wait for all of them."""
+        if not self._calls:
+            return self
+        if self.timer is not None:
+            with self.timer.step(self.label):
+                self._run()
+        else:
+            self._run()
+        return self
+
+    def result(self, key):
+        """Return the result of `key`, re-raising the exception it produced."""
+        if key in self._errors:
+            raise self._errors[key]
+        return self._results[key]
+
+    def _run(self):
+        runner = get_async_runner()
+        if runner is not None and all(func is _execute_kw for func, _, _ in self._calls.values()):
+            self._run_async(runner)
+            return
+        items = list(self._calls.items())
+        first_key, first_call = items[0]
+        futures = {key: _executor.submit(self._run_on_pooled_client, call) for key, call in items[1:]}
+
+        self._store(first_key, self._run_on_client, self.client, first_call)
+        for key, future in futures.items():
+            try:
+                self._results[key] = future.result()
+            except _NoPooledClient:
+                # Pool busy or unreachable: fall back to the request's client
+                logging.debug(f"[RpcBatch {self.label}] No free pooled client for '{key}', running inline.")
+                self._store(key, self._run_on_client, self.client, self._calls[key])
+            except Exception as e:
+                self._errors[key] = e
+        self._calls = {}
+
+    def _run_async(self, runner):
+        calls = {key: args for key, (_, args, _) in self._calls.items()}
+        try:
+            results = runner.gather_kw(calls)
+        except Exception as e:
+            # The whole batch failed (e.g. Odoo unreachable): every result re-raises it
+            results = {key: e for key in calls}
+        for key, result in results.items():
+            if isinstance(result, Exception):
+                self._errors[key] = result
+            else:
+                self._results[key] = result
+        self._calls = {}
+
+    def _store(self, key, runner, *args):
+        try:
+            self._results[key] = runner(*args)
+        except Exception as e:
+            self._errors[key] = e
+
+    @staticmethod
+    def _run_on_client(client, call):
+        func, args, kwargs = call
+        return func(client, *args, **kwargs)
+
+    @staticmethod
+    def _run_on_pooled_client(call):
+        with odoo_session(timeout=EXTRA_CLIENT_TIMEOUT) as pooled_client:
+            if pooled_client is None:
+                raise _NoPooledClient()
+            return RpcBatch._run_on_client(pooled_client, call)
+
+
+class _NoPooledClient(Exception):
+    """Internal signal: no extra client could be borrowed for a batched call."""
+
+
+def _execute_kw(client, model, method, args, kwargs):
+    return client.execute_kw(model, method, args, kwargs)
+
+
+def load_record_graph(client, model, ids, fields, children=None, timer=None, label=None):
+    """
+    Reads records and chosen relational children in ONE parallel round-trip:
+    the parents and each child model are fetched by concurrent search_read
+    calls (children by their inverse Many2one, so the parent's One2many IDs
+    are not needed first).
+
+    >>> picking = load_record_graph(client, 'stock.picking', [7], ['name', 'state'], {
+    ...     'move_line_ids': ('stock.move.line', 'picking_id', ['product_id', 'qty_done']),
+    ... })[0]
+    >>> picking['move_line_ids']  # list of dicts, not IDs
+
+    :param client: Connected odoorpc client instance.
+    :param model: Parent model name.
+    :param ids: Parent record ID or list of IDs.
+    :param fields: Parent fields to read ('id' is always included).
+    :param children: {key: (child model, inverse Many2one field, child fields[, extra domain])};
+                     the children of each parent are stored under key, by ascending ID.
+    :param timer: Optional StepTimer; the round-trip is recorded as one step.
+    :param label: Optional step name (default 'load <model> graph').
+    :return: List of parent dicts in the order of ids (IDs that do not exist are skipped).
+    :raises odoorpc.error.RPCError: Any of the reads failed.
+    """
+    if isinstance(ids, int):
+        ids = [ids]
+    children = children or {}
+    batch = RpcBatch(client, timer=timer, label=label or f'load {model} graph')
+    batch.add_kw('__parent__', model, 'search_read', [[('id', 'in', ids)]], {'fields': list(fields)})
+    for key, spec in children.items():
+        child_model, inverse, child_fields = spec[:3]
+        domain = [(inverse, 'in', ids)] + list(spec[3] if len(spec) > 3 else [])
+        batch.add_kw(key, child_model, 'search_read', [domain],
+                     {'fields': sorted(set(child_fields) | {inverse}), 'order': 'id asc'})
+    batch.run()
+
+    parents = {record['id']: record for record in batch.result('__parent__')}
+    for record in parents.values():
+        for key in children:
+            record[key] = []
+    for key, spec in children.items():
+        inverse = spec[1]
+        for child in batch.result(key):
+            parent = parents.get(child[inverse][0] if child[inverse] else None)
+            if parent is not None:
+                parent[key].append(child)
+    return [parents[record_id] for record_id in ids if record_id in parents]
+
+
+def iter_changed_records(client, model, domain, fields, batch_size=1000):
+    """
+    All records of model matching domain (archived included), in batches,
+    oldest write first.
+
+    Pages with a keyset on (write_date, id) rather than an offset: a record
+    written while the batches are read moves to the end of the order and is
+    read again there, whereas with an offset it would shift the next page and
+    make one unread record be skipped.
+
+    :param fields: Fields to read ('id' and 'write_date' are always read).
+    :param batch_size: Records per search_read.
+    """
+    fields = list(fields) + [field for field in ('id', 'write_date') if field not in fields]
+    after = []
+    while True:
+        records = client.execute_kw(
+            model, 'search_read', [domain + after],
+            {'fields': fields, 'order': 'write_date asc, id asc', 'limit': batch_size,
+             'context': {'active_test': False}})
+        if records:
+            yield records
+        if len(records) < batch_size:
+            return
+        last = records[-1]
+        after = ['|', ('write_date', '>', last['write_date']),
+                 '&', ('write_date', '=', last['write_date']), ('id', '>', last['id'])]
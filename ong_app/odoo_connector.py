@@ -1,54 +1,186 @@
 # ong_app/odoo_connector.py
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
 import odoorpc
 import logging
+from flask import g, has_app_context
+
+from .odoo_transport import ODOO_READ_TIMEOUT, build_odoo_opener
 
 # Configuración de Odoo desde variables de entorno (movida aquí)
 odoo_url = os.environ.get('ODOO_URL')
 odoo_db = os.environ.get('ODOO_DB')
 odoo_user = os.environ.get('ODOO_USER')
 odoo_password = os.environ.get('ODOO_PASSWORD')
+# Versión del servidor (p. ej. '16.0'): si se indica, odoorpc no la consulta en cada conexión
+odoo_version = os.environ.get('ODOO_VERSION') or None
 
-_odoo_client = None # Variable "global" a este módulo
-
-def get_odoo_client():
-    """Función para obtener o crear la conexión a Odoo (vive aquí ahora)."""
-    global _odoo_client
-    logging.info("Llamada a get_odoo_client()")
+# Configuración del pool de sesiones
+# Número máximo de clientes logueados que viven a la vez en este proceso
+ODOO_POOL_SIZE = int(os.environ.get('ODOO_POOL_SIZE', 4))
+# Segundos que una petición espera un cliente libre antes de rendirse
+ODOO_POOL_TIMEOUT = float(os.environ.get('ODOO_POOL_TIMEOUT', 10))
+# Un cliente inactivo más de estos segundos se verifica antes de reutilizarlo
+ODOO_HEALTH_CHECK_INTERVAL = float(os.environ.get('ODOO_HEALTH_CHECK_INTERVAL', 60))
 
-    # Forzaremos el intento de conexión siempre para depuración inicial
-    # if _odoo_client is not None:
-    #    logging.info("Devolviendo cliente Odoo existente.")
-    #    return _odoo_client
 
+def _connect():
+    """Crea un cliente odoorpc nuevo y hace login. Devuelve None si falla."""
     logging.info(f"Variables Odoo: URL={odoo_url}, DB={odoo_db}, User={odoo_user}, Pwd={'Set' if odoo_password else 'None'}")
 
     if not all([odoo_url, odoo_db, odoo_user, odoo_password]):
         logging.error("Faltan una o más variables de entorno para la conexión a Odoo.")
-        _odoo_client = None
         return None
 
     try:
         host = odoo_url.replace('http://', '').split(':')[0]
         port = int(odoo_url.split(':')[-1])
-        
+
         protocol = 'jsonrpc+ssl' if port == 443 else 'jsonrpc'
 
-        logging.info(f"Paso 1: Intentando crear instancia odoorpc.ODOO(host='{host}', protocol='{protocol}', port={port}, timeout=60)")
-        client_instance = odoorpc.ODOO(host, protocol=protocol, port=port, timeout=60)
+        # Conexión HTTP persistente (keep-alive), respuestas gzip y timeouts de conexión/lectura separados
+        opener = build_odoo_opener(use_ssl=(protocol == 'jsonrpc+ssl'))
+        logging.info(f"Paso 1: Intentando crear instancia odoorpc.ODOO(host='{host}', protocol='{protocol}', port={port}, timeout={ODOO_READ_TIMEOUT}, version={odoo_version})")
+        client_instance = odoorpc.ODOO(host, protocol=protocol, port=port, timeout=ODOO_READ_TIMEOUT,
+                                       version=odoo_version, opener=opener)
         logging.info("Paso 1.1: Instancia odoorpc.ODOO creada.")
 
         logging.info(f"Paso 2: Intentando login en DB '{odoo_db}' con usuario '{odoo_user}'")
         client_instance.login(odoo_db, odoo_user, odoo_password)
         logging.info("Paso 3: ¡Login exitoso!")
-        _odoo_client = client_instance # Guardamos la instancia exitosa
-        return _odoo_client
+        return client_instance
 
     except odoorpc.error.RPCError as e:
         logging.error(f"ERROR RPC al conectar/autenticar con Odoo (odoorpc): {e}", exc_info=True)
-        _odoo_client = None # Aseguramos que no quede una instancia fallida
         return None
     except Exception as e:
         logging.error(f"ERROR INESPERADO al inicializar/conectar con odoorpc: {e}", exc_info=True)
-        _odoo_client = None
-        return None
\ No newline at end of file
+        return None
+
+
+class OdooSessionPool:
+    """
+    Pool acotado de clientes odoorpc ya logueados, seguro entre hilos.
+
+    Cada cliente guarda su registro de modelos (fields_get) entre peticiones,
+    así que reutilizarlo evita la conexión, la sonda de versión, el login y
+    el fields_get de cada modelo usado.
+    """
+
+    def __init__(self, size, checkout_timeout, health_check_interval):
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        # LIFO: el cliente usado más recientemente es el que menos probablemente haya caducado
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def checkout(self, timeout=None):
+        """
+        Toma un cliente del pool (o crea uno si hay hueco libre).
+        Devuelve None si no hay hueco tras `timeout` segundos o si Odoo no responde.
+        """
+        if timeout is None:
+            timeout = self.checkout_timeout
+        if not self._slots.acquire(timeout=timeout):
+            logging.error(f"Pool Odoo agotado: ningún cliente libre tras {timeout}s (tamaño={self.size}).")
+            return None
+
+        try:
+            while True:
+                try:
+                    client, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if self._ensure_alive(client, last_used):
+                    return client
+                # Cliente inutilizable: lo descartamos y probamos con el siguiente
+
+            client = _connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        if client is None:
+            self._slots.release()
+        return client
+
+    def checkin(self, client, discard=False):
+        """Devuelve un cliente al pool (o lo descarta si quedó en mal estado)."""
+        if client is not None and not discard:
+            self._idle.put((client, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """Context manager para código fuera de una petición (scripts, hilos de fondo)."""
+        client = self.checkout(timeout)
+        discard = False
+        try:
+            yield client
+        except (OSError, odoorpc.error.InternalError):
+            # Error de red/transporte: no devolvemos un cliente potencialmente roto
+            discard = True
+            raise
+        finally:
+            # Si client es None, checkout ya liberó su hueco al fallar
+            if client is not None:
+                self.checkin(client, discard=discard)
+
+    def _ensure_alive(self, client, last_used):
+        """Verifica un cliente inactivo y rehace el login si la sesión ya no es válida."""
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            # Llamada barata que valida uid/contraseña en el servidor
+            client.execute_kw('res.users', 'context_get', [])
+            return True
+        except odoorpc.error.RPCError as e:
+            logging.warning(f"Sesión Odoo caducada o inválida ({e}). Rehaciendo login...")
+            try:
+                client.login(odoo_db, odoo_user, odoo_password)
+                return True
+            except Exception as login_err:
+                logging.error(f"No se pudo rehacer el login en Odoo: {login_err}", exc_info=True)
+                return False
+        except Exception as e:
+            logging.warning(f"Cliente Odoo del pool no responde ({e}). Se descarta.")
+            return False
+
+
+_session_pool = OdooSessionPool(ODOO_POOL_SIZE, ODOO_POOL_TIMEOUT, ODOO_HEALTH_CHECK_INTERVAL)
+
+
+def odoo_session(timeout=None):
+    """Atajo: `with odoo_session() as client:` para trabajo fuera de las vistas."""
+    return _session_pool.session(timeout)
+
+
+def get_odoo_client():
+    """
+    Devuelve el cliente Odoo de la petición actual.
+
+    Dentro de una petición Flask el cliente sale del pool y queda ligado a `flask.g`
+    hasta el teardown (ver `release_odoo_client`). Fuera de Flask (scripts en
+    ong_app/scripts) se crea un cliente dedicado como antes.
+    """
+    if not has_app_context():
+        return _connect()
+
+    if 'odoo_client' not in g:
+        g.odoo_client = _session_pool.checkout()
+    return g.odoo_client
+
+
+def release_odoo_client(exc=None):
+    """Teardown de Flask: devuelve al pool el cliente que tomó la petición."""
+    client = g.pop('odoo_client', None)
+    if client is None:
+        return
+    # Si la petición terminó con un error de red, el cliente no vuelve al pool
+    discard = isinstance(exc, (OSError, odoorpc.error.InternalError))
+    _session_pool.checkin(client, discard=discard)
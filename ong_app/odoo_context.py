@@ -0,0 +1,100 @@
+# ong_app/odoo_context.py
+"""
+Request-scoped helpers on top of the request's Odoo client (flask.g).
+
+- odoo_model(name): model proxies built once per request.
+- read_records(model, ids, fields): reads memoized per request by
+  (model, id, field), so a record is never fetched twice in one request
+  (e.g. a picking name needed by both the success and the error paths).
+- forget_records(model, ids): drop memoized values after writing them.
+"""
+import logging
+
+from flask import g
+
+from .odoo_connector import get_odoo_client
+
+
+def odoo_model(name):
+    """
+    Model proxy (client.env[name]) of the request's client, built once per request.
+
+    :return: The proxy, or None if there is no Odoo connection.
+    """
+    client = get_odoo_client()
+    if client is None:
+        return None
+    models = g.setdefault('odoo_models', {})
+    if name not in models:
+        models[name] = client.env[name]
+    return models[name]
+
+
+def _record_cache():
+    return g.setdefault('odoo_record_cache', {})
+
+
+def read_records(model, ids, fields):
+    """
+    Reads records of model, fetching from Odoo only the (id, field) pairs not
+    already read in this request. One read call at most.
+
+    :param model: Odoo model name.
+    :param ids: Record ID or list of IDs.
+    :param fields: Fields to read ('id' is always included).
+    :return: List of dicts in the order of ids (IDs that do not exist are skipped).
+    """
+    if isinstance(ids, int):
+        ids = [ids]
+    fields = [field for field in fields if field != 'id']
+    cache = _record_cache()
+
+    missing_ids = [record_id for record_id in ids
+                   if not all(field in cache.get((model, record_id), {}) for field in fields)]
+    if missing_ids:
+        client = get_odoo_client()
+        if client is None:
+            raise ConnectionError("No Odoo connection available.")
+        # Fields still missing for any of those records, read together
+        missing_fields = sorted({field for record_id in missing_ids for field in fields
+                                 if field not in cache.get((model, record_id), {})})
+        records = client.execute_kw(model, 'read', [missing_ids], {'fields': missing_fields})
+        for record in records:
+            cache.setdefault((model, record['id']), {'id': record['id']}).update(record)
+        logging.debug(f"[odoo_context] read {model} {missing_ids} {missing_fields}")
+
+    result = []
+    for record_id in ids:
+        values = cache.get((model, record_id))
+        if values is not None and all(field in values for field in fields):
+            result.append({'id': record_id, **{field: values[field] for field in fields}})
+    return result
+
+
+def record_name(model, record_id, default=None, field='name'):
+    """
+    Display name of one record for messages; never raises.
+
+    :return: The record's name, or default (f"ID {record_id}" if None).
+    """
+    if default is None:
+        default = f"ID {record_id}"
+    try:
+        records = read_records(model, record_id, [field])
+    except Exception as e:
+        logging.debug(f"[odoo_context] Could not read {field} of {model} {record_id}: {e}")
+        return default
+    return (records[0].get(field) if records else None) or default
+
+
+def forget_records(model, ids=None):
+    """Drops memoized values of model (all of them, or only ids) after a write."""
+    cache = _record_cache()
+    if ids is None:
+        for key in [key for key in cache if key[0] == model]:
+            del cache[key]
+        return
+    if isinstance(ids, int):
+        ids = [ids]
+    for record_id in ids:
+        cache.pop((model, record_id), None)
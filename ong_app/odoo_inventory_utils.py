@@ -2,173 +2,262 @@
 import logging
 from odoorpc.error import RPCError
 
+from .odoo_batch import RpcBatch, StepTimer, load_record_graph
+from .odoo_refdata import get_virtual_locations, ref_id
+
 def find_virtual_location_id(odoo_client, usage_type='inventory'):
     """
     Finds the ID of a virtual location by its usage type ('inventory' or 'production').
     Returns the ID of the first one found or None.
 
+    When looking for 'inventory', 'production' is used as a fallback. The
+    virtual locations come from the reference-data cache, so this normally
+    costs no round-trip at all.
+
     :param odoo_client: Connected odoorpc client instance.
     :param usage_type: Usage type to search for ('inventory' or 'production').
     :return: Location ID or None.
     """
-    #
-    StockLocation = odoo_client.env['stock.location']
-    domain = [('usage', '=', usage_type)]
-    location_ids = StockLocation.search(domain, limit=1)
-    if location_ids:
-        # Log message translated
-        logging.info(f"Virtual location found with usage '{usage_type}': ID {location_ids[0]}")
-        return location_ids[0]
-    else:
-        # Log messages translated
-        logging.warning(f"Could not find a virtual location with usage '{usage_type}'.")
-        if usage_type == 'inventory':
-            logging.info("Attempting to find location with usage 'production'...")
-            return find_virtual_location_id(odoo_client, 'production')
-        return None
+    usages = [usage_type, 'production'] if usage_type == 'inventory' else [usage_type]
+    locations = get_virtual_locations(odoo_client)
+    for usage in usages:
+        location = next((loc for loc in locations if loc['usage'] == usage), None)
+        if location:
+            if usage != usage_type:
+                logging.warning(f"Could not find a virtual location with usage '{usage_type}'. Using usage '{usage}' instead.")
+            logging.info(f"Virtual location found with usage '{usage}': ID {location['id']}")
+            return location['id']
+    logging.warning(f"Could not find a virtual location with usage in {usages}.")
+    return None
 
-def add_initial_stock_via_receipt(odoo_client, product_id, quantity, target_location_id):
+def add_initial_stock_via_receipt(odoo_client, product_id, quantity, target_location_id,
+                                  product_uom_id=None, product_display_name=None,
+                                  source_location_id=None, timer=None, origin=None,
+                                  raise_transient_errors=False):
     """
     Adds initial stock by simulating a Receipt (stock.picking).
     Uses public API methods for confirmation and validation.
 
+    Callers that already know the product UoM/name or the virtual source
+    location (e.g. right after creating the product) can pass them to skip
+    the corresponding reads.
+
     :param odoo_client: Connected odoorpc client instance.
     :param product_id: ID of the product.product.
     :param quantity: Quantity to add (float).
     :param target_location_id: ID of the destination stock.location (internal).
-    :return: True if successful, False otherwise.
+    :param product_uom_id: Optional UoM ID of the product (skips the product read with product_display_name).
+    :param product_display_name: Optional display name of the product.
+    :param source_location_id: Optional virtual source location ID (skips the location search).
+    :param timer: Optional StepTimer collecting per-step timings.
+    :param origin: Optional picking origin (defaults to 'Initial Stock Entry Auto (Flask): <name>').
+    :param raise_transient_errors: If True, RPC and network errors are re-raised after logging
+                                   instead of returning False (used by the retrying job queue).
+    :return: ID of the receipt picking if successful (truthy), False otherwise.
     """
     # Log message translated
     logging.info(f"Attempting to add initial stock (via Receipt Picking) for product ID {product_id} in location ID {target_location_id}")
 
-    # Picking type ID for Receipts (stock.picking.type)
-    # ID confirmed as 1
-    RECEIPT_PICKING_TYPE_ID = 1 
-    
-    picking_id = None  # Initialize for error logging
-    source_location_id = None # Initialize for error logging
+    if timer is None:
+        timer = StepTimer('add_initial_stock')
 
     try:
-        ProductProduct = odoo_client.env['product.product']
-        
-        # 1. Get product info (UoM and Name)
-        product_info = ProductProduct.read(product_id, ['uom_id', 'display_name'])
-        if not product_info or not product_info[0].get('uom_id') or not product_info[0].get('display_name'):
-            # Log message translated
-            logging.error(f"Could not retrieve complete information (UoM/Name) for product ID {product_id}")
-            return False
-        product_uom_id = product_info[0]['uom_id'][0]
-        product_display_name = product_info[0]['display_name']
+        # 1. Get product info (UoM and Name), unless the caller already knows it
+        if not product_uom_id or not product_display_name:
+            with timer.step('read product'):
+                product_info = odoo_client.env['product.product'].read(product_id, ['uom_id', 'display_name'])
+            if not product_info or not product_info[0].get('uom_id') or not product_info[0].get('display_name'):
+                # Log message translated
+                logging.error(f"Could not retrieve complete information (UoM/Name) for product ID {product_id}")
+                return False
+            product_uom_id = product_info[0]['uom_id'][0]
+            product_display_name = product_info[0]['display_name']
         # Log message translated
         logging.info(f"Product ID {product_id} - Name: '{product_display_name}', UoM ID: {product_uom_id}")
 
-        # 2. Find virtual source location (as before)
-        source_location_id = find_virtual_location_id(odoo_client)
+    except RPCError as e:
+        logging.error(f"Odoo RPC Error while reading product {product_id} before adding stock: {e}", exc_info=True)
+        if raise_transient_errors:
+            raise
+        return False
+    except Exception as e:
+        logging.error(f"Unexpected error while reading product {product_id} before adding stock: {e}", exc_info=True)
+        if raise_transient_errors and isinstance(e, OSError):
+            raise
+        return False
+
+    # 2-8. Same receipt flow as a bulk import, with a single line
+    line = {'product_id': product_id, 'quantity': quantity,
+            'product_uom_id': product_uom_id, 'name': product_display_name}
+    picking_id = add_initial_stock_bulk_via_receipt(
+        odoo_client, [line], target_location_id,
+        source_location_id=source_location_id, timer=timer,
+        origin=origin or f'Initial Stock Entry Auto (Flask): {product_display_name}',
+        raise_transient_errors=raise_transient_errors,
+    )
+    if picking_id:
+        # Log message translated
+        logging.info(f"Success! Stock added correctly via Receipt Picking for product {product_id}.")
+        return picking_id
+    return False
+
+
+def _receipt_picking_vals(lines, picking_type_id, source_location_id, target_location_id, origin=None):
+    """Values of a Receipt (stock.picking) with one move per line."""
+    # Note: Locations in the picking define the general flow,
+    #       and move lines inherit this if not specified otherwise.
+    return {
+        'picking_type_id': picking_type_id,           # Picking type ID for Receipts (stock.picking.type)
+        'location_id': source_location_id,            # Source (Virtual)
+        'location_dest_id': target_location_id,       # Destination (Where you want the final stock)
+        'origin': origin or f'Initial Stock Entry Auto (Flask): {len(lines)} product(s)', 
+        'move_ids_without_package': [
+            # Command to create a new move line per product
+            (0, 0, { 
+                'name': line['name'],
+                'product_id': line['product_id'],
+                # Expected quantity
+                'product_uom_qty': line['quantity'],
+                # The unit of measure
+                'product_uom': line['product_uom_id'],
+                # Line source/destination (can inherit)
+                'location_id': source_location_id,    
+                'location_dest_id': target_location_id 
+            })
+            for line in lines
+        ]
+    }
+
+
+def _move_line_ids_by_qty(lines, move_lines_data):
+    """
+    Groups the move line IDs of a receipt by the done quantity they need.
+
+    :return: ({qty: [move_line_id, ...]}, [product IDs without move line])
+    """
+    quantity_by_product = {line['product_id']: line['quantity'] for line in lines}
+    move_line_ids_by_qty = {}
+    for move_line in move_lines_data:
+        qty = quantity_by_product.get(move_line['product_id'][0])
+        if qty is not None:
+            move_line_ids_by_qty.setdefault(qty, []).append(move_line['id'])
+
+    found_products = {move_line['product_id'][0] for move_line in move_lines_data}
+    missing_products = [line['product_id'] for line in lines if line['product_id'] not in found_products]
+    return move_line_ids_by_qty, missing_products
+
+
+def add_initial_stock_bulk_via_receipt(odoo_client, lines, target_location_id, source_location_id=None,
+                                       timer=None, origin=None, raise_transient_errors=False):
+    """
+    Adds initial stock for MANY products with ONE multi-line Receipt (stock.picking).
+
+    The number of RPCs does not grow with the number of lines: one create,
+    one action_assign, one move line search, one qty_done write per distinct
+    quantity, one button_validate and one final state read. The qty_done
+    writes touch disjoint move lines, so they are sent together in one
+    RpcBatch (concurrently on the asyncio transport when ODOO_ASYNC_TRANSPORT=1).
+
+    :param odoo_client: Connected odoorpc client instance.
+    :param lines: List of dicts with 'product_id', 'quantity', 'product_uom_id' and 'name'.
+    :param target_location_id: ID of the destination stock.location (internal).
+    :param source_location_id: Optional virtual source location ID (skips the location search).
+    :param timer: Optional StepTimer collecting per-step timings.
+    :param origin: Optional picking origin text.
+    :param raise_transient_errors: If True, RPC and network errors are re-raised after logging.
+    :return: ID of the receipt picking if successful, None otherwise.
+    """
+
+    if not lines:
+        logging.warning("add_initial_stock_bulk_via_receipt called without lines. Nothing to do.")
+        return None
+
+    if timer is None:
+        timer = StepTimer('add_initial_stock_bulk')
+
+    product_ids = [line['product_id'] for line in lines]
+    # Log message translated
+    logging.info(f"Attempting to add initial stock (via Receipt Picking) for {len(lines)} product(s) in location ID {target_location_id}")
+
+    picking_id = None  # Initialize for error logging
+
+    try:
+        # Picking type ID for Receipts (stock.picking.type), cached (ID confirmed as 1)
+        RECEIPT_PICKING_TYPE_ID = ref_id(odoo_client, 'receipt_picking_type')
+
+        # 2. Find virtual source location, unless the caller already knows it
+        if not source_location_id:
+            with timer.step('find source location'):
+                source_location_id = find_virtual_location_id(odoo_client)
         if not source_location_id:
             # Log message translated
             logging.error("Critical Error! Could not find a virtual source location ('inventory' or 'production').")
-            return False
+            return None
         # Log message translated
         logging.info(f"Using virtual source location ID: {source_location_id}")
             
         # 3. Prepare data to create the stock.picking (RECEIPT)
-        # Note: Locations in the picking define the general flow,
-        #       and move lines inherit this if not specified otherwise.
-        picking_vals = {
-            'picking_type_id': RECEIPT_PICKING_TYPE_ID,   # Picking type ID for Receipts (stock.picking.type)
-            'location_id': source_location_id,            # Source (Virtual)
-            'location_dest_id': target_location_id,       # Destination (Where you want the final stock)
-            # Descriptive text translated
-            'origin': f'Initial Stock Entry Auto (Flask): {product_display_name}', 
-            'move_ids_without_package': [
-                # Command to create a new move line translated
-                (0, 0, { 
-                    # Line description translated
-                    'name': product_display_name,         
-                    # The product
-                    'product_id': product_id,           
-                    # Expected quantity
-                    'product_uom_qty': quantity,        
-                    # The unit of measure
-                    'product_uom': product_uom_id,      
-                    # Line source (can inherit)
-                    'location_id': source_location_id,    
-                    # Line destination (can inherit)
-                    'location_dest_id': target_location_id 
-                })
-            ]
-        }
+        picking_vals = _receipt_picking_vals(lines, RECEIPT_PICKING_TYPE_ID, source_location_id, target_location_id, origin)
         # Log message translated
-        logging.info(f"Values to create stock.picking (Receipt): {picking_vals}")
+        logging.debug(f"Values to create stock.picking (Receipt): {picking_vals}")
 
         # 4. Create the stock.picking
-        picking_id = odoo_client.execute_kw('stock.picking', 'create', [picking_vals])
+        with timer.step('create picking'):
+            picking_id = odoo_client.execute_kw('stock.picking', 'create', [picking_vals])
+        if isinstance(picking_id, list): # Handle if it returns a list
+             picking_id = picking_id[0] if picking_id else None
         if not picking_id:
              # Log message translated
              logging.error("Stock picking creation (Receipt) did not return an ID.")
-             return False
-        if isinstance(picking_id, list): # Handle if it returns a list
-             if not picking_id:
-                 # Log message translated
-                 logging.error("Stock picking creation (Receipt) returned an empty list.")
-                 return False
-             picking_id = picking_id[0]
+             return None
         # Log message translated
         logging.info(f"Stock Picking (Receipt) created with ID: {picking_id}")
 
-        # 5. Confirm the Picking (public action)
-        # Log message translated
-        logging.info(f"Calling action_confirm for picking ID {picking_id}...")
-        odoo_client.execute_kw('stock.picking', 'action_confirm', [[picking_id]])
-        # Log message translated
-        logging.info(f"Picking ID {picking_id} confirmed.")
-
-        # 6. Reserve/Assign the Picking (public action)
+        # 5+6. Confirm and Reserve/Assign the Picking (public action)
+        # action_assign confirms draft pickings itself, so a separate action_confirm call is not needed
         # Log message translated
-        logging.info(f"Calling action_assign for picking ID {picking_id}...")
-        odoo_client.execute_kw('stock.picking', 'action_assign', [[picking_id]])
+        logging.info(f"Calling action_assign (confirms the draft) for picking ID {picking_id}...")
+        with timer.step('confirm+assign'):
+            odoo_client.execute_kw('stock.picking', 'action_assign', [[picking_id]])
         # Log message translated
-        logging.info(f"Assignment attempt sent for picking ID {picking_id}.")
-        
-        # 7. Update the qty_done for the move line (stock.move.line)
-        logging.info(f"Setting 'qty_done' = {quantity} for the lines of picking ID {picking_id}")
+        logging.info(f"Picking ID {picking_id} confirmed and assignment attempt sent.")
         
-        # Read the detailed move lines (stock.move.line) associated with the picking
-        move_lines_data = odoo_client.execute_kw(
-            'stock.move.line', 'search_read',
-            # Search for the line of our product
-            [[('picking_id', '=', picking_id), ('product_id', '=', product_id)]],
-            {'fields': ['id'], 'limit': 1} # need 'id'
-        )
-        
-        if not move_lines_data:
+        # 7. Update the qty_done for the move lines (stock.move.line)
+        # Read the detailed move lines (stock.move.line) associated with the picking, all at once
+        with timer.step('find move lines'):
+            move_lines_data = odoo_client.execute_kw(
+                'stock.move.line', 'search_read',
+                [[('picking_id', '=', picking_id), ('product_id', 'in', product_ids)]],
+                {'fields': ['id', 'product_id']}
+            )
+
+        # Group move line IDs by the done quantity they need: one write per distinct quantity
+        move_line_ids_by_qty, missing_products = _move_line_ids_by_qty(lines, move_lines_data)
+        if missing_products:
             # Log message translated
-            logging.error(f"Could not find stock.move.line for product {product_id} in picking {picking_id} after assigning. Cannot validate!")
+            logging.error(f"Could not find stock.move.line for products {missing_products} in picking {picking_id} after assigning. Cannot validate!")
             # could try to cancel the picking here if desired...
-            return False
-            
-        move_line_id = move_lines_data[0]['id']
-        # Log message translated
-        logging.info(f"Detailed move line found (stock.move.line) ID: {move_line_id}. Updating qty_done...")
-        
-        # Write the done quantity to the found line
-        write_ok = odoo_client.execute_kw(
-            'stock.move.line', 'write',
-            [[move_line_id], {'qty_done': quantity}]
-        )
-        if not write_ok:
-            
-             logging.error(f"Failed to write qty_done on stock.move.line ID {move_line_id}.")
-             return False
-        # Log message translated
-        logging.info(f"qty_done updated on stock.move.line ID {move_line_id}.")
+            return None
+
+        # Independent writes (disjoint move lines): one parallel round-trip
+        batch = RpcBatch(odoo_client, timer=timer, label='write qty_done')
+        for qty, move_line_ids in move_line_ids_by_qty.items():
+            # Log message translated
+            logging.info(f"Setting 'qty_done' = {qty} on {len(move_line_ids)} move line(s) of picking ID {picking_id}")
+            batch.add_kw(qty, 'stock.move.line', 'write', [move_line_ids, {'qty_done': qty}])
+        batch.run()
+        for qty, move_line_ids in move_line_ids_by_qty.items():
+            if not batch.result(qty):
+                 logging.error(f"Failed to write qty_done on stock.move.line IDs {move_line_ids}.")
+                 return None
         # --- END EXTRA STEP ---
 
         # 8. Validate/Process the Picking (public action of the "Validate" button)
         # Log message translated
         logging.info(f"Attempting to validate picking ID {picking_id} by calling button_validate...")
         # button_validate can return True or an action dictionary if extra steps are needed (e.g., backorder)
-        validation_result = odoo_client.execute_kw('stock.picking', 'button_validate', [[picking_id]])
+        with timer.step('validate'):
+            validation_result = odoo_client.execute_kw('stock.picking', 'button_validate', [[picking_id]])
         # Log message translated
         logging.info(f"Result of button_validate for picking ID {picking_id}: {validation_result}")
 
@@ -177,43 +266,49 @@ def add_initial_stock_via_receipt(odoo_client, product_id, quantity, target_loca
         if validation_result is False: # Explicit check in case it returns False
              # Log message translated
              logging.error(f"button_validate for picking ID {picking_id} returned False.")
-             return False
+             return None
 
-        # Verify final picking state (optional, but good)
-        final_picking_state_data = odoo_client.execute_kw('stock.picking', 'read', [[picking_id]], {'fields': ['state']})
-        final_picking_state = final_picking_state_data[0]['state'] if final_picking_state_data else 'unknown'
+        # Verify final picking state (optional, but good): picking and its moves in one round-trip
+        final_picking_data = load_record_graph(odoo_client, 'stock.picking', picking_id, ['state'], {
+            'moves': ('stock.move', 'picking_id', ['product_id', 'state']),
+        }, timer=timer, label='read final state')
+        final_picking_state = final_picking_data[0]['state'] if final_picking_data else 'unknown'
         # Log message translated
         logging.info(f"Stock Picking ID {picking_id}: Final state verified as '{final_picking_state}'.")
+        moves_not_done = [move['product_id'][1] for move in (final_picking_data[0]['moves'] if final_picking_data else [])
+                          if move['state'] != 'done' and move['product_id']]
+        if moves_not_done:
+            logging.warning(f"Stock Picking ID {picking_id}: moves not done for {moves_not_done}.")
         
-        if final_picking_state == 'done':
-            # Log message translated
-            logging.info(f"Success! Stock added correctly via Receipt Picking for product {product_id}.")
-            return True
-        else:
+        if final_picking_state != 'done':
             # If not 'done' but validation didn't raise a direct error, it might be waiting for a backorder.
             # For the purpose of adding initial stock, this might be sufficient, but it's good to log.
             # Log message translated
             logging.warning(f"Final state of picking {picking_id} is '{final_picking_state}' (not 'done'). Stock might be available, but review the picking in Odoo.")
-            # Decide whether to return True or False here. If the goal is ONLY available stock, True might be okay.
-            # If we want the entire flow to complete perfectly, it would be False. Let's be optimistic for now:
-            return True # Assume success if validation didn't explicitly fail
+        # Assume success if validation didn't explicitly fail
+        return picking_id
 
 
     except RPCError as e:
         # Log messages translated, error handling unchanged
         error_msg = f"Odoo RPC Error"
         if picking_id: error_msg += f" (Picking ID {picking_id})"
-        error_msg += f" while trying to add stock via Receipt for product {product_id}: {e}"
+        error_msg += f" while trying to add stock via Receipt for products {product_ids}: {e}"
         logging.error(error_msg, exc_info=True)
+        if raise_transient_errors:
+            raise
         # We could try to cancel the picking here too
         # if picking_id:
         #    try: odoo_client.execute_kw('stock.picking', 'action_cancel', [[picking_id]])
         #    except: pass
-        return False
+        return None
     except Exception as e:
         # Log messages translated, error handling unchanged
         error_msg = f"Unexpected error"
         if picking_id: error_msg += f" (Picking ID {picking_id})"
-        error_msg += f" while trying to add stock via Receipt for product {product_id}: {e}"
+        error_msg += f" while trying to add stock via Receipt for products {product_ids}: {e}"
         logging.error(error_msg, exc_info=True)
-        return False
\ No newline at end of file
+        # Network errors (URLError, timeouts...) are worth a retry too
+        if raise_transient_errors and isinstance(e, OSError):
+            raise
+        return None
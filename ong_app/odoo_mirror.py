@@ -0,0 +1,509 @@
+# ong_app/odoo_mirror.py
+"""
+Local read mirror of the Odoo records the list views show.
+
+Books (product.product, refreshed when either the variant or its template
+changes), partners, shipment pickings and sale orders are copied into a
+SQLite file. A daemon thread pulls only the records whose write_date moved
+past the last watermark of each model, and from time to time prunes records
+deleted in Odoo.
+
+paginated_search_read() asks the mirror first: when the model is fully
+synced, recent enough, and the domain/order can be translated to SQL, the
+page is served locally and Odoo is not called at all. Any non-GET request
+(i.e. a write through this app) marks the mirror dirty, so reads go back to
+Odoo until the next sync has caught up with that write.
+
+A list can switch between the mirror and Odoo from one page to the next, so
+both must sort alike: the order is always explicit (the spec's order is also
+sent to Odoo), and text columns are compared with the collation of the Odoo
+database (ODOO_MIRROR_COLLATION, registered in SQLite through the C
+library's strcoll). When that locale is not installed here, pages sorted on
+text are not served from the mirror.
+"""
+import json
+import locale
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, request
+
+from .odoo_batch import iter_changed_records
+from .odoo_connector import odoo_session
+
+# Records read from Odoo per search_read while syncing
+SYNC_BATCH_SIZE = 1000
+# Seconds between two checks for records deleted in Odoo
+PRUNE_INTERVAL = 3600
+
+# What is mirrored. fields: stored (and servable) fields; many2one / many2many:
+# how to translate domains on them; text: character columns (sorted with the
+# database collation); order: used when the caller gives none, on both paths;
+# parents: (model, link field) whose changes also refresh the linked records.
+MIRROR_SPECS = {
+    'product.product': {
+        'fields': ['id', 'name', 'default_code', 'description', 'description_sale',
+                   'product_tmpl_id', 'product_tag_ids', 'active'],
+        'many2one': ['product_tmpl_id'],
+        'many2many': ['product_tag_ids'],
+        'text': ['name', 'default_code', 'description', 'description_sale'],
+        'order': 'default_code asc, name asc, id asc',
+        'parents': [('product.template', 'product_tmpl_id')],
+    },
+    'res.partner': {
+        'fields': ['id', 'name', 'email', 'phone', 'is_company', 'active'],
+        'many2one': [],
+        'many2many': [],
+        'text': ['name', 'email', 'phone'],
+        'order': 'name asc, id asc',
+        'parents': [],
+    },
+    'stock.picking': {
+        'fields': ['id', 'name', 'state', 'origin', 'picking_type_id', 'location_id',
+                   'location_dest_id', 'scheduled_date'],
+        'many2one': ['picking_type_id', 'location_id', 'location_dest_id'],
+        'many2many': [],
+        'text': ['name', 'state', 'origin'],
+        'order': 'id desc',
+        'parents': [],
+    },
+    'sale.order': {
+        'fields': ['id', 'name', 'partner_id', 'amount_total', 'date_order', 'state'],
+        'many2one': ['partner_id'],
+        'many2many': [],
+        'text': ['name', 'state'],
+        'order': 'date_order desc, id desc',
+        'parents': [],
+    },
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror_records (
+    model TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    write_date TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (model, id)
+);
+CREATE TABLE IF NOT EXISTS mirror_m2m (
+    model TEXT NOT NULL,
+    record_id INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mirror_m2m_value ON mirror_m2m (model, field, value, record_id);
+CREATE INDEX IF NOT EXISTS idx_mirror_m2m_record ON mirror_m2m (model, record_id);
+CREATE TABLE IF NOT EXISTS mirror_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# SQLite collation name of the Odoo database's text ordering
+_COLLATION = 'odoo_text'
+
+
+def _text_collation(name):
+    """
+    Compare function sorting text like a PostgreSQL database with LC_COLLATE=name,
+    or None when that locale is not available in this process.
+    'C' / 'POSIX' compare bytes, which SQLite's BINARY collation already does.
+    """
+    if name.upper() in ('C', 'POSIX', 'C.UTF-8', 'C.UTF8'):
+        return 'BINARY'
+    try:
+        # Only LC_COLLATE: strcoll is the only function affected
+        locale.setlocale(locale.LC_COLLATE, name)
+    except locale.Error:
+        logging.warning(f"[odoo_mirror] Locale '{name}' (ODOO_MIRROR_COLLATION) is not installed: "
+                        "pages sorted on text are read from Odoo.")
+        return None
+    return locale.strcoll
+
+
+_SCALAR_OPERATORS = {'=': '=', '!=': '!=', '>': '>', '>=': '>=', '<': '<', '<=': '<='}
+_ORDER_TERM = re.compile(r'^\s*(\w+)(?:\s+(asc|desc))?\s*$', re.IGNORECASE)
+
+
+class _Untranslatable(Exception):
+    """The domain/order/fields cannot be answered from the mirror: ask Odoo."""
+
+
+def _sql_value(value):
+    # Odoo's False (empty value) is stored as JSON false, which SQLite reads as 0
+    if value is True:
+        return 1
+    if value is False:
+        return 0
+    return value
+
+
+class OdooMirror:
+    """
+    SQLite store of mirrored records, plus the freshness bookkeeping.
+
+    :param db_path: Path of the SQLite file (created if missing).
+    :param max_lag: Seconds after the last completed sync before reads go back to Odoo.
+    :param collation: LC_COLLATE of the Odoo database (see _text_collation).
+    """
+
+    def __init__(self, db_path, max_lag=120, collation='en_US.UTF-8'):
+        self.db_path = db_path
+        self.max_lag = max_lag
+        self._collate = _text_collation(collation)
+        # In-memory freshness state (per process)
+        self._lock = threading.Lock()
+        self._dirty_at = 0.0
+        self._sync_completed_at = 0.0
+        self._last_completed_start = 0.0
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if callable(self._collate):
+            conn.create_collation(_COLLATION, self._collate)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # --- State ---
+
+    def get_state(self, key, default=None):
+        with self._connection() as conn:
+            row = conn.execute("SELECT value FROM mirror_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_state(self, key, value):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO mirror_state (key, value) VALUES (?, ?)", (key, value))
+
+    def mark_dirty(self):
+        """A write went to Odoo: do not serve reads until a sync started after now completes."""
+        with self._lock:
+            self._dirty_at = time.monotonic()
+
+    def sync_started(self):
+        """Returns the start mark to pass to sync_completed()."""
+        return time.monotonic()
+
+    def sync_completed(self, started):
+        with self._lock:
+            self._sync_completed_at = time.monotonic()
+            self._last_completed_start = started
+
+    def is_fresh(self, model):
+        """True if model is fully synced, recently, and after the last write of this app."""
+        if model not in MIRROR_SPECS or self.get_state(f'ready:{model}') != '1':
+            return False
+        with self._lock:
+            return (self._last_completed_start > self._dirty_at
+                    and time.monotonic() - self._sync_completed_at <= self.max_lag)
+
+    # --- Writes ---
+
+    def apply(self, model, records):
+        """Upserts records (removing inactive ones) of model in one transaction."""
+        if not records:
+            return
+        spec = MIRROR_SPECS[model]
+        with self._connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                ids = [record['id'] for record in records]
+                self._delete(conn, model, ids)
+                active = [record for record in records if record.get('active', True)]
+                conn.executemany(
+                    "INSERT INTO mirror_records (model, id, write_date, data) VALUES (?, ?, ?, ?)",
+                    [(model, record['id'], record.get('write_date'),
+                      json.dumps({field: record.get(field) for field in spec['fields']}))
+                     for record in active])
+                for field in spec['many2many']:
+                    conn.executemany(
+                        "INSERT INTO mirror_m2m (model, record_id, field, value) VALUES (?, ?, ?, ?)",
+                        [(model, record['id'], field, value) for record in active for value in record.get(field) or []])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def remove_missing(self, model, existing_ids):
+        """Deletes the records of model whose ID is not in existing_ids. Returns how many."""
+        existing_ids = set(existing_ids)
+        with self._connection() as conn:
+            mirrored = [row[0] for row in conn.execute("SELECT id FROM mirror_records WHERE model = ?", (model,))]
+            missing = [record_id for record_id in mirrored if record_id not in existing_ids]
+            if missing:
+                conn.execute("BEGIN")
+                self._delete(conn, model, missing)
+                conn.execute("COMMIT")
+        return len(missing)
+
+    def _delete(self, conn, model, ids):
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM mirror_records WHERE model = ? AND id IN ({placeholders})", (model, *chunk))
+            conn.execute(f"DELETE FROM mirror_m2m WHERE model = ? AND record_id IN ({placeholders})", (model, *chunk))
+
+    # --- Reads ---
+
+    def search_read(self, model, domain, fields, offset=0, limit=None, order=None, with_total=False):
+        """
+        Same contract as Odoo's search_read for simple domains (AND of leaves).
+
+        :raises _Untranslatable: If a field, operator or order is not supported.
+        :return: (records, total) - total is None unless with_total.
+        """
+        spec = MIRROR_SPECS[model]
+        unknown = [field for field in fields if field not in spec['fields']]
+        if unknown:
+            raise _Untranslatable(f"fields {unknown} not mirrored")
+        where, params = self._translate_domain(model, spec, domain)
+        order_sql = self._translate_order(spec, order or spec['order'])
+
+        sql = f"SELECT data FROM mirror_records WHERE model = ? AND {where} ORDER BY {order_sql}"
+        query_params = [model, *params]
+        if limit:
+            sql += " LIMIT ? OFFSET ?"
+            query_params += [limit, offset]
+        elif offset:
+            sql += " LIMIT -1 OFFSET ?"
+            query_params.append(offset)
+        with self._connection() as conn:
+            rows = conn.execute(sql, query_params).fetchall()
+            total = None
+            if with_total:
+                total = conn.execute(f"SELECT COUNT(*) FROM mirror_records WHERE model = ? AND {where}",
+                                     [model, *params]).fetchone()[0]
+        records = []
+        for row in rows:
+            data = json.loads(row['data'])
+            records.append({field: data.get(field) for field in fields})
+        return records, total
+
+    def _translate_domain(self, model, spec, domain):
+        clauses, params = [], []
+        for leaf in domain:
+            if leaf == '&':
+                continue
+            if not isinstance(leaf, (list, tuple)) or len(leaf) != 3:
+                # '|' / '!' and other forms: let Odoo answer
+                raise _Untranslatable(f"domain element {leaf!r}")
+            field, operator, value = leaf
+            if field in spec['many2many']:
+                values = list(value) if isinstance(value, (list, tuple)) else [value]
+                if not values:
+                    clauses.append("0" if operator in ('=', 'in') else "1")
+                    continue
+                placeholders = ", ".join("?" * len(values))
+                exists = (f"EXISTS (SELECT 1 FROM mirror_m2m m WHERE m.model = ? AND m.record_id = mirror_records.id"
+                          f" AND m.field = ? AND m.value IN ({placeholders}))")
+                if operator in ('=', 'in'):
+                    clauses.append(exists)
+                elif operator in ('!=', 'not in'):
+                    clauses.append(f"NOT {exists}")
+                else:
+                    raise _Untranslatable(f"operator {operator} on {field}")
+                params += [model, field, *values]
+                continue
+
+            if field == 'id':
+                column = "mirror_records.id"
+            elif field in spec['many2one']:
+                column = f"json_extract(data, '$.{field}[0]')"
+            elif field in spec['fields']:
+                column = f"json_extract(data, '$.{field}')"
+            else:
+                raise _Untranslatable(f"field {field} not mirrored")
+
+            if operator in ('in', 'not in'):
+                values = [_sql_value(v) for v in value]
+                if not values:
+                    clauses.append("0" if operator == 'in' else "1")
+                    continue
+                placeholders = ", ".join("?" * len(values))
+                clauses.append(f"{column} {'IN' if operator == 'in' else 'NOT IN'} ({placeholders})")
+                params += values
+            elif operator in _SCALAR_OPERATORS:
+                if field in spec['many2one'] and value is False:
+                    # "not set": the many2one is stored as false, not as [id, name]
+                    column = f"json_extract(data, '$.{field}')"
+                clauses.append(f"{column} {_SCALAR_OPERATORS[operator]} ?")
+                params.append(_sql_value(value))
+            else:
+                raise _Untranslatable(f"operator {operator}")
+        return (" AND ".join(clauses) if clauses else "1"), params
+
+    def _translate_order(self, spec, order):
+        """ORDER BY of an Odoo order, sorting as PostgreSQL would (see the module docstring)."""
+        terms = []
+        for part in order.split(','):
+            match = _ORDER_TERM.match(part)
+            if not match:
+                raise _Untranslatable(f"order {order}")
+            field, direction = match.group(1), (match.group(2) or 'asc').upper()
+            if field == 'id':
+                terms.append(f"mirror_records.id {direction}")
+            elif field in spec['fields'] and field not in spec['many2one'] and field not in spec['many2many']:
+                collate = ''
+                if field in spec['text']:
+                    if self._collate is None:
+                        raise _Untranslatable(f"text order on {field} without the database collation")
+                    if callable(self._collate):
+                        collate = f" COLLATE {_COLLATION}"
+                # Empty values (false) sort like NULLs in PostgreSQL: last when ascending, first when descending
+                terms.append(f"json_type(data, '$.{field}') = 'false' {direction},"
+                             f" json_extract(data, '$.{field}'){collate} {direction}")
+            else:
+                raise _Untranslatable(f"order on {field}")
+        return ", ".join(terms)
+
+
+def sync_model(mirror, client, model):
+    """
+    Pulls the records of model changed since its watermark (and the records
+    linked to changed parents). Returns how many records were stored.
+    """
+    spec = MIRROR_SPECS[model]
+    fields = spec['fields'] + ['write_date']
+    total = 0
+
+    watermark = mirror.get_state(f'watermark:{model}')
+    domain = [('write_date', '>=', watermark)] if watermark else []
+    newest = watermark
+    for records in iter_changed_records(client, model, domain, fields, batch_size=SYNC_BATCH_SIZE):
+        mirror.apply(model, records)
+        total += len(records)
+        newest = max(newest or '', records[-1]['write_date'])
+    if newest and newest != watermark:
+        mirror.set_state(f'watermark:{model}', newest)
+
+    for parent_model, link_field in spec['parents']:
+        parent_key = f'watermark:{model}<{parent_model}'
+        # Not watched yet: the full sync above already read every record, so watch from its newest one
+        parent_watermark = mirror.get_state(parent_key) or newest
+        if not parent_watermark:
+            # No record yet, nothing to watch from ('' is not a valid timestamp for Odoo)
+            continue
+        parent_newest = parent_watermark
+        for parents in iter_changed_records(client, parent_model, [('write_date', '>=', parent_watermark)],
+                                            ['id', 'write_date'], batch_size=SYNC_BATCH_SIZE):
+            parent_newest = max(parent_newest, parents[-1]['write_date'])
+            for records in iter_changed_records(client, model, [(link_field, 'in', [p['id'] for p in parents])],
+                                                fields, batch_size=SYNC_BATCH_SIZE):
+                mirror.apply(model, records)
+                total += len(records)
+        if parent_newest:
+            mirror.set_state(parent_key, parent_newest)
+
+    if mirror.get_state(f'ready:{model}') != '1':
+        mirror.set_state(f'ready:{model}', '1')
+        logging.info(f"[odoo_mirror] Initial sync of {model} complete.")
+    if total:
+        logging.info(f"[odoo_mirror] {total} {model} record(s) synced (watermark {newest}).")
+    return total
+
+
+def prune_model(mirror, client, model):
+    """Removes the mirrored records of model deleted in Odoo (one search of IDs)."""
+    existing_ids = client.execute_kw(model, 'search', [[]], {'context': {'active_test': False}})
+    removed = mirror.remove_missing(model, existing_ids)
+    if removed:
+        logging.info(f"[odoo_mirror] {removed} {model} record(s) deleted in Odoo removed from the mirror.")
+    return removed
+
+
+class MirrorSync:
+    """Daemon thread syncing every mirrored model each interval seconds."""
+
+    def __init__(self, mirror, interval=15):
+        self.mirror = mirror
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._last_prune = 0.0
+
+    def start(self):
+        threading.Thread(target=self._loop, name='odoo-mirror-sync', daemon=True).start()
+        logging.info(f"[odoo_mirror] Sync thread started (every {self.interval}s).")
+
+    def notify(self):
+        """Sync right away (called after writes)."""
+        self._wakeup.set()
+
+    def run_once(self):
+        started = self.mirror.sync_started()
+        with odoo_session() as client:
+            if client is None:
+                logging.warning("[odoo_mirror] No Odoo connection, mirror not synced.")
+                return False
+            for model in MIRROR_SPECS:
+                sync_model(self.mirror, client, model)
+            if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                for model in MIRROR_SPECS:
+                    prune_model(self.mirror, client, model)
+                self._last_prune = time.monotonic()
+        self.mirror.sync_completed(started)
+        return True
+
+    def _loop(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"[odoo_mirror] Error syncing the mirror: {e}", exc_info=True)
+            self._wakeup.wait(self.interval)
+
+
+def init_odoo_mirror(app):
+    """Create the mirror (and start its sync thread) if ODOO_MIRROR_ENABLED."""
+    if not app.config.get('ODOO_MIRROR_ENABLED'):
+        logging.info("[odoo_mirror] Local read mirror disabled; list views read from Odoo.")
+        return
+    mirror = OdooMirror(app.config['ODOO_MIRROR_DB'], max_lag=app.config['ODOO_MIRROR_MAX_LAG'],
+                        collation=app.config['ODOO_MIRROR_COLLATION'])
+    sync = MirrorSync(mirror, interval=app.config['ODOO_MIRROR_SYNC_INTERVAL'])
+    sync.start()
+    app.extensions['odoo_mirror'] = (mirror, sync)
+
+    @app.after_request
+    def _mark_mirror_dirty(response):
+        # Any write done through the app: read from Odoo until the mirror has caught up
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            mirror.mark_dirty()
+            sync.notify()
+        return response
+
+
+def mirror_default_order(model):
+    """Order of a mirrored model's lists when the caller gives none (None if not mirrored)."""
+    spec = MIRROR_SPECS.get(model)
+    return spec['order'] if spec else None
+
+
+def mirror_search_read(model, domain, fields, offset=0, limit=None, order=None, with_total=False):
+    """
+    Answers a search_read from the mirror of the current app if it can.
+
+    :return: (records, total), or None if Odoo must be asked (mirror disabled,
+             model not mirrored/fresh, or domain/order not translatable).
+    """
+    mirror_and_sync = current_app.extensions.get('odoo_mirror')
+    if not mirror_and_sync:
+        return None
+    mirror = mirror_and_sync[0]
+    if not mirror.is_fresh(model):
+        return None
+    try:
+        return mirror.search_read(model, domain, fields, offset=offset, limit=limit, order=order, with_total=with_total)
+    except _Untranslatable as e:
+        logging.debug(f"[odoo_mirror] {model} query not served from the mirror: {e}")
+        return None
@@ -0,0 +1,204 @@
+# ong_app/odoo_refdata.py
+"""
+Process-wide TTL cache of Odoo reference data.
+
+Tags, locations, picking types and units of measure almost never change, but
+the routes used to either search them on every request (virtual locations) or
+hard-code their IDs. Results are cached by model + domain (+ fields/order/
+limit) for REFDATA_TTL seconds, can be invalidated explicitly, and are warmed
+up in the background when the app starts.
+"""
+import logging
+import os
+import threading
+import time
+
+from .odoo_connector import odoo_session
+
+# Seconds a reference-data entry stays valid
+REFDATA_TTL = int(os.environ.get('ODOO_REFDATA_TTL', 600))
+
+# Reference IDs the app needs, resolved by XML-id or name and cached.
+# key: (model, xmlid, name, default ID used when neither resolves)
+REFERENCES = {
+    # Receipts operation type (initial stock)
+    'receipt_picking_type': ('stock.picking.type', 'stock.picking_type_in', None, 1),
+    # 'Branch Shipments' operation type
+    'shipment_picking_type': ('stock.picking.type', None, 'Branch Shipments', 7),
+    # 'Stock Books Approved ONG': where donated books are stored and shipped from
+    'book_stock_location': ('stock.location', None, 'Stock Books Approved ONG', 30),
+}
+
+
+class ReferenceCache:
+    """
+    Thread-safe TTL cache. Keys are tuples whose first item is the Odoo model,
+    so all the entries of a model can be invalidated at once.
+
+    :param ttl: Default time to live in seconds.
+    """
+
+    def __init__(self, ttl=REFDATA_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, ttl=None):
+        """Returns the cached value of key, calling loader() when missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+        # Loaded outside the lock: a slow Odoo call must not block the other keys
+        value = loader()
+        with self._lock:
+            self._entries[key] = (now + (self.ttl if ttl is None else ttl), value)
+        return value
+
+    def invalidate(self, model=None):
+        """Drops every entry of model (or everything if model is None). Returns the number dropped."""
+        with self._lock:
+            if model is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key in self._entries if key[0] == model]
+                for key in keys:
+                    del self._entries[key]
+                dropped = len(keys)
+        return dropped
+
+
+_cache = ReferenceCache()
+
+
+def _freeze(value):
+    """Hashable version of a domain (lists -> tuples)."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def cached_search_read(client, model, domain, fields, order=None, limit=None, ttl=None):
+    """
+    search_read served from the reference cache.
+
+    :param client: Connected odoorpc client instance (only used on a cache miss).
+    :param model: Odoo model name.
+    :param domain: Search domain.
+    :param fields: Fields to read.
+    :param order: Optional order.
+    :param limit: Optional limit.
+    :param ttl: Optional TTL overriding REFDATA_TTL for this entry.
+    :return: List of record dicts (copies, safe to modify).
+    """
+    key = (model, _freeze(domain), tuple(fields), order, limit)
+
+    def load():
+        kwargs = {'fields': list(fields)}
+        if order:
+            kwargs['order'] = order
+        if limit:
+            kwargs['limit'] = limit
+        logging.info(f"[refdata] Cache miss: {model} search_read {domain}")
+        return client.execute_kw(model, 'search_read', [domain], kwargs)
+
+    return [dict(record) for record in _cache.get(key, load, ttl)]
+
+
+def resolve_xmlid(client, xmlid):
+    """Returns the database ID of an XML-id ('module.name'), or None."""
+    module, name = xmlid.split('.', 1)
+    rows = cached_search_read(client, 'ir.model.data',
+                              [('module', '=', module), ('name', '=', name)], ['res_id'], limit=1)
+    return rows[0]['res_id'] if rows else None
+
+
+def resolve_name(client, model, name):
+    """Returns the ID of the first record of model with exactly this name, or None."""
+    rows = cached_search_read(client, model, [('name', '=', name)], ['id'], order='id asc', limit=1)
+    return rows[0]['id'] if rows else None
+
+
+def ref_id(client, key):
+    """
+    ID of one of the REFERENCES, resolved by XML-id then name (cached),
+    falling back to its known default ID.
+
+    :param client: Connected odoorpc client instance, or None to use the default.
+    :param key: Key of REFERENCES (e.g. 'shipment_picking_type').
+    :return: Record ID.
+    """
+    model, xmlid, name, default = REFERENCES[key]
+    if client is None:
+        return default
+    try:
+        if xmlid:
+            record_id = resolve_xmlid(client, xmlid)
+            if record_id:
+                return record_id
+        if name:
+            record_id = resolve_name(client, model, name)
+            if record_id:
+                return record_id
+    except Exception as e:
+        logging.warning(f"[refdata] Error resolving '{key}' ({xmlid or name}): {e}. Using default ID {default}.")
+        return default
+    logging.debug(f"[refdata] '{key}' not found by XML-id/name. Using default ID {default}.")
+    return default
+
+
+def get_virtual_locations(client):
+    """Virtual 'inventory' and 'production' locations ('inventory' first)."""
+    return cached_search_read(client, 'stock.location', [('usage', 'in', ['inventory', 'production'])],
+                              ['id', 'usage'], order='usage asc, id asc')
+
+
+def get_product_tags(client):
+    """All product tags (id, name)."""
+    return cached_search_read(client, 'product.tag', [], ['id', 'name'], order='id asc')
+
+
+def get_picking_types(client):
+    """All operation types (id, name, code)."""
+    return cached_search_read(client, 'stock.picking.type', [], ['id', 'name', 'code'], order='id asc')
+
+
+def get_uoms(client):
+    """All units of measure (id, name)."""
+    return cached_search_read(client, 'uom.uom', [], ['id', 'name'], order='id asc')
+
+
+def invalidate_reference_data(model=None):
+    """Forgets the cached reference data of model (or all of it)."""
+    dropped = _cache.invalidate(model)
+    logging.info(f"[refdata] Invalidated {dropped} cached entr{'y' if dropped == 1 else 'ies'} ({model or 'all models'}).")
+    return dropped
+
+
+def warm_up_reference_data(client):
+    """Loads the usual reference data into the cache."""
+    start = time.perf_counter()
+    get_virtual_locations(client)
+    get_product_tags(client)
+    get_picking_types(client)
+    get_uoms(client)
+    for key in REFERENCES:
+        ref_id(client, key)
+    logging.info(f"[refdata] Reference data warmed up in {(time.perf_counter() - start) * 1000.0:.0f}ms.")
+
+
+def start_reference_data_warm_up():
+    """Warms the cache up in a daemon thread, so app start-up never waits for Odoo."""
+    def run():
+        try:
+            with odoo_session() as client:
+                if client is None:
+                    logging.warning("[refdata] No Odoo connection, reference data will be loaded on first use.")
+                    return
+                warm_up_reference_data(client)
+        except Exception as e:
+            logging.warning(f"[refdata] Warm-up failed, reference data will be loaded on first use: {e}", exc_info=True)
+
+    threading.Thread(target=run, name='refdata-warm-up', daemon=True).start()
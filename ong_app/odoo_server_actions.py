@@ -0,0 +1,112 @@
+# ong_app/odoo_server_actions.py
+"""
+Small server-side methods installed in Odoo as server actions.
+
+Some operations need several dependent calls (e.g. create a sale order, then
+confirm it with the new ID), which means several round-trips over the API.
+Odoo runs the Python code of an ir.actions.server on the server, in one
+transaction, and returns the 'action' value it sets. Each entry of
+SERVER_ACTIONS is created in Odoo the first time it is needed (and updated
+if its code changed), then run with one execute_kw; its input goes in the
+context.
+
+Creating server actions requires the API user to be an administrator
+(Settings). When that is not possible, run_server_action raises
+ServerActionUnavailable and the caller falls back to its plain API calls.
+Only a lack of rights (or a missing model) is remembered until restart; a
+transient failure (network, timeout, lock...) falls back for that call only
+and the installation is tried again next time.
+"""
+import logging
+import os
+import threading
+
+from odoorpc.error import RPCError
+
+from .odoo_refdata import cached_search_read, invalidate_reference_data
+
+# Set to 0 to never install/run server actions (always use the plain API calls)
+ODOO_SERVER_ACTIONS = os.environ.get('ODOO_SERVER_ACTIONS', '1') == '1'
+
+# key: (model of the action, name in Odoo, Python code run by Odoo's safe_eval)
+SERVER_ACTIONS = {
+    'create_confirmed_donation': (
+        'sale.order',
+        'ONG Flask App: create and confirm monetary donation',
+        # Input: context['ong_order_vals'] (sale.order values). Create and confirm
+        # run in the same transaction: on error nothing is left behind.
+        "order = env['sale.order'].create(env.context['ong_order_vals'])\n"
+        "order.action_confirm()\n"
+        "action = {'order_id': order.id, 'name': order.name, 'state': order.state}\n",
+    ),
+}
+
+
+class ServerActionUnavailable(Exception):
+    """The server action cannot be installed in Odoo (rights, disabled...)."""
+
+
+# Keys that cannot be installed (no rights, missing model): not retried until restart
+_unavailable = set()
+_install_lock = threading.Lock()
+
+
+def _is_access_error(error):
+    """True if Odoo refused the call for lack of rights (odoo.exceptions.AccessError)."""
+    if not isinstance(error, RPCError):
+        return False
+    data = (getattr(error, 'info', None) or {}).get('data') or {}
+    return data.get('exception_type') == 'access_error' or str(data.get('name', '')).endswith('AccessError')
+
+
+def _install(client, key):
+    """ID of the server action of key, created or updated in Odoo if needed."""
+    model, name, code = SERVER_ACTIONS[key]
+    rows = cached_search_read(client, 'ir.actions.server', [('name', '=', name)], ['id', 'code'],
+                              order='id asc', limit=1)
+    if rows and rows[0]['code'] == code:
+        return rows[0]['id']
+    with _install_lock:
+        if rows:
+            client.execute_kw('ir.actions.server', 'write', [[rows[0]['id']], {'code': code}])
+            action_id = rows[0]['id']
+            logging.info(f"[server_actions] Server action '{name}' (ID {action_id}) updated in Odoo.")
+        else:
+            model_rows = cached_search_read(client, 'ir.model', [('model', '=', model)], ['id'], limit=1)
+            if not model_rows:
+                raise ServerActionUnavailable(f"Model {model} not found in Odoo.")
+            action_id = client.execute_kw('ir.actions.server', 'create', [{
+                'name': name,
+                'model_id': model_rows[0]['id'],
+                'state': 'code',
+                'code': code,
+            }])
+            logging.info(f"[server_actions] Server action '{name}' installed in Odoo (ID {action_id}).")
+        invalidate_reference_data('ir.actions.server')
+    return action_id
+
+
+def run_server_action(client, key, context):
+    """
+    Runs one of the SERVER_ACTIONS in a single execute_kw.
+
+    :param client: Connected odoorpc client instance.
+    :param key: Key of SERVER_ACTIONS.
+    :param context: Input values of the action (merged into its context).
+    :return: The 'action' value set by the action's code.
+    :raises ServerActionUnavailable: Disabled, or it could not be installed in Odoo (now or for good).
+    :raises odoorpc.error.RPCError: The action itself failed (nothing was committed).
+    """
+    if not ODOO_SERVER_ACTIONS or key in _unavailable:
+        raise ServerActionUnavailable(f"Server action '{key}' not available.")
+    try:
+        action_id = _install(client, key)
+    except Exception as e:
+        if isinstance(e, ServerActionUnavailable) or _is_access_error(e):
+            _unavailable.add(key)
+            logging.warning(f"[server_actions] Could not install server action '{key}', using plain API calls from now on: {e}")
+        else:
+            logging.warning(f"[server_actions] Could not install server action '{key}' this time, using plain API calls: {e}")
+        raise ServerActionUnavailable(str(e))
+    # The user's context (lang, tz...) plus the action's input
+    return client.execute_kw('ir.actions.server', 'run', [[action_id]], {'context': {**client.env.context, **context}})
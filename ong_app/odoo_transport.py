@@ -0,0 +1,123 @@
+# ong_app/odoo_transport.py
+"""
+HTTP transport for the odoorpc clients.
+
+odoorpc sends every call through a urllib opener. The default one opens a
+new TCP (and TLS) connection per call and uses a single timeout for
+everything. The opener built here:
+
+- keeps one persistent HTTP/1.1 connection per client (a pooled client is
+  used by one thread at a time, so its connection is never shared) and
+  reconnects once if the server closed it while idle;
+- asks for gzip responses and inflates them (large search_read answers
+  shrink a lot when Odoo sits behind a compressing proxy such as nginx);
+- uses a short connect timeout and a separate, longer read timeout.
+
+Request bodies are not compressed: Odoo does not inflate gzip request bodies.
+"""
+import gzip
+import http.client
+import io
+import logging
+import os
+import urllib.request
+from http.cookiejar import CookieJar
+from urllib.response import addinfourl
+
+# Persistent connections and gzip responses (set to 0 to get the plain urllib opener back)
+ODOO_HTTP_KEEPALIVE = os.environ.get('ODOO_HTTP_KEEPALIVE', '1') == '1'
+ODOO_HTTP_GZIP = os.environ.get('ODOO_HTTP_GZIP', '1') == '1'
+# Seconds to open the TCP/TLS connection / to wait for an answer
+ODOO_CONNECT_TIMEOUT = float(os.environ.get('ODOO_CONNECT_TIMEOUT', 10))
+ODOO_READ_TIMEOUT = float(os.environ.get('ODOO_READ_TIMEOUT', 60))
+
+
+class _KeepAliveMixin:
+    """Sends every request of this handler over one persistent connection."""
+
+    connection_class = None
+
+    def __init__(self, connect_timeout=ODOO_CONNECT_TIMEOUT, read_timeout=ODOO_READ_TIMEOUT,
+                 accept_gzip=ODOO_HTTP_GZIP, **connection_kwargs):
+        super().__init__()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.accept_gzip = accept_gzip
+        self.connection_kwargs = connection_kwargs
+        self._connection = None
+        self._connection_host = None
+
+    def _open_keep_alive(self, request):
+        host = request.host
+        if self._connection is not None and self._connection_host == host:
+            try:
+                return self._send(self._connection, request)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                # The server dropped the idle connection before reading this request: resend on a new one
+                logging.debug(f"[odoo_transport] Kept-alive connection to {host} closed by the server ({e}), reconnecting.")
+                self.close()
+            except Exception:
+                self.close()
+                raise
+        self._connection = self.connection_class(host, timeout=self.connect_timeout, **self.connection_kwargs)
+        self._connection_host = host
+        try:
+            return self._send(self._connection, request)
+        except Exception:
+            self.close()
+            raise
+
+    def _send(self, connection, request):
+        if connection.sock is None:
+            connection.connect()
+            # The connect timeout is over: answers may take longer
+            connection.sock.settimeout(self.read_timeout)
+        headers = {name.title(): value for name, value in request.header_items()}
+        headers['Connection'] = 'keep-alive'
+        if self.accept_gzip:
+            headers['Accept-Encoding'] = 'gzip'
+        connection.request(request.get_method(), request.selector, request.data, headers)
+        response = connection.getresponse()
+        # Read the whole body now so the connection is free for the next call
+        body = response.read()
+        if response.getheader('Content-Encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        if response.will_close:
+            self.close()
+        result = addinfourl(io.BytesIO(body), response.headers, request.get_full_url(), response.status)
+        result.msg = response.reason
+        return result
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
+
+
+class KeepAliveHTTPHandler(_KeepAliveMixin, urllib.request.HTTPHandler):
+    connection_class = http.client.HTTPConnection
+
+    def http_open(self, request):
+        return self._open_keep_alive(request)
+
+
+class KeepAliveHTTPSHandler(_KeepAliveMixin, urllib.request.HTTPSHandler):
+    connection_class = http.client.HTTPSConnection
+
+    def https_open(self, request):
+        return self._open_keep_alive(request)
+
+
+def build_odoo_opener(use_ssl=False, connect_timeout=ODOO_CONNECT_TIMEOUT, read_timeout=ODOO_READ_TIMEOUT):
+    """
+    urllib opener for odoorpc.ODOO(..., opener=...): cookies (as odoorpc's own
+    opener) plus, unless ODOO_HTTP_KEEPALIVE=0, the keep-alive/gzip handler.
+
+    :param use_ssl: Build the HTTPS handler instead of the HTTP one.
+    :return: urllib.request.OpenerDirector
+    """
+    handlers = [urllib.request.HTTPCookieProcessor(CookieJar())]
+    if ODOO_HTTP_KEEPALIVE:
+        handler_class = KeepAliveHTTPSHandler if use_ssl else KeepAliveHTTPHandler
+        handlers.append(handler_class(connect_timeout=connect_timeout, read_timeout=read_timeout))
+    return urllib.request.build_opener(*handlers)
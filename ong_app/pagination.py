@@ -0,0 +1,133 @@
+# ong_app/pagination.py
+"""
+Server-side pagination of the list views.
+
+Each page is ONE search_read with limit/offset; one extra record is fetched
+to know whether a next page exists, so the total (search_count) is only
+computed when the user asks for it (?count=1). Pages are served from the
+local mirror (odoo_mirror.py) whenever it is fresh, without calling Odoo.
+"""
+import logging
+
+from .odoo_batch import RpcBatch
+from .odoo_mirror import mirror_default_order, mirror_search_read
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Choices offered in the page-size selector of the templates
+PAGE_SIZE_CHOICES = (25, 50, 100, 200)
+
+
+class Page:
+    """
+    One page of records plus what the templates need for next/prev links.
+
+    :param records: Records of this page (list of dicts).
+    :param page: Page number (1-based).
+    :param page_size: Records per page.
+    :param has_next: Whether another page follows.
+    :param total: Total number of records, or None if not requested.
+    """
+
+    def __init__(self, records, page, page_size, has_next, total=None):
+        self.records = records
+        self.page = page
+        self.page_size = page_size
+        self.has_next = has_next
+        self.total = total
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_page(self):
+        return self.page - 1
+
+    @property
+    def next_page(self):
+        return self.page + 1
+
+    @property
+    def total_pages(self):
+        if self.total is None:
+            return None
+        return max(1, -(-self.total // self.page_size))
+
+    @property
+    def first_index(self):
+        """1-based position of the first record of the page (0 if empty)."""
+        return (self.page - 1) * self.page_size + 1 if self.records else 0
+
+    @property
+    def last_index(self):
+        return (self.page - 1) * self.page_size + len(self.records)
+
+
+def get_page_args(args, default_page_size=DEFAULT_PAGE_SIZE):
+    """
+    Reads page, page_size and count from the query string, tolerating bad values.
+
+    :param args: request.args
+    :param default_page_size: Page size when none (or an invalid one) is given.
+    :return: (page, page_size, with_total)
+    """
+    try:
+        page = max(1, int(args.get('page', 1)))
+    except (TypeError, ValueError):
+        page = 1
+    try:
+        page_size = int(args.get('page_size', default_page_size))
+    except (TypeError, ValueError):
+        page_size = default_page_size
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+    with_total = args.get('count') == '1'
+    return page, page_size, with_total
+
+
+def paginated_search_read(client, model, domain, fields, page=1, page_size=DEFAULT_PAGE_SIZE,
+                          order=None, with_total=False):
+    """
+    Reads one page of model records in a single search_read.
+
+    The order must end with a unique field (e.g. 'name asc, id asc') so that
+    pages neither repeat nor skip records.
+
+    :param client: Connected odoorpc client instance.
+    :param model: Odoo model name.
+    :param domain: Search domain.
+    :param fields: Fields to read.
+    :param page: Page number (1-based).
+    :param page_size: Records per page.
+    :param order: Optional order (if None: the mirror's order for mirrored models, else the model default).
+    :param with_total: Also run a search_count for the total (in parallel with the page).
+    :return: Page
+    """
+    offset = (page - 1) * page_size
+    # Same explicit order from the mirror and from Odoo: a list switching between them keeps its pages
+    order = order or mirror_default_order(model)
+    mirrored = mirror_search_read(model, domain, fields, offset=offset, limit=page_size + 1,
+                                  order=order, with_total=with_total)
+    if mirrored is not None:
+        records, total = mirrored
+        has_next = len(records) > page_size
+        logging.debug(f"[pagination] {model} page {page} served from the local mirror.")
+        return Page(records[:page_size], page, page_size, has_next, total)
+
+    kwargs = {'fields': fields, 'offset': offset, 'limit': page_size + 1}
+    if order:
+        kwargs['order'] = order
+    if with_total:
+        # Page and total in one parallel round-trip
+        batch = RpcBatch(client, label=f'{model} page + count')
+        batch.add_kw('records', model, 'search_read', [domain], kwargs)
+        batch.add_kw('total', model, 'search_count', [domain])
+        batch.run()
+        records, total = batch.result('records'), batch.result('total')
+    else:
+        records = client.execute_kw(model, 'search_read', [domain], kwargs)
+        total = None
+    has_next = len(records) > page_size
+    records = records[:page_size]
+    logging.debug(f"[pagination] {model} page {page} (size {page_size}): {len(records)} records, next={has_next}, total={total}")
+    return Page(records, page, page_size, has_next, total)
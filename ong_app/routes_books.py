@@ -2,82 +2,54 @@
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from .odoo_connector import get_odoo_client
-from .odoo_inventory_utils import add_initial_stock_via_receipt # Correct function imported
+from .odoo_context import odoo_model, read_records, record_name, forget_records
+from .book_lifecycle import (STATES, TRANSITIONS, LOGISTICS_STATES, IN_TRANSIT_STATES, STATE_FIELDS,
+                             apply_transition, state_label)
+from .odoo_inventory_utils import add_initial_stock_via_receipt
+from .odoo_refdata import ref_id
+from .odoo_batch import RpcBatch, StepTimer, load_record_graph
+from .stock_jobs import enqueue_initial_stock, get_stock_job_queue
+from .book_import import BookImportError, iter_import_rows, import_book_rows
+from .pagination import get_page_args, paginated_search_read
+from .book_search import get_book_search_index, notify_book_search_sync
+from .dashboard import invalidate_tag_counts
+from .shipment_planner import BRANCH_DESTINATIONS, fetch_approved_queue, plan_shipments, execute_plan
+from .shipment_dashboard import fetch_dashboard, get_version_probe
+from .shipment_pipeline import (SHIP_DONE, SHIP_SKIPPED, SHIP_WAITING, SHIP_WIZARD, process_validation_wizards,
+                                ship_pickings, validate_pickings)
 import logging
 import odoorpc
+from datetime import datetime
 
-# --- DEFINE ACTUAL TAG IDs (Updated!) ---
+# --- TAG IDs: defined once in book_lifecycle.STATES (states and transitions of a book) ---
+# Kept under their historical names for the list views and routes_main.
 
-TAG_ID_PENDIENTE = 4  # Renaming to TAG_ID_PENDING later might be good, but keeping for safety now
-TAG_ID_APROBADO  = 5  # Renaming to TAG_ID_APPROVED later might be good
-TAG_ID_RECHAZADO = 6  # Renaming to TAG_ID_REJECTED later might be good
+TAG_ID_PENDIENTE = STATES['pending']
+TAG_ID_APROBADO  = STATES['approved']
+TAG_ID_RECHAZADO = STATES['rejected']
 
-# --- CONSTANT IDs FOR LOGISTICS TAGS ---
+TAG_ID_LOGISTICS_READY = STATES['ready']
+TAG_ID_LOGISTICS_TRANSIT_EC = STATES['in_transit_ec']
+TAG_ID_LOGISTICS_TRANSIT_VE = STATES['in_transit_ve']
+TAG_ID_LOGISTICS_DELIVERED = STATES['delivered']
 
-TAG_ID_LOGISTICS_READY = 7
-TAG_ID_LOGISTICS_TRANSIT_EC = 10
-TAG_ID_LOGISTICS_TRANSIT_VE = 11
-TAG_ID_LOGISTICS_DELIVERED = 9
+# Ready, in transit (EC, VE and the generic tag) and delivered
+LIST_ALL_LOGISTICS_TAGS = [STATES[state] for state in LOGISTICS_STATES]
 
-# (We could use the generic 'In Transit' ID 8 if we wanted to simplify later)
-LIST_ALL_LOGISTICS_TAGS = [TAG_ID_LOGISTICS_READY, TAG_ID_LOGISTICS_TRANSIT_EC,
-                           TAG_ID_LOGISTICS_TRANSIT_VE, TAG_ID_LOGISTICS_DELIVERED, 8]
+# Destination tag of mark_in_transit -> transition
+TRANSIT_TRANSITIONS = {STATES[transition.target]: transition.name for transition in TRANSITIONS.values()
+                       if transition.target in IN_TRANSIT_STATES}
 
 
 books_bp = Blueprint('books', __name__)
 
-# --- Route to DISPLAY the add book form (WITH DONOR LOADING) ---
+# --- Route to DISPLAY the add book form ---
 @books_bp.route('/add_book', methods=['GET'])
 def add_book_form():
-    donors = [] # Initialize as an empty list
-    error_message = None
-
-    client = get_odoo_client()
-    if not client:
-        # Flash message translated
-        flash('Odoo connection error. Donors cannot be loaded.', 'error')
-        # Error message translated
-        error_message = "Odoo connection error when loading donors." 
-        # We don't return here yet, to render the form even without donors
-    else:
-        # Try to get the donor list ONLY if the connection was successful
-        try:
-            # Search for partners of type 'person' (assuming they are donors/volunteers)
-            # Sort by name ascending for the dropdown
-            donor_ids = client.env['res.partner'].search(
-                [('company_type', '=', 'person')],
-                limit=150,  # Increased limit just in case
-                order="name asc"
-            )
-            # Log message translated
-            logging.info(f"[books_bp GET /add_book] Donor IDs found: {donor_ids}")
-
-            if donor_ids:
-                # Read only ID and name for the dropdown
-                donors = client.env['res.partner'].read(donor_ids, ['id', 'name'])
-                # Log message translated
-                logging.info(f"[books_bp GET /add_book] Donor data (id, name) read: {len(donors)} found.")
-            else:
-                # Log message translated
-                logging.info("[books_bp GET /add_book] No partners of type 'person' found.")
-        
-                # flash('No registered donors found to select.', 'info')
-
-        except odoorpc.error.RPCError as e:
-            # Log message translated
-            logging.error(f"[books_bp GET /add_book] RPC Error loading donors: {e}", exc_info=True)
-            # Error message translated
-            error_message = f"RPC Error loading donor list: {e}"
-            flash(error_message, 'error')
-        except Exception as e:
-            # Log message translated
-            logging.error(f"[books_bp GET /add_book] Unexpected error loading donors: {e}", exc_info=True)
-            # Error message translated
-            error_message = f"Unexpected error loading donors: {e}"
-            flash(error_message, 'error')
-
-    # ALWAYS render the template, passing the 'donors' list (which will be full or empty)
-    return render_template('add_book.html', donors=donors, error_message=error_message)
+    # The donor picker queries /api/donors/search while typing: nothing to load from Odoo here
+    # Log message translated
+    logging.info("[books_bp GET /add_book] Displaying form to add a book.")
+    return render_template('add_book.html')
 
 
 # --- Route to PROCESS the add book form ---
@@ -89,7 +61,6 @@ def add_book_submit():
     donor_id_str = request.form.get('donor_id')
 
     # Constants (no changes)
-    TARGET_STOCK_LOCATION_ID = 30
     # It's good practice to use float for Odoo quantities
     INITIAL_STOCK_QTY = 1.0 
 
@@ -109,16 +80,45 @@ def add_book_submit():
         flash('Odoo connection error. Could not add book.', 'error')
         return redirect(url_for('books.add_book_form'))
 
+    # Per-step timings of the whole registration, logged at the end
+    timer = StepTimer(f"add_book '{title}'")
+
+    donor_id = None
+    if donor_id_str:
+        try:
+            donor_id = int(donor_id_str)
+        except ValueError:
+            # Log message translated
+            logging.error(f"[books_bp] Donor ID '{donor_id_str}' invalid.")
+            # Flash message translated (more useful)
+            flash("Error: The selected donor ID is invalid.", "error") 
+            return redirect(url_for('books.add_book_form'))
+
+    # --- Independent reads in ONE parallel round-trip ---
+    # Duplicate search and donor name do not depend on each other
+    # (the virtual source location comes from the reference-data cache)
+    search_criteria = []
+    if isbn:
+         search_criteria.append(('default_code', '=', isbn))
+    elif title:
+         search_criteria.append(('name', '=', title))
+
+    prefetch = RpcBatch(client, timer=timer, label='prefetch (duplicates/donor)')
+    if search_criteria:
+        prefetch.add_kw('existing_books', 'product.product', 'search', [search_criteria])
+    if donor_id is not None:
+        prefetch.add_kw('donor', 'res.partner', 'read', [[donor_id]], {'fields': ['name']})
+    prefetch.run()
+
     # --- Prepare donor info (no changes from your original code) ---
     donor_name = None
     # Variable name is fine, translating the created string below
     donor_info_text = "" 
-    if donor_id_str:
+    if donor_id is not None:
         try:
-            donor_id = int(donor_id_str)
             # Log message translated
             logging.info(f"[books_bp] Searching name for Donor ID: {donor_id}")
-            donor_data = client.env['res.partner'].read(donor_id, ['name'])
+            donor_data = prefetch.result('donor')
             if donor_data and isinstance(donor_data, list):
                 donor_name = donor_data[0].get('name')
                 if donor_name:
@@ -132,12 +132,6 @@ def add_book_submit():
             else:
                  # Log message translated
                  logging.warning(f"[books_bp] Donor ID {donor_id} not found or unexpected return: {donor_data}")
-        except ValueError:
-            # Log message translated
-            logging.error(f"[books_bp] Donor ID '{donor_id_str}' invalid.")
-            # Flash message translated (more useful)
-            flash("Error: The selected donor ID is invalid.", "error") 
-            return redirect(url_for('books.add_book_form'))
         except Exception as e: # General catch for donor reading
             # Log message translated
             logging.error(f"[books_bp] Error reading donor {donor_id_str}: {e}", exc_info=True)
@@ -149,18 +143,15 @@ def add_book_submit():
     new_book_id = None
     # Flag to know if the book was created
     product_creation_successful = False 
+    tag_added_successfully = False
+    stock_added_successfully = False
 
     # MAIN TRY BLOCK FOR BOOK CREATION, TAG, AND STOCK
     try: 
-        ProductModel = client.env['product.product']
+        ProductModel = odoo_model('product.product')
 
-        # Search for duplicates (no changes)
-        search_criteria = []
-        if isbn:
-             search_criteria.append(('default_code', '=', isbn))
-        elif title:
-             search_criteria.append(('name', '=', title))
-        existing_books_ids = ProductModel.search(search_criteria) if search_criteria else []
+        # Search for duplicates (result of the prefetch batch)
+        existing_books_ids = prefetch.result('existing_books') if search_criteria else []
 
         if existing_books_ids:
              # Log message translated
@@ -191,79 +182,75 @@ def add_book_submit():
             'uom_po_id': 1,
             'sale_ok': False,
             'purchase_ok': False,
+            # PENDING TAG set at creation: product_tag_ids is delegated to the template,
+            # so no extra read of product_tmpl_id + write on product.template is needed
+            'product_tag_ids': [(4, TAG_ID_PENDIENTE)],
         }
 
-        # --- Attempt to Create the product ---
-        new_book_id = ProductModel.create(product_data)
+        # --- Attempt to Create the product (already tagged Pending) ---
+        with timer.step('create product'):
+            new_book_id = ProductModel.create(product_data)
         # Log message translated
-        logging.info(f"[books_bp] Book created with ID (product.product): {new_book_id}!")
+        logging.info(f"[books_bp] Book created with ID (product.product): {new_book_id}, Pending Tag (ID={TAG_ID_PENDIENTE}) included!")
         # Mark creation success
         product_creation_successful = True 
+        # Let the local search index and the home page counts pick the new book up now
+        notify_book_search_sync()
+        invalidate_tag_counts()
+        tag_added_successfully = True
 
-        # === IF creation was successful, NOW try to add Tag and Stock ===
-        tag_added_successfully = False
-        stock_added_successfully = False
-
+        # === IF creation was successful, NOW try to add Stock ===
         # Only proceed if new_book_id is valid
         if product_creation_successful: 
-            # --- Block to add PENDING TAG ---
+            # --- Block to add INITIAL STOCK ---
+            stock_job_id = None
             try:
-                product_info_tmpl = ProductModel.read(new_book_id, ['product_tmpl_id'])
-                if product_info_tmpl and product_info_tmpl[0].get('product_tmpl_id'):
-                    template_id = product_info_tmpl[0]['product_tmpl_id'][0]
-                    # Log message translated
-                    logging.info(f"[books_bp] Product ID={new_book_id} has Template ID={template_id}")
-                    update_data_template = {'product_tag_ids': [(4, TAG_ID_PENDIENTE)]}
-                    client.env['product.template'].write([template_id], update_data_template)
-                    # Log message translated
-                    logging.info(f"[books_bp] Pending Tag (ID={TAG_ID_PENDIENTE}) added to Template ID={template_id}.")
-                    # Mark tag success
-                    tag_added_successfully = True 
+                # Odoo's display_name is "[ISBN] Title" when an internal reference exists
+                product_display_name = f"[{isbn}] {title}" if isbn else title
+
+                # Preferred path: queue the receipt so the volunteer does not wait for the picking steps
+                target_location_id = ref_id(client, 'book_stock_location')
+                stock_job_id = enqueue_initial_stock(new_book_id, INITIAL_STOCK_QTY, target_location_id,
+                                                     product_display_name=product_display_name,
+                                                     product_uom_id=product_data['uom_id'])
+                if stock_job_id:
+                    logging.info(f"[books_bp] Initial stock for ID {new_book_id} queued as job {stock_job_id}.")
                 else:
+                    # Queue disabled: register the stock inline, as before
                     # Log message translated
-                    logging.warning(f"[books_bp] Template ID not found for Prod ID={new_book_id}. Pending tag not added.")
-                    # Not a fatal error, we could continue
-
-            except Exception as e_tag:
-                # Log message translated
-                logging.error(f"[books_bp] Error adding TAG for book ID {new_book_id}: {e_tag}", exc_info=True)
-                # Show warning, but don't necessarily stop the attempt to add stock
-                # Flash message translated
-                flash(f'Book "{title}" (ID: {new_book_id}) created, but failed to add the Pending tag.', 'warning')
-                # Mark tag failure
-                tag_added_successfully = False 
-
-
-            # --- Block to add INITIAL STOCK (INDEPENDENT OF TAG) ---
-            # Always try to add stock if the book was created, even if the tag failed
-            try:
-                # Log message translated
-                logging.info(f"[books_bp] Attempting to call add_initial_stock_via_receipt for ID {new_book_id}...")
-                # CORRECT FUNCTION CALL
-                stock_added_successfully = add_initial_stock_via_receipt(client, new_book_id, INITIAL_STOCK_QTY, TARGET_STOCK_LOCATION_ID) 
-                
-                if stock_added_successfully:
-                    # Log message translated
-                    logging.info(f"[books_bp] add_initial_stock_via_receipt for ID {new_book_id} RETURNED True.")
-                    # Total success flash message will be set at the end if both tag (or non-critical) and stock worked
-                else:
-                    # If it returns False WITHOUT exception
-                    # Log message translated
-                    logging.error(f"[books_bp] add_initial_stock_via_receipt for ID {new_book_id} RETURNED False. STOCK NOT ADDED!")
-                    # Flash message translated (set warning here if it returns False)
-                    flash(f'Book "{title}" (ID: {new_book_id}) created, but THERE WAS A PROBLEM registering the initial stock. Check logs and Odoo.', 'warning')
+                    logging.info(f"[books_bp] Attempting to call add_initial_stock_via_receipt for ID {new_book_id}...")
+                    # UoM, name and source location are already known: the function skips those reads
+                    stock_added_successfully = add_initial_stock_via_receipt(
+                        client, new_book_id, INITIAL_STOCK_QTY, target_location_id,
+                        product_uom_id=product_data['uom_id'],
+                        product_display_name=product_display_name,
+                        timer=timer,
+                    )
+                    
+                    if stock_added_successfully:
+                        # Log message translated
+                        logging.info(f"[books_bp] add_initial_stock_via_receipt for ID {new_book_id} RETURNED picking {stock_added_successfully}.")
+                        # Total success flash message will be set at the end if both tag (or non-critical) and stock worked
+                    else:
+                        # If it returns False WITHOUT exception
+                        # Log message translated
+                        logging.error(f"[books_bp] add_initial_stock_via_receipt for ID {new_book_id} RETURNED False. STOCK NOT ADDED!")
+                        # Flash message translated (set warning here if it returns False)
+                        flash(f'Book "{title}" (ID: {new_book_id}) created, but THERE WAS A PROBLEM registering the initial stock. Check logs and Odoo.', 'warning')
 
             except Exception as e_stock:
-                # If add_initial_stock_via_receipt raises an EXCEPTION
+                # If add_initial_stock_via_receipt (or the queue) raises an EXCEPTION
                 # Log message translated
-                logging.error(f"[books_bp] EXCEPTION calling add_initial_stock_via_receipt for book ID {new_book_id}: {e_stock}", exc_info=True)
+                logging.error(f"[books_bp] EXCEPTION registering initial stock for book ID {new_book_id}: {e_stock}", exc_info=True)
                 # Flash message translated
                 flash(f'Book "{title}" (ID: {new_book_id}) created, but an UNEXPECTED ERROR occurred registering initial stock. Check logs.', 'danger')
                  # Ensure it's False if there was an exception
                 stock_added_successfully = False
 
             # --- Combined Final Flash Message ---
-            if stock_added_successfully:
+            if stock_job_id:
+                flash(f'Book "{title}" (ID: {new_book_id}) added and marked Pending. Initial stock ({int(INITIAL_STOCK_QTY)} unit(s)) is being registered in the background (job #{stock_job_id}).', 'success')
+            elif stock_added_successfully:
                 # Only if stock was successfully added
                 # Flash message translated
                  flash(f'Book "{title}" (ID: {new_book_id}) added, marked Pending, and initial stock ({int(INITIAL_STOCK_QTY)} unit(s)) registered.', 'success')
@@ -294,15 +281,141 @@ def add_book_submit():
         # Flash message translated
         flash(f'Unexpected server error during {error_context_en}: {e_general}', 'error')
 
+    logging.info(f"[books_bp] Timings: {timer.summary()}")
+
     # ALWAYS redirect to the form
     return redirect(url_for('books.add_book_form'))
 
 
+# --- Route to VIEW the background initial-stock jobs ---
+@books_bp.route('/stock_jobs')
+def stock_jobs():
+    """Lists the most recent initial-stock jobs and their status (queued/running/retry/done/failed)."""
+    jobs = []
+    error_message = None
+    queue = get_stock_job_queue()
+    if queue is None:
+        flash('Background stock jobs are disabled: initial stock is registered while adding each book.', 'info')
+    else:
+        try:
+            jobs = queue.recent(limit=100)
+        except Exception as e:
+            logging.error(f"[books_bp GET /stock_jobs] Error reading the job queue: {e}", exc_info=True)
+            error_message = f"Error reading the job queue: {e}"
+            flash(error_message, 'error')
+    return render_template('stock_jobs.html', jobs=jobs, error_message=error_message)
+
+
+# --- API: status of ONE initial-stock job (for polling from the UI) ---
+@books_bp.route('/api/stock_jobs/<int:job_id>')
+def stock_job_status(job_id):
+    queue = get_stock_job_queue()
+    if queue is None:
+        return jsonify({"error": "Background stock jobs are disabled."}), 404
+    job = queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found."}), 404
+    return jsonify(job)
+
+
+# --- Route for the BULK book import (CSV / JSON upload) ---
+@books_bp.route('/import_books', methods=['GET', 'POST'])
+def import_books():
+    """
+    GET shows the upload form. POST streams the file, creates the new books in
+    batched create calls and registers all their initial stock in ONE receipt picking.
+    """
+    if request.method == 'GET':
+        return render_template('import_books.html', report=None)
+
+    upload = request.files.get('import_file')
+    if not upload or not upload.filename:
+        flash('Select a CSV or JSON file to import.', 'error')
+        return redirect(url_for('books.import_books'))
+
+    client = get_odoo_client()
+    if not client:
+        flash('Odoo connection error. Could not import books.', 'error')
+        return redirect(url_for('books.import_books'))
+
+    timer = StepTimer(f"import_books '{upload.filename}'")
+    report = None
+    try:
+        rows = iter_import_rows(upload)
+        report = import_book_rows(client, rows, ref_id(client, 'book_stock_location'), TAG_ID_PENDIENTE, timer=timer)
+    except BookImportError as e:
+        logging.warning(f"[books_bp] Import file '{upload.filename}' rejected: {e}")
+        flash(f'Could not read the file: {e}', 'error')
+    except UnicodeDecodeError as e:
+        logging.warning(f"[books_bp] Import file '{upload.filename}' is not UTF-8: {e}")
+        flash('Could not read the file: it must be UTF-8 encoded.', 'error')
+    except odoorpc.error.RPCError as e:
+        logging.error(f"[books_bp] RPC Error importing books: {e}", exc_info=True)
+        flash(f'Odoo RPC Error importing books: {e}', 'error')
+    except Exception as e:
+        logging.error(f"[books_bp] Unexpected error importing books: {e}", exc_info=True)
+        flash(f'Unexpected server error importing books: {e}', 'error')
+
+    logging.info(f"[books_bp] Timings: {timer.summary()}")
+
+    if report is None:
+        return redirect(url_for('books.import_books'))
+
+    counts = report['counts']
+    if counts['created']:
+        notify_book_search_sync()
+        invalidate_tag_counts()
+    if report['read_error']:
+        flash(report['read_error'], 'error')
+    if report['picking_id']:
+        flash(f"{counts['created']} book(s) created and marked Pending. Initial stock registered in receipt picking ID {report['picking_id']}.", 'success')
+    elif report['stock_error']:
+        flash(report['stock_error'], 'warning')
+    elif not counts['created']:
+        flash('No new books were created (see the report below).', 'info')
+    return render_template('import_books.html', report=report)
+
+
+# --- Route to SEARCH books in the local index (no Odoo call) ---
+@books_bp.route('/search_books')
+def search_books():
+    """Full-text search over title, ISBN and author/donor notes, served from the local index."""
+    query = request.args.get('q', '').strip()
+    results = []
+    error_message = None
+    index = get_book_search_index()
+    if index is None:
+        error_message = "The local book search is disabled (BOOK_SEARCH_ENABLED=0)."
+    elif query:
+        try:
+            results = index.search(query, limit=100)
+        except Exception as e:
+            logging.error(f"[books_bp GET /search_books] Error searching '{query}': {e}", exc_info=True)
+            error_message = f"Unexpected error searching books: {e}"
+    return render_template('search_books.html', query=query, books=results,
+                           indexed_count=index.count() if index else 0, error_message=error_message)
+
+
+@books_bp.route('/api/search_books')
+def search_books_api():
+    """JSON version of search_books, for search-as-you-type."""
+    index = get_book_search_index()
+    if index is None:
+        return jsonify({"error": "Local book search disabled."}), 503
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+    return jsonify(index.search(request.args.get('q', ''), limit=limit))
+
+
 # --- Route to list books (list_books) ---
 @books_bp.route('/list_books')
 def list_books():
     books = []
+    page = None
     error_message = None
+    page_number, page_size, with_total = get_page_args(request.args)
     client = get_odoo_client()
     if not client:
         # Flash message translated
@@ -315,11 +428,11 @@ def list_books():
     
     try:
         if client: # Only try if client exists
-            product_ids = client.env['product.product'].search([], limit=80)
-            if product_ids:
-                # books gets overwritten here if products are found
-                books = client.env['product.product'].read(product_ids, ['name', 'default_code', 'description_sale', 'id'])
-            else:
+            # One search_read per page (mirror_default_order: 'default_code, name, id', stable pages)
+            page = paginated_search_read(client, 'product.product', [], ['name', 'default_code', 'description_sale', 'id'],
+                                         page=page_number, page_size=page_size, with_total=with_total)
+            books = page.records
+            if not books and page_number == 1:
                 # If no products, books remains [] (defined at the start)
                 # Flash message translated
                 flash('No registered books found in Odoo.', 'info')
@@ -339,14 +452,16 @@ def list_books():
         # books remains [] if error occurs here
 
     # This return now always has 'books' defined (as empty list or with data)
-    return render_template('list_books.html', books=books, error_message=error_message)
+    return render_template('list_books.html', books=books, page=page, error_message=error_message)
 
 # --- Route to VIEW PENDING REVIEW BOOKS ---
 # (UPDATED to search by TAG_ID_PENDIENTE = 4)
 @books_bp.route('/review_books')
 def review_books():
     pending_books = []
+    page = None
     error_message = None
+    page_number, page_size, with_total = get_page_args(request.args)
 
     # Use the constant defined above (TAG_ID_PENDIENTE = 4)
     # Variable name translated
@@ -368,15 +483,14 @@ def review_books():
             # This field DOES exist on product.product and inherits/reflects tags from the template
             search_domain = [('product_tag_ids', '=', tag_id_to_search)]
 
-            product_ids = client.env['product.product'].search(search_domain, limit=100)
+            # One search_read per page instead of search + read
+            page = paginated_search_read(client, 'product.product', search_domain, ['id', 'name', 'default_code', 'description'],
+                                         page=page_number, page_size=page_size, with_total=with_total)
+            pending_books = page.records
             # Log message translated
-            logging.info(f"[books_bp GET /review] Pending product (variant) IDs found: {product_ids}")
+            logging.info(f"[books_bp GET /review] {len(pending_books)} pending books read (page {page_number}).")
 
-            if product_ids:
-                pending_books = client.env['product.product'].read(product_ids, ['id', 'name', 'default_code', 'description'])
-                # Log message translated
-                logging.info(f"[books_bp GET /review] Pending book data read: {pending_books}")
-            else:
+            if not pending_books and page_number == 1:
                 # Log message translated
                 logging.info(f"[books_bp GET /review] No pending review books found with ID={tag_id_to_search}.")
                 # Flash message is now more dynamic (if no books and no connection error)
@@ -397,165 +511,72 @@ def review_books():
             flash(error_message, 'error')
 
     # Render the template
-    return render_template('review_books.html', books=pending_books, error_message=error_message)
+    return render_template('review_books.html', books=pending_books, page=page, error_message=error_message)
 
 # --- NEW ROUTE TO APPROVE A BOOK (POST) ---
-@books_bp.route('/approve_book/<int:book_id>', methods=['POST'])
-def approve_book(book_id):
-    # Log message translated
-    logging.info(f"[books_bp POST /approve] Request to APPROVE product.product ID: {book_id}")
+def _flash_transition_result(result):
+    """Flashes what apply_transition did, book by book (updated, unchanged, refused, missing)."""
+    transition = result.transition
+    if len(result.updated) == 1:
+        # Flash message translated
+        flash(f'Book "{result.updated[0][1]}" {transition.label}.', 'success')
+    elif result.updated:
+        # Flash message translated
+        flash(f'{len(result.updated)} books {transition.label}: ' + ', '.join(name for _, name in result.updated), 'success')
+    if result.unchanged:
+        # Flash message translated
+        flash('Already done, nothing changed: ' + ', '.join(name for _, name in result.unchanged), 'info')
+    for _, name, states in result.invalid:
+        # Flash message translated
+        flash(f'Book "{name}" was not {transition.label}: its current state is {state_label(states)}.', 'warning')
+    if result.not_found:
+        # Flash message translated
+        flash(f'Error: Template not found for product ID(s) {", ".join(map(str, result.not_found))}.', 'error')
 
-    # Validate configured IDs
-    # Only check Approved
-    if TAG_ID_APROBADO <= 0: 
-         # Flash message translated
-         flash('Config Error: Approved tag ID not configured.', 'error')
-         # Log message translated
-         logging.error("[books_bp approve] Error: TAG_ID_APROBADO ID not configured.")
-         return redirect(url_for('books.review_books'))
 
+def _transition_one_book(book_id, transition_name, list_endpoint, log_prefix):
+    """
+    Runs one lifecycle transition on a single book (one read, one write at most),
+    flashes the outcome and redirects back to list_endpoint.
+    Shared by approve_book, reject_book and the mark_* routes.
+    """
     client = get_odoo_client()
     if not client:
         # Flash message translated
         flash('Odoo connection error.', 'error')
-        return redirect(url_for('books.review_books'))
+        return redirect(url_for(list_endpoint))
 
-    # Initialize for logs
-    template_id = None 
     try:
-        # 1. Get Template ID and name from Product ID
-        product_info = client.env['product.product'].read(book_id, ['product_tmpl_id', 'name'])
-        if not product_info or not product_info[0]['product_tmpl_id']:
-            # Flash message translated
-            flash(f'Error: Template not found for product ID={book_id}.', 'error')
-            # Log message translated
-            logging.error(f"[books_bp approve] Template not found for product.product ID={book_id}.")
-            return redirect(url_for('books.review_books'))
-        template_id = product_info[0]['product_tmpl_id'][0]
-        book_name = product_info[0].get('name', f'ID {book_id}')
-        # Log message translated
-        logging.info(f"[books_bp approve] Product ID={book_id} (Name:'{book_name}') has Template ID={template_id}.")
-
-        # 2. Prepare data to UPDATE tags on the TEMPLATE:
-        #    - Remove Pending (ID 4) -> (3, id)
-        #    - Add Approved (ID 5)   -> (4, id)
-        update_data = {
-            'product_tag_ids': [
-                 # Unlink ID 4
-                (3, TAG_ID_PENDIENTE), 
-                # Link ID 5
-                (4, TAG_ID_APROBADO)    
-            ]
-        }
-        # Log message translated
-        logging.info(f"[books_bp approve] Attempting write on template ID={template_id} with data: {update_data}")
-
-        # 3. Execute write on product.template
-        write_ok = client.env['product.template'].write([template_id], update_data)
-
-        # Odoo 16 write returns True on success
-        if write_ok:
-            # Log message translated
-            logging.info(f"[books_bp approve] Book '{book_name}' (Template ID: {template_id}) approved successfully!")
-            # Flash message translated
-            flash(f'Book "{book_name}" approved.', 'success')
-        else:
-            # This would be rare without an exception, but just in case
-            # Log message translated
-            logging.warning(f"[books_bp approve] Odoo write on template ID={template_id} returned False/None.")
-            # Flash message translated
-            flash(f'Attempted to approve Book "{book_name}", but Odoo did not confirm the change.', 'warning')
-
+        result = apply_transition([book_id], transition_name)
+        _flash_transition_result(result)
     except odoorpc.error.RPCError as e:
         # Log message translated
-        logging.error(f"[books_bp approve] RPC Error: {e}", exc_info=True)
+        logging.error(f"{log_prefix} RPC Error: {e}", exc_info=True)
         # Flash message translated
-        flash(f'RPC Error while approving: {e}', 'error')
+        flash(f'RPC Error while updating the book status: {e}', 'error')
     except Exception as e:
         # Log message translated
-        logging.error(f"[books_bp approve] Unexpected error: {e}", exc_info=True)
+        logging.error(f"{log_prefix} Unexpected error: {e}", exc_info=True)
         # Flash message translated
-        flash(f'Unexpected error while approving: {e}', 'error')
+        flash(f'Unexpected error while updating the book status: {e}', 'error')
+
+    return redirect(url_for(list_endpoint))
+
 
-    return redirect(url_for('books.review_books'))
+@books_bp.route('/approve_book/<int:book_id>', methods=['POST'])
+def approve_book(book_id):
+    # Log message translated
+    logging.info(f"[books_bp POST /approve] Request to APPROVE product.product ID: {book_id}")
+    # Pending -> Approved
+    return _transition_one_book(book_id, 'approve', 'books.review_books', "[books_bp approve]")
 
 # --- NEW ROUTE TO REJECT A BOOK (POST) ---
 @books_bp.route('/reject_book/<int:book_id>', methods=['POST'])
 def reject_book(book_id):
     # Log message translated
     logging.info(f"[books_bp POST /reject] Request to REJECT product.product ID: {book_id}")
-
-    # Only check Rejected
-    if TAG_ID_RECHAZADO <= 0: 
-         # Flash message translated
-         flash('Config Error: Rejected tag ID not configured.', 'error')
-         # Log message translated
-         logging.error("[books_bp reject] Error: TAG_ID_RECHAZADO ID not configured.")
-         return redirect(url_for('books.review_books'))
-
-    client = get_odoo_client()
-    if not client:
-        # Flash message translated
-        flash('Odoo connection error.', 'error')
-        return redirect(url_for('books.review_books'))
-
-    # Initialize
-    template_id = None 
-    try:
-        # 1. Get Template ID and name from Product ID
-        product_info = client.env['product.product'].read(book_id, ['product_tmpl_id', 'name'])
-        if not product_info or not product_info[0]['product_tmpl_id']:
-            # Flash message translated
-            flash(f'Error: Template not found for product ID={book_id}.', 'error')
-            # Log message translated
-            logging.error(f"[books_bp reject] Template not found for product.product ID={book_id}.")
-            return redirect(url_for('books.review_books'))
-        template_id = product_info[0]['product_tmpl_id'][0]
-        book_name = product_info[0].get('name', f'ID {book_id}')
-        # Log message translated
-        logging.info(f"[books_bp reject] Product ID={book_id} (Name:'{book_name}') has Template ID={template_id}.")
-
-        # 2. Prepare data to UPDATE tags on the TEMPLATE:
-        #    - Remove Pending (ID 4) -> (3, id)
-        #    - Add Rejected (ID 6)  -> (4, id)
-        update_data = {
-            'product_tag_ids': [
-                # Unlink ID 4
-                (3, TAG_ID_PENDIENTE), 
-                # Link ID 6
-                (4, TAG_ID_RECHAZADO)   
-            ]
-        }
-        # Log message translated
-        logging.info(f"[books_bp reject] Attempting write on template ID={template_id} with data: {update_data}")
-
-        # 3. Execute write on product.template
-        write_ok = client.env['product.template'].write([template_id], update_data)
-
-        if write_ok:
-            # Log message translated
-            logging.info(f"[books_bp reject] Book '{book_name}' (Template ID: {template_id}) rejected successfully!")
-            # Flash message translated
-            flash(f'Book "{book_name}" rejected.', 'success')
-        else:
-            # Log message translated
-            logging.warning(f"[books_bp reject] Odoo write on template ID={template_id} returned False/None.")
-            # Flash message translated
-            flash(f'Attempted to reject Book "{book_name}", but Odoo did not confirm the change.', 'warning')
-
-    except odoorpc.error.RPCError as e:
-        # Log message translated
-        logging.error(f"[books_bp reject] RPC Error: {e}", exc_info=True)
-        # Flash message translated
-        flash(f'RPC Error while rejecting: {e}', 'error')
-    except Exception as e:
-        # Log message translated
-        logging.error(f"[books_bp reject] Unexpected error: {e}", exc_info=True)
-        # Flash message translated
-        flash(f'Unexpected error while rejecting: {e}', 'error')
-
-    return redirect(url_for('books.review_books'))
-
+    # Pending (or Approved) -> Rejected
+    return _transition_one_book(book_id, 'reject', 'books.review_books', "[books_bp reject]")
 
 # --- NEW ROUTE TO VIEW APPROVED BOOKS ---
 @books_bp.route('/approved_books')
@@ -564,7 +585,9 @@ def approved_books():
 
     # Using a more descriptive variable name
     eligible_for_shipping_list = [] 
+    page = None
     error_message = None
+    page_number, page_size, with_total = get_page_args(request.args)
 
     # APPROVED tag ID (already defined as constant)
     # Variable name translated
@@ -596,20 +619,18 @@ def approved_books():
             # Log message translated
             logging.debug(f"[books_bp GET /approved] Final search domain: {search_domain}")
 
-            # Execute search with the new domain
-             # Sort by name
-            product_ids = client.env['product.product'].search(search_domain, limit=100, order="name asc")
+            # Execute search_read with the new domain, one page at a time
+             # Sort by name (id as tie-breaker keeps pages stable)
+            # Read necessary fields. You can add 'author', 'isbn' if you want to show them here
+            page = paginated_search_read(client, 'product.product', search_domain, ['id', 'name', 'default_code', 'description'],
+                                         page=page_number, page_size=page_size, order="name asc, id asc", with_total=with_total)
+            eligible_for_shipping_list = page.records
             # === END OF KEY MODIFICATION ===
 
             # Log message translated
-            logging.info(f"[books_bp GET /approved] Product IDs (approved, not in logistics) found: {product_ids}")
+            logging.info(f"[books_bp GET /approved] {len(eligible_for_shipping_list)} books (approved, not in logistics) read (page {page_number}).")
 
-            if product_ids:
-                # Read necessary fields. You can add 'author', 'isbn' if you want to show them here
-                eligible_for_shipping_list = client.env['product.product'].read(product_ids, ['id', 'name', 'default_code', 'description'])
-                # Log message translated
-                logging.info(f"[books_bp GET /approved] Data for books ready for shipment preparation read.")
-            else:
+            if not eligible_for_shipping_list and page_number == 1:
                 # Log message translated
                 logging.info(f"[books_bp GET /approved] No approved books found that are not already in logistics.")
                  # Only show if there's no other error
@@ -634,6 +655,8 @@ def approved_books():
     # (Template expects 'books')
     return render_template('approved_books.html',
                            books=eligible_for_shipping_list, 
+                           page=page,
+                           destinations=BRANCH_DESTINATIONS,
                            error_message=error_message)
 
 
@@ -642,7 +665,9 @@ def approved_books():
 def rejected_books():
     # Different variable name
     rejected_books_list = [] 
+    page = None
     error_message = None
+    page_number, page_size, with_total = get_page_args(request.args)
 
     # We will use the ID of the REJECTED tag
     # Variable name translated
@@ -662,15 +687,14 @@ def rejected_books():
             # Search domain now searches for TAG_ID_RECHAZADO
             search_domain = [('product_tag_ids', '=', tag_id_to_search)]
 
-            product_ids = client.env['product.product'].search(search_domain, limit=100)
+            # One search_read per page instead of search + read
+            page = paginated_search_read(client, 'product.product', search_domain, ['id', 'name', 'default_code', 'description'],
+                                         page=page_number, page_size=page_size, with_total=with_total)
+            rejected_books_list = page.records
             # Log message translated
-            logging.info(f"[books_bp GET /rejected] Rejected product IDs found: {product_ids}")
+            logging.info(f"[books_bp GET /rejected] {len(rejected_books_list)} rejected books read (page {page_number}).")
 
-            if product_ids:
-                rejected_books_list = client.env['product.product'].read(product_ids, ['id', 'name', 'default_code', 'description'])
-                # Log message translated
-                logging.info(f"[books_bp GET /rejected] Rejected book data read.")
-            else:
+            if not rejected_books_list and page_number == 1:
                 # Log message translated
                 logging.info(f"[books_bp GET /rejected] No rejected books found with ID={tag_id_to_search}.")
                 if not error_message:
@@ -694,6 +718,7 @@ def rejected_books():
     # Pass the correct list
     return render_template('rejected_books.html',
                            books=rejected_books_list, 
+                           page=page,
                            error_message=error_message)
 
 
@@ -701,86 +726,13 @@ def rejected_books():
 @books_bp.route('/mark_ready_for_shipment/<int:book_id>', methods=['POST'])
 def mark_ready_for_shipment(book_id):
     """
-    Handles the action of marking an approved book as 'Ready for Shipment'.
-    Removes the 'Approved' tag (ID 5) and adds 'Logistics: Ready for Shipment' (ID 7).
+    Handles the action of marking an approved book as 'Ready for Shipment'
+    (Approved -> Logistics: Ready for Shipment).
     """
     # Log message translated
     logging.info(f"[books_bp POST /mark_ready] Request to MARK READY FOR SHIPMENT for product.product ID: {book_id}")
-
-    # Validate required configuration IDs (Approved and Ready for Shipment)
-    if TAG_ID_APROBADO <= 0 or TAG_ID_LOGISTICS_READY <= 0:
-         # Flash message translated
-         flash('Configuration Error: Invalid Approved/ReadyForShipment tag IDs.', 'error')
-         # Log message translated
-         logging.error(f"[books_bp mark_ready] Error: Invalid IDs TAG_ID_APROBADO ({TAG_ID_APROBADO}) or TAG_ID_LOGISTICS_READY ({TAG_ID_LOGISTICS_READY}).")
-         # Redirect to the approved view where the button was
-         return redirect(url_for('books.approved_books'))
-
-    client = get_odoo_client()
-    if not client:
-        # Flash message translated
-        flash('Odoo connection error. Could not update logistics status.', 'error')
-        return redirect(url_for('books.approved_books'))
-
-    # For logging in case of error
-    template_id = None 
-    try:
-        # 1. Get Template ID and name from Product ID (as in approve/reject)
-        product_info = client.env['product.product'].read(book_id, ['product_tmpl_id', 'name'])
-        if not product_info or not product_info[0]['product_tmpl_id']:
-            # Flash message translated
-            flash(f'Error: Template not found for product ID={book_id}.', 'error')
-            # Log message translated
-            logging.error(f"[books_bp mark_ready] Template not found for product.product ID={book_id}.")
-            return redirect(url_for('books.approved_books'))
-        template_id = product_info[0]['product_tmpl_id'][0]
-        book_name = product_info[0].get('name', f'ID {book_id}')
-        # Log message translated
-        logging.info(f"[books_bp mark_ready] Product ID={book_id} ('{book_name}') has Template ID={template_id}.")
-
-        # 2. Prepare data to UPDATE tags on the TEMPLATE:
-        #    - Remove 'Approved' (ID 5)       -> (3, TAG_ID_APROBADO)
-        #    - Add 'Ready for Shipment' (ID 7) -> (4, TAG_ID_LOGISTICS_READY)
-        update_data = {
-            'product_tag_ids': [
-                # Unlink ID 5
-                (3, TAG_ID_APROBADO),
-                # Link ID 7           
-                (4, TAG_ID_LOGISTICS_READY)    
-            ]
-        }
-        # Log message translated
-        logging.info(f"[books_bp mark_ready] Attempting write on template ID={template_id} with data: {update_data}")
-
-        # 3. Execute write on product.template
-        write_ok = client.env['product.template'].write([template_id], update_data)
-
-        if write_ok:
-            # Log message translated
-            logging.info(f"[books_bp mark_ready] Book '{book_name}' (Template ID: {template_id}) marked as Ready for Shipment successfully!")
-            # Flash message translated
-            flash(f'Book "{book_name}" marked as Ready for Shipment.', 'success')
-        else:
-            # Log message translated
-            logging.warning(f"[books_bp mark_ready] Odoo write on template ID={template_id} returned False/None.")
-            # Flash message translated
-            flash(f'Attempted to mark Book "{book_name}" as Ready, but Odoo did not confirm.', 'warning')
-
-    except odoorpc.error.RPCError as e:
-        # Log message translated
-        logging.error(f"[books_bp mark_ready] RPC Error marking ready: (Tmpl ID: {template_id}) {e}", exc_info=True)
-        # Flash message translated
-        flash(f'RPC Error updating status: {e}', 'error')
-    except Exception as e:
-        # Log message translated
-        logging.error(f"[books_bp mark_ready] Unexpected error marking ready: (Tmpl ID: {template_id}) {e}", exc_info=True)
-        # Flash message translated
-        flash(f'Unexpected error updating status: {e}', 'error')
-
-    # Always redirect back to the approved list
-    # The book will NO LONGER appear there if the operation was successful (due to the filter we added)
-    return redirect(url_for('books.approved_books'))
-
+    # The book will NO LONGER appear in the approved list if the operation was successful
+    return _transition_one_book(book_id, 'ready', 'books.approved_books', "[books_bp mark_ready]")
 
 # --- NEW ROUTE: Logistics Pipeline View ---
 @books_bp.route('/shipping_management') # Keep the route
@@ -791,15 +743,18 @@ def shipping_management(): # Keep the function name
     """
     # List to store the read transfers
     shipments_list = [] 
+    page = None
     error_message = None
+    page_number, page_size, with_total = get_page_args(request.args)
+
+    client = get_odoo_client()
 
-    # ID of the Operation Type we want to list
+    # ID of the Operation Type we want to list ('Branch Shipments', 7), from the reference-data cache
     # Variable name translated
-    SHIPMENT_OPERATION_TYPE_ID = 7 # 'Branch Shipments'
+    SHIPMENT_OPERATION_TYPE_ID = ref_id(client, 'shipment_picking_type')
     # Log message translated
     logging.info(f"[books_bp GET /shipping_management] Searching for transfers (stock.picking) of type ID={SHIPMENT_OPERATION_TYPE_ID}")
 
-    client = get_odoo_client()
     if not client:
         # Flash message translated
         flash('Odoo connection error. Cannot display shipment list.', 'error')
@@ -807,8 +762,6 @@ def shipping_management(): # Keep the function name
         error_message = "Odoo connection error."
     else:
         try:
-            PickingModel = client.env['stock.picking']
-
             # Search domain: ONLY transfers of our type
             search_domain = [('picking_type_id', '=', SHIPMENT_OPERATION_TYPE_ID)]
 
@@ -826,17 +779,14 @@ def shipping_management(): # Keep the function name
             order = 'id desc'
 
             logging.debug(f"Domain: {search_domain}, Fields: {fields_to_read}")
-            shipments_list = PickingModel.search_read(
-                search_domain,
-                fields=fields_to_read,
-                order=order,
-                # Limit in case there are many
-                limit=50 
-            )
+            # One page at a time instead of a fixed limit
+            page = paginated_search_read(client, 'stock.picking', search_domain, fields_to_read,
+                                         page=page_number, page_size=page_size, order=order, with_total=with_total)
+            shipments_list = page.records
             # Log message translated
-            logging.info(f"{len(shipments_list)} shipment transfers found.")
+            logging.info(f"{len(shipments_list)} shipment transfers found (page {page_number}).")
 
-            if not shipments_list and not error_message:
+            if not shipments_list and page_number == 1 and not error_message:
                 # Flash message translated
                 flash('No batch shipments registered yet.', 'info')
 
@@ -857,95 +807,78 @@ def shipping_management(): # Keep the function name
     # Renamed variable passed to template for clarity
     return render_template('shipping_management.html',
                            shipments=shipments_list, 
+                           page=page,
                            # We no longer pass TAG_IDs because logic will be based on 'state'
                            error_message=error_message)
 
 
+# --- SHIPMENT DASHBOARD API: polled by the shipping_management page ---
+@books_bp.route('/api/shipments/dashboard')
+def shipments_dashboard_api():
+    """
+    Shipment counts per state and the transfers changed since ?since=<cursor>
+    (the 'cursor' of the previous answer; none: the latest transfers).
+
+    The ETag is the version of the shipment list: a poll sending it back in
+    If-None-Match gets a 304 after one shared, cached version probe, without
+    reading any transfer. No ETag is sent while 'more' changes are waiting,
+    so the follow-up poll is never answered with a 304.
+    """
+    since = request.args.get('since') or None
+    if since:
+        try:
+            datetime.strptime(since, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return jsonify({'error': "'since' must be a cursor returned by this API (YYYY-MM-DD HH:MM:SS)."}), 400
+
+    client = get_odoo_client()
+    if not client:
+        return jsonify({'error': 'Odoo connection error.'}), 503
+    try:
+        version = get_version_probe().get(client)
+        if request.if_none_match.contains(version['etag']):
+            response = current_app.response_class(status=304)
+            response.set_etag(version['etag'])
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        dashboard = fetch_dashboard(client, since)
+    except odoorpc.error.RPCError as e:
+        # Log message translated
+        logging.error(f"[books_bp GET /api/shipments/dashboard] Odoo RPC Error reading shipments: {e}", exc_info=True)
+        return jsonify({'error': f'Odoo error: {e}'}), 502
+    except Exception as e:
+        # Log message translated
+        logging.error(f"[books_bp GET /api/shipments/dashboard] Unexpected error reading shipments: {e}", exc_info=True)
+        return jsonify({'error': 'Unexpected server error.'}), 500
+
+    response = jsonify(dashboard)
+    # Polls must always revalidate (a 304 costs one cached probe)
+    response.headers['Cache-Control'] = 'no-cache'
+    if not dashboard['more']:
+        response.set_etag(version['etag'])
+    return response
+
 # --- NEW LOGISTICS ROUTE: Mark as In Transit (POST) ---
 # NOTE: This route currently only changes product tags, it doesn't interact with stock.picking state.
 # You might want to update this later to ALSO update the stock.picking if applicable.
 @books_bp.route('/mark_in_transit/<int:destination_tag_id>/<int:book_id>', methods=['POST'])
 def mark_in_transit(destination_tag_id, book_id):
     """
-    Handles the action of marking a book as 'In Transit' to a specific destination.
-    Removes the 'Ready for Shipment' tag (ID 7) and adds the destination tag (ID 10 or 11).
+    Handles the action of marking a book as 'In Transit' to a specific destination
+    (Ready for Shipment -> destination tag, ID 10 or 11).
     """
     # Log message translated
     logging.info(f"[books_bp POST /mark_in_transit] Request to MARK IN TRANSIT (Dest ID: {destination_tag_id}) for product.product ID: {book_id}")
 
-    # Validate necessary IDs: Ready (which we remove) and Destination (which we add)
-    # Variable name translated
-    valid_destination_tags = [TAG_ID_LOGISTICS_TRANSIT_EC, TAG_ID_LOGISTICS_TRANSIT_VE, 8] # Include general ID 8 in case we use it later
-    if TAG_ID_LOGISTICS_READY <= 0 or destination_tag_id not in valid_destination_tags:
+    transition_name = TRANSIT_TRANSITIONS.get(destination_tag_id)
+    if transition_name is None:
          # Flash message translated
-         flash(f'Config Error: Invalid Ready ({TAG_ID_LOGISTICS_READY}) or Destination ({destination_tag_id}) tag ID.', 'error')
+         flash(f'Config Error: Invalid Destination tag ID ({destination_tag_id}).', 'error')
          # Log message translated
-         logging.error(f"[books_bp mark_in_transit] Invalid IDs: READY={TAG_ID_LOGISTICS_READY}, DESTINATION={destination_tag_id}")
-         # Redirect to shipping management
+         logging.error(f"[books_bp mark_in_transit] Invalid DESTINATION={destination_tag_id}")
          return redirect(url_for('books.shipping_management'))
 
-    client = get_odoo_client()
-    if not client:
-        # Flash message translated
-        flash('Odoo connection error.', 'error')
-        return redirect(url_for('books.shipping_management'))
-
-    template_id = None
-    try:
-        # 1. Get Template ID and name (same as before)
-        product_info = client.env['product.product'].read(book_id, ['product_tmpl_id', 'name'])
-        if not product_info or not product_info[0]['product_tmpl_id']:
-             # Flash message translated
-            flash(f'Error: Template not found for product ID={book_id}.', 'error')
-             # Log message translated
-            logging.error(f"[books_bp mark_in_transit] Template not found for Prod ID={book_id}.")
-            return redirect(url_for('books.shipping_management'))
-        template_id = product_info[0]['product_tmpl_id'][0]
-        book_name = product_info[0].get('name', f'ID {book_id}')
-        # Log message translated
-        logging.info(f"[books_bp mark_in_transit] Prod ID={book_id} ('{book_name}'), Tmpl ID={template_id}")
-
-        # 2. Prepare UPDATE data:
-        #    - Remove 'Ready for Shipment' (ID 7)  -> (3, TAG_ID_LOGISTICS_READY)
-        #    - Add Destination Tag (ID 10 or 11) -> (4, destination_tag_id)
-        update_data = {
-            'product_tag_ids': [
-                (3, TAG_ID_LOGISTICS_READY),
-                (4, destination_tag_id)
-            ]
-        }
-        # Log message translated
-        logging.info(f"[books_bp mark_in_transit] Attempting write Tmpl ID={template_id} with data: {update_data}")
-
-        # 3. Execute write
-        write_ok = client.env['product.template'].write([template_id], update_data)
-
-        if write_ok:
-             # Log message translated
-            logging.info(f"[books_bp mark_in_transit] Book '{book_name}' (Tmpl ID:{template_id}) marked IN TRANSIT (Dest ID:{destination_tag_id})!")
-             # Flash message translated
-            flash(f'Book "{book_name}" marked as In Transit.', 'success')
-        else:
-            # Log message translated
-            logging.warning(f"[books_bp mark_in_transit] Write returned False/None for Tmpl ID:{template_id}.")
-             # Flash message translated
-            flash(f'Attempted to mark Book "{book_name}" as In Transit, but Odoo did not confirm.', 'warning')
-
-    except odoorpc.error.RPCError as e:
-        # Log message translated
-        logging.error(f"[books_bp mark_in_transit] RPC Error: (Tmpl ID:{template_id}) {e}", exc_info=True)
-        # Flash message translated
-        flash(f'RPC Error marking In Transit: {e}', 'error')
-    except Exception as e:
-        # Log message translated
-        logging.error(f"[books_bp mark_in_transit] Unexpected Error: (Tmpl ID:{template_id}) {e}", exc_info=True)
-        # Flash message translated
-        flash(f'Unexpected error marking In Transit: {e}', 'error')
-
-    # Always redirect back to SHIPPING MANAGEMENT
-    # The book will still appear, but with updated status and different buttons (depending on template logic)
-    return redirect(url_for('books.shipping_management'))
-
+    return _transition_one_book(book_id, transition_name, 'books.shipping_management', "[books_bp mark_in_transit]")
 
 # --- NEW LOGISTICS ROUTE: Mark as Delivered (POST) ---
 # NOTE: Similar to mark_in_transit, this primarily manages tags.
@@ -953,86 +886,107 @@ def mark_in_transit(destination_tag_id, book_id):
 def mark_delivered(book_id):
     """
     Handles the action of marking a book as 'Delivered'.
-    Removes ANY 'In Transit' tag and adds 'Logistics: Delivered' (ID 9).
+    Only the 'In Transit' tag the book really has is removed.
     """
     # Log message translated
     logging.info(f"[books_bp POST /mark_delivered] Request to MARK DELIVERED for product.product ID: {book_id}")
+    return _transition_one_book(book_id, 'deliver', 'books.shipping_management', "[books_bp mark_delivered]")
 
-    # IDs to validate: Delivered ID (which we add) and list of transit IDs (which we remove)
-    # Variable name fine
-    transit_tags_to_remove = [TAG_ID_LOGISTICS_TRANSIT_EC, TAG_ID_LOGISTICS_TRANSIT_VE, 8] # IDs 10, 11, 8
-    if TAG_ID_LOGISTICS_DELIVERED <= 0:
-        # Flash message translated
-         flash(f'Config Error: Invalid Delivered Tag ID ({TAG_ID_LOGISTICS_DELIVERED}).', 'error')
-         # Log message translated
-         logging.error(f"[books_bp mark_delivered] Invalid ID: DELIVERED={TAG_ID_LOGISTICS_DELIVERED}")
-         return redirect(url_for('books.shipping_management'))
 
-    client = get_odoo_client()
-    if not client:
-        # Flash message translated
-        flash('Odoo connection error.', 'error')
-        return redirect(url_for('books.shipping_management'))
+# --- BULK TAG TRANSITIONS (several books in one request) ---
+# Transitions offered by the bulk endpoint -> list view to return to
+BULK_TRANSITION_VIEWS = {
+    'approve': 'books.review_books',
+    'reject': 'books.review_books',
+    'ready': 'books.approved_books',
+    'transit': 'books.shipping_management',
+    'transit_ec': 'books.shipping_management',
+    'transit_ve': 'books.shipping_management',
+    'deliver': 'books.shipping_management',
+}
 
-    template_id = None
-    try:
-        # 1. Get Template ID and name (same as before)
-        product_info = client.env['product.product'].read(book_id, ['product_tmpl_id', 'name'])
-        if not product_info or not product_info[0]['product_tmpl_id']:
-             # Flash message translated
-            flash(f'Error: Template not found for product ID={book_id}.', 'error')
-             # Log message translated
-            logging.error(f"[books_bp mark_delivered] Template not found for Prod ID={book_id}.")
-            return redirect(url_for('books.shipping_management'))
-        template_id = product_info[0]['product_tmpl_id'][0]
-        book_name = product_info[0].get('name', f'ID {book_id}')
-        # Log message translated
-        logging.info(f"[books_bp mark_delivered] Prod ID={book_id} ('{book_name}'), Tmpl ID={template_id}")
 
-        # 2. Prepare UPDATE data:
-        #    - Remove ALL 'In Transit' tags (IDs 8, 10, 11) -> (3, id) for each one
-        #    - Add 'Delivered' (ID 9)             -> (4, TAG_ID_LOGISTICS_DELIVERED)
-        # Dynamically build the list of unlink operations
-        tags_operations = []
-        for tag_id_to_remove in transit_tags_to_remove:
-            # Command to unlink
-             tags_operations.append((3, tag_id_to_remove)) 
+@books_bp.route('/books/bulk_transition', methods=['POST'])
+def bulk_tag_transition():
+    """
+    Moves several books through the same workflow step at once (see
+    BULK_TRANSITION_VIEWS and book_lifecycle.TRANSITIONS). Books that are not
+    in a source state of the transition are left untouched and reported.
 
-        # Add the operation to link 'Delivered'
-        tags_operations.append((4, TAG_ID_LOGISTICS_DELIVERED))
+    Accepts a form (book_ids checkboxes + transition button, answers with a
+    redirect) or JSON {"transition": ..., "book_ids": [...]} (answers with JSON).
+    """
+    is_api = request.is_json
+    if is_api:
+        payload = request.get_json(silent=True) or {}
+        transition = payload.get('transition')
+        raw_ids = payload.get('book_ids') or []
+    else:
+        transition = request.form.get('transition')
+        raw_ids = request.form.getlist('book_ids')
+    # Log message translated
+    logging.info(f"[books_bp POST /bulk_transition] Transition '{transition}' requested for {len(raw_ids)} book(s).")
 
-        update_data = {'product_tag_ids': tags_operations}
-        # Log message translated
-        logging.info(f"[books_bp mark_delivered] Attempting write Tmpl ID={template_id} with data: {update_data}")
+    if transition not in BULK_TRANSITION_VIEWS:
+        if is_api:
+            return jsonify({'error': f'Unknown transition: {transition}',
+                            'transitions': sorted(BULK_TRANSITION_VIEWS)}), 400
+        # Flash message translated
+        flash(f'Error: Unknown transition "{transition}".', 'error')
+        return redirect(url_for('books.review_books'))
+    list_endpoint = BULK_TRANSITION_VIEWS[transition]
 
-        # 3. Execute write
-        write_ok = client.env['product.template'].write([template_id], update_data)
+    try:
+        # Keep the order, drop duplicates
+        product_ids = list(dict.fromkeys(int(raw_id) for raw_id in raw_ids))
+    except (TypeError, ValueError):
+        if is_api:
+            return jsonify({'error': 'book_ids must be integers.'}), 400
+        # Flash message translated
+        flash('Error: Invalid book IDs.', 'error')
+        return redirect(url_for(list_endpoint))
+    if not product_ids:
+        if is_api:
+            return jsonify({'error': 'No book_ids given.'}), 400
+        # Flash message translated
+        flash('Error: No books selected.', 'error')
+        return redirect(url_for(list_endpoint))
 
-        if write_ok:
-            # Log message translated
-            logging.info(f"[books_bp mark_delivered] Book '{book_name}' (Tmpl ID:{template_id}) marked DELIVERED!")
-            # Flash message translated
-            flash(f'Book "{book_name}" marked as Delivered.', 'success')
-        else:
-            # Log message translated
-            logging.warning(f"[books_bp mark_delivered] Write returned False/None for Tmpl ID:{template_id}.")
-            # Flash message translated
-            flash(f'Attempted to mark Book "{book_name}" as Delivered, but Odoo did not confirm.', 'warning')
+    client = get_odoo_client()
+    if not client:
+        if is_api:
+            return jsonify({'error': 'Odoo connection error.'}), 503
+        # Flash message translated
+        flash('Odoo connection error.', 'error')
+        return redirect(url_for(list_endpoint))
 
+    try:
+        result = apply_transition(product_ids, transition)
     except odoorpc.error.RPCError as e:
-         # Log message translated
-        logging.error(f"[books_bp mark_delivered] RPC Error: (Tmpl ID:{template_id}) {e}", exc_info=True)
-         # Flash message translated
-        flash(f'RPC Error marking Delivered: {e}', 'error')
+        # Log message translated
+        logging.error(f"[books_bp bulk_transition] RPC Error ('{transition}'): {e}", exc_info=True)
+        if is_api:
+            return jsonify({'error': f'Odoo RPC Error: {e}'}), 502
+        # Flash message translated
+        flash(f'RPC Error while applying "{transition}": {e}', 'error')
+        return redirect(url_for(list_endpoint))
     except Exception as e:
-         # Log message translated
-        logging.error(f"[books_bp mark_delivered] Unexpected Error: (Tmpl ID:{template_id}) {e}", exc_info=True)
-         # Flash message translated
-        flash(f'Unexpected error marking Delivered: {e}', 'error')
+        # Log message translated
+        logging.error(f"[books_bp bulk_transition] Unexpected error ('{transition}'): {e}", exc_info=True)
+        if is_api:
+            return jsonify({'error': f'Unexpected error: {e}'}), 500
+        # Flash message translated
+        flash(f'Unexpected error while applying "{transition}": {e}', 'error')
+        return redirect(url_for(list_endpoint))
 
-    # Always redirect back to SHIPPING MANAGEMENT
-    # The book will NO LONGER appear here if successful, because the view filters by tags IN the pipeline (assumption)
-    return redirect(url_for('books.shipping_management'))
+    if is_api:
+        return jsonify({'transition': transition,
+                        'updated': [product_id for product_id, _ in result.updated],
+                        'unchanged': [product_id for product_id, _ in result.unchanged],
+                        'invalid': [{'id': product_id, 'states': states} for product_id, _, states in result.invalid],
+                        'not_found': result.not_found})
+    _flash_transition_result(result)
+    return redirect(url_for(list_endpoint))
 
 
 # --- NEW ROUTE: Create Batch Shipment (stock.picking) ---
@@ -1081,19 +1035,17 @@ def create_batch_shipment():
         logging.error(f"Error converting IDs: books={selected_book_ids_str}, dest={destination_location_id_str}")
         return redirect(url_for('books.approved_books'))
 
-    # --- Odoo Configuration IDs (need to be defined as constants above or passed) ---
-   
-    SOURCE_LOCATION_ID = 30          # ID of 'Stock Books Approved ONG'
-    # Variable name translated
-    SHIPMENT_OPERATION_TYPE_ID = 7    # ID of 'Branch Shipments' 
-   
-
     client = get_odoo_client()
     if not client:
         # Flash message translated
         flash('Odoo connection error. Could not create shipment.', 'error')
         return redirect(url_for('books.approved_books'))
 
+    # --- Odoo Configuration IDs (resolved once and cached, see odoo_refdata.REFERENCES) ---
+    SOURCE_LOCATION_ID = ref_id(client, 'book_stock_location')          # ID of 'Stock Books Approved ONG' (30)
+    # Variable name translated
+    SHIPMENT_OPERATION_TYPE_ID = ref_id(client, 'shipment_picking_type')    # ID of 'Branch Shipments' (7)
+
     # To store the ID of the created transfer
     new_picking_id = None 
     try:
@@ -1102,16 +1054,17 @@ def create_batch_shipment():
         logging.info("Preparing data to create 'stock.picking'...")
 
         # Odoo model for transfers
-        PickingModel = client.env['stock.picking']
+        PickingModel = odoo_model('stock.picking')
 
         # === Building move lines (move_ids_without_package) ===
         # Odoo expects a list of operations, (0, 0, {values}) to create new lines
         move_lines_data = []
         # Log message translated
         logging.info(f"Creating move lines for {len(selected_book_ids)} books...")
-        # Get book names for move description (optional but useful)
+        # Get book names for move description (optional but useful).
+        # Templates and tags are read in the same call; the 'ship' transition below reuses them.
         try:
-             books_data = client.env['product.product'].read(selected_book_ids, ['name'])
+             books_data = read_records('product.product', selected_book_ids, STATE_FIELDS)
              # Create a dictionary id -> name for easy lookup
              book_names = {book['id']: book['name'] for book in books_data}
         except Exception as read_err:
@@ -1175,12 +1128,8 @@ def create_batch_shipment():
              logging.info(f"Success! Transfer (stock.picking) created with ID: {new_picking_id} !")
              
              # READ the name/reference of the created transfer (e.g., BS/00001)
-             picking_ref = ""
-             try:
-                picking_info = PickingModel.read(new_picking_id, ['name'])
-                if picking_info: picking_ref = picking_info[0].get('name', '')
              # Not critical if we can't read the name
-             except Exception: pass 
+             picking_ref = record_name('stock.picking', new_picking_id, default='')
              
              # Flash message translated
              flash(f'Batch shipment created successfully in Odoo (Reference: {picking_ref or new_picking_id}).', 'success')
@@ -1191,29 +1140,13 @@ def create_batch_shipment():
              try:
                   # Log message translated
                   logging.info(f"Removing 'Approved' tag (ID {TAG_ID_APROBADO}) from shipped books: {selected_book_ids}")
-                  templates_to_update = []
-                  # Need template IDs associated with the products
-                  product_infos = client.env['product.product'].read(selected_book_ids, ['product_tmpl_id'])
-                  if product_infos:
-                      templates_to_update = [p['product_tmpl_id'][0] for p in product_infos if p.get('product_tmpl_id')]
-                       # Remove duplicates if multiple books were from the same template (unlikely here)
-                      templates_to_update = list(set(templates_to_update)) 
-                      
-                      if templates_to_update:
-                           # Unlink Approved
-                          update_data = {'product_tag_ids': [(3, TAG_ID_APROBADO)]} 
-                          write_ok = client.env['product.template'].write(templates_to_update, update_data)
-                          if write_ok:
-                              # Log message translated
-                              logging.info(f"'Approved' tag removed from templates: {templates_to_update}")
-                          else:
-                              # Log message translated
-                              logging.warning(f"Odoo did not confirm removal of Approved tag for templates {templates_to_update}")
-                              # Flash message translated
-                              flash('Warning: Could not remove the "Approved" tag from shipped books. They might reappear.', 'warning')
-                      else:
-                           # Log message translated
-                           logging.warning("No valid template IDs found to remove tag.")
+                  # 'ship' transition: Approved -> no workflow tag (one write, tags already read above)
+                  ship_result = apply_transition(selected_book_ids, 'ship')
+                  if ship_result.invalid or ship_result.not_found:
+                      # Log message translated
+                      logging.warning(f"'Approved' tag not removed for books {[i for i, _, _ in ship_result.invalid] + ship_result.not_found}")
+                      # Flash message translated
+                      flash('Warning: Some shipped books were no longer "Approved"; their status was left unchanged.', 'warning')
              except Exception as tag_err:
                    # Log message translated
                   logging.error(f"Error attempting to remove 'Approved' tag from shipped books: {tag_err}", exc_info=True)
@@ -1249,6 +1182,152 @@ def create_batch_shipment():
     # Redirect to shipping management page to see the new transfer.
     return redirect(url_for('books.shipping_management'))
 
+# --- SHIPMENT PLANNER: the whole approved queue, one picking per destination ---
+@books_bp.route('/shipment_planner', methods=['GET', 'POST'])
+def shipment_planner():
+    """
+    GET shows every approved book not yet in logistics, each with a destination
+    selector. POST reads the queue once, groups it by destination, creates all
+    the pickings in one call and takes the books out of the approved queue
+    (see shipment_planner.py).
+
+    The POST accepts a form (dest_<book id> selects + default_destination +
+    one book_ids field per listed book, answers with a redirect) or JSON
+    {"default_destination": id, "book_ids": [ids], "assignments": {"<book id>": id}}
+    (answers with JSON). The default destination only applies to book_ids, the
+    books the user saw: books approved after the page was loaded stay queued.
+    """
+    client = get_odoo_client()
+
+    if request.method == 'GET':
+        # Log message translated
+        logging.info("[books_bp GET /shipment_planner] Loading the approved queue.")
+        books = []
+        error_message = None
+        if not client:
+            # Flash message translated
+            flash('Odoo connection error. Cannot load the approved books.', 'error')
+            error_message = "Odoo connection error."
+        else:
+            try:
+                books = fetch_approved_queue(client)
+                if not books:
+                    # Flash message translated
+                    flash('No approved books are pending to start the shipping process.', 'info')
+            except odoorpc.error.RPCError as e:
+                # Log message translated
+                logging.error(f"[books_bp GET /shipment_planner] RPC Error: {e}", exc_info=True)
+                error_message = f"Odoo RPC Error loading the approved books: {e}"
+                flash(error_message, 'error')
+            except Exception as e:
+                # Log message translated
+                logging.error(f"[books_bp GET /shipment_planner] Unexpected error: {e}", exc_info=True)
+                error_message = f"Unexpected error loading the approved books: {e}"
+                flash(error_message, 'error')
+        return render_template('shipment_planner.html', books=books, destinations=BRANCH_DESTINATIONS,
+                               error_message=error_message)
+
+    is_api = request.is_json
+    try:
+        if is_api:
+            payload = request.get_json(silent=True) or {}
+            default_destination = payload.get('default_destination')
+            raw_assignments = (payload.get('assignments') or {}).items()
+            raw_shown_ids = payload.get('book_ids') or []
+        else:
+            default_destination = request.form.get('default_destination')
+            raw_assignments = [(key[len('dest_'):], value) for key, value in request.form.items()
+                               if key.startswith('dest_')]
+            raw_shown_ids = request.form.getlist('book_ids')
+        default_destination = int(default_destination) if default_destination else None
+        shown_ids = {int(book_id) for book_id in raw_shown_ids}
+        assignments = {int(book_id): int(destination_id) for book_id, destination_id in raw_assignments
+                       if destination_id not in (None, '')}
+    except (TypeError, ValueError):
+        if is_api:
+            return jsonify({'error': 'Book and destination IDs must be integers.'}), 400
+        # Flash message translated
+        flash('Error: Invalid book or destination IDs.', 'error')
+        return redirect(url_for('books.shipment_planner'))
+
+    unknown = {destination_id for destination_id in list(assignments.values()) + [default_destination]
+               if destination_id is not None and destination_id not in BRANCH_DESTINATIONS}
+    if unknown:
+        if is_api:
+            return jsonify({'error': f'Unknown destination(s): {sorted(unknown)}',
+                            'destinations': list(BRANCH_DESTINATIONS)}), 400
+        # Flash message translated
+        flash(f'Error: Unknown destination(s) {sorted(unknown)}.', 'error')
+        return redirect(url_for('books.shipment_planner'))
+
+    if default_destination is not None and not shown_ids:
+        if is_api:
+            return jsonify({'error': 'default_destination needs the book_ids it applies to.'}), 400
+        # Flash message translated
+        flash('Error: The list of books shown was not sent. Reload the page and try again.', 'error')
+        return redirect(url_for('books.shipment_planner'))
+
+    if not client:
+        if is_api:
+            return jsonify({'error': 'Odoo connection error.'}), 503
+        # Flash message translated
+        flash('Odoo connection error. Could not create the shipments.', 'error')
+        return redirect(url_for('books.shipment_planner'))
+
+    timer = StepTimer('shipment_planner')
+    try:
+        # The queue is read again here (once): only books still approved are shipped
+        with timer.step('read approved queue'):
+            books = fetch_approved_queue(client)
+        groups, unplanned = plan_shipments(books, assignments, default_destination, shown_ids)
+        # Log message translated
+        logging.info(f"[books_bp POST /shipment_planner] Plan: {{{', '.join(f'{d}: {len(b)}' for d, b in groups.items())}}},"
+                     f" {len(unplanned)} book(s) left in the queue.")
+        report = execute_plan(client, groups, timer=timer)
+    except odoorpc.error.RPCError as e:
+        # Log message translated
+        logging.error(f"[books_bp POST /shipment_planner] Odoo RPC Error: {e}", exc_info=True)
+        if is_api:
+            return jsonify({'error': f'Odoo RPC Error: {e}'}), 502
+        error_details = str(getattr(e, 'fault', e))
+        # Flash message translated
+        flash(f'Odoo error creating the shipments ({type(e).__name__}): {error_details}', 'error')
+        return redirect(url_for('books.shipment_planner'))
+    except Exception as e:
+        # Log message translated
+        logging.error(f"[books_bp POST /shipment_planner] Unexpected error: {e}", exc_info=True)
+        if is_api:
+            return jsonify({'error': f'Unexpected error: {e}'}), 500
+        # Flash message translated
+        flash(f'Unexpected server error creating the shipments: {e}', 'error')
+        return redirect(url_for('books.shipment_planner'))
+    finally:
+        logging.info(f"[books_bp POST /shipment_planner] Timings: {timer.summary()}")
+
+    # Books planned on the page but no longer in the queue (shipped or changed meanwhile)
+    queued_ids = {book['id'] for book in books}
+    planned_ids = set(assignments) | (shown_ids if default_destination is not None else set())
+    stale = sorted(book_id for book_id in planned_ids if book_id not in queued_ids)
+    if is_api:
+        return jsonify({'pickings': report['pickings'], 'shipped': report['shipped'],
+                        'left_in_queue': len(unplanned), 'not_in_queue': stale,
+                        'tag_error': report['tag_error']})
+
+    if not report['pickings']:
+        # Flash message translated
+        flash('No books were assigned to a destination: no shipment created.', 'warning')
+        return redirect(url_for('books.shipment_planner'))
+    for picking in report['pickings']:
+        # Flash message translated
+        flash(f"Shipment to {picking['destination']} created with {picking['books']} book(s) (Odoo ID: {picking['id']}).", 'success')
+    if report['tag_error']:
+        flash(report['tag_error'], 'warning')
+    if stale:
+        # Flash message translated
+        flash(f'{len(stale)} book(s) were no longer in the approved queue and were not shipped.', 'warning')
+    return redirect(url_for('books.shipping_management'))
+
+
 # --- NEW ROUTE: Confirm Shipment Transfer (POST) ---
 @books_bp.route('/confirm_shipment/<int:picking_id>', methods=['POST'])
 def confirm_shipment(picking_id):
@@ -1265,7 +1344,7 @@ def confirm_shipment(picking_id):
         return redirect(url_for('books.shipping_management'))
 
     try:
-        PickingModel = client.env['stock.picking']
+        PickingModel = odoo_model('stock.picking')
         # Log message translated
         logging.info(f"Calling 'action_confirm' for picking ID {picking_id}")
         # action_confirm method usually doesn't need extra args here
@@ -1274,11 +1353,7 @@ def confirm_shipment(picking_id):
         # Log message translated
         logging.info(f"Transfer {picking_id} confirmed (or attempt sent)!")
         # Read name/ref for message
-        picking_ref = ""
-        try:
-            picking_info = PickingModel.read(picking_id, ['name'])
-            if picking_info: picking_ref = picking_info[0].get('name', '')
-        except Exception: pass
+        picking_ref = record_name('stock.picking', picking_id, default='')
         # Flash message translated
         flash(f'Transfer {picking_ref or picking_id} confirmed.', 'success')
 
@@ -1314,7 +1389,7 @@ def reserve_shipment(picking_id):
         return redirect(url_for('books.shipping_management'))
 
     try:
-        PickingModel = client.env['stock.picking']
+        PickingModel = odoo_model('stock.picking')
          # Log message translated
         logging.info(f"Calling 'action_assign' (Reserve Stock) for picking ID {picking_id}")
 
@@ -1326,22 +1401,14 @@ def reserve_shipment(picking_id):
         logging.info(f"Stock reservation attempt sent for picking ID {picking_id}!")
 
         # Read name/ref for message
-        picking_ref = f"ID {picking_id}"
-        try:
-            picking_info = PickingModel.read(picking_id, ['name'])
-            if picking_info: picking_ref = picking_info[0].get('name', picking_ref)
-        except Exception: pass
+        picking_ref = record_name('stock.picking', picking_id)
         # Flash message translated (informational message)
         flash(f'Stock reservation attempt initiated for shipment {picking_ref}. Check the new status.', 'info') 
 
     except odoorpc.error.RPCError as e:
-        # Try to get ref for error message
-        picking_ref = f"ID {picking_id}" 
-        try:
-            p_info = client.env['stock.picking'].read(picking_id, ['name'])
-            if p_info: picking_ref = p_info[0].get('name', picking_ref)
-        except Exception: pass
-            
+        # Try to get ref for error message (read at most once per request)
+        picking_ref = record_name('stock.picking', picking_id)
+
         # Log message translated
         logging.error(f"[books_bp POST /reserve_shipment] Odoo RPC Error for '{picking_ref}': {e}", exc_info=True)
         # Try to get error message from Odoo
@@ -1350,12 +1417,8 @@ def reserve_shipment(picking_id):
         flash(f'Odoo error attempting to reserve stock for {picking_ref}: {error_details}', 'error')
         
     except Exception as e:
-        picking_ref = f"ID {picking_id}"
-        try:
-            p_info = client.env['stock.picking'].read(picking_id, ['name'])
-            if p_info: picking_ref = p_info[0].get('name', picking_ref)
-        except Exception: pass
-            
+        picking_ref = record_name('stock.picking', picking_id)
+
         # Log message translated
         logging.error(f"[books_bp POST /reserve_shipment] Unexpected error for '{picking_ref}': {e}", exc_info=True)
         # Flash message translated
@@ -1365,6 +1428,126 @@ def reserve_shipment(picking_id):
     return redirect(url_for('books.shipping_management'))
 
 
+# --- "SHIP NOW": confirm, reserve and validate in one operation (one picking or many) ---
+# Flash category of each outcome of shipment_pipeline.ship_pickings
+SHIP_FLASH_CATEGORIES = {SHIP_DONE: 'success', SHIP_SKIPPED: 'info', SHIP_WAITING: 'warning', SHIP_WIZARD: 'warning'}
+
+
+def _run_shipment_pipeline(pipeline, picking_ids, is_api, label):
+    """Runs pipeline(client, picking_ids, timer=...) and answers with JSON or flash messages + redirect."""
+    client = get_odoo_client()
+    if not client:
+        if is_api:
+            return jsonify({'error': 'Odoo connection error.'}), 503
+        # Flash message translated
+        flash('Odoo connection error.', 'error')
+        return redirect(url_for('books.shipping_management'))
+
+    timer = StepTimer(f'{label} ({len(picking_ids)} picking(s))')
+    try:
+        outcomes = pipeline(client, picking_ids, timer=timer)
+    except odoorpc.error.RPCError as e:
+        # Log message translated
+        logging.error(f"[books_bp POST /{label}] Odoo RPC Error: {e}", exc_info=True)
+        if is_api:
+            return jsonify({'error': f'Odoo RPC Error: {e}'}), 502
+        # Flash message translated
+        flash(f'Odoo RPC Error shipping transfers: {e}', 'error')
+        return redirect(url_for('books.shipping_management'))
+    except Exception as e:
+        # Log message translated
+        logging.error(f"[books_bp POST /{label}] Unexpected error: {e}", exc_info=True)
+        if is_api:
+            return jsonify({'error': f'Unexpected error: {e}'}), 500
+        # Flash message translated
+        flash(f'Unexpected error shipping transfers: {e}', 'error')
+        return redirect(url_for('books.shipping_management'))
+    finally:
+        logging.info(f"[books_bp POST /{label}] Timings: {timer.summary()}")
+
+    if is_api:
+        return jsonify({'results': outcomes})
+    for outcome in outcomes:
+        # Flash message translated
+        flash(f"{outcome['name']}: {outcome['message']}", SHIP_FLASH_CATEGORIES.get(outcome['status'], 'error'))
+    return redirect(url_for('books.shipping_management'))
+
+
+@books_bp.route('/ship_now/<int:picking_id>', methods=['POST'])
+def ship_now(picking_id):
+    """
+    Confirms, reserves and validates one transfer in a single request
+    (instead of Confirm, Reserve Stock and Validate / Details).
+    """
+    # Log message translated
+    logging.info(f"[books_bp POST /ship_now] Request to SHIP NOW transfer ID: {picking_id}")
+    return _run_shipment_pipeline(ship_pickings, [picking_id], False, 'ship_now')
+
+
+def _batch_picking_ids():
+    """
+    Picking IDs of a batch request: form (picking_ids checkboxes) or JSON
+    {"picking_ids": [...]}. Returns (is_api, picking_ids, error_response).
+    """
+    is_api = request.is_json
+    if is_api:
+        raw_ids = (request.get_json(silent=True) or {}).get('picking_ids') or []
+    else:
+        raw_ids = request.form.getlist('picking_ids')
+    try:
+        picking_ids = list(dict.fromkeys(int(raw_id) for raw_id in raw_ids))
+    except (TypeError, ValueError):
+        if is_api:
+            return is_api, None, (jsonify({'error': 'picking_ids must be integers.'}), 400)
+        # Flash message translated
+        flash('Error: Invalid transfer IDs.', 'error')
+        return is_api, None, redirect(url_for('books.shipping_management'))
+    if not picking_ids:
+        if is_api:
+            return is_api, None, (jsonify({'error': 'No picking_ids given.'}), 400)
+        # Flash message translated
+        flash('Error: No transfers selected.', 'error')
+        return is_api, None, redirect(url_for('books.shipping_management'))
+    return is_api, picking_ids, None
+
+
+@books_bp.route('/ship_now', methods=['POST'])
+def ship_now_batch():
+    """
+    Same as ship_now for many transfers: a form (picking_ids checkboxes) or
+    JSON {"picking_ids": [...]} (answers with the outcome of each picking).
+    """
+    is_api, picking_ids, error_response = _batch_picking_ids()
+    if error_response is not None:
+        return error_response
+    # Log message translated
+    logging.info(f"[books_bp POST /ship_now] Request to SHIP NOW {len(picking_ids)} transfer(s).")
+    return _run_shipment_pipeline(ship_pickings, picking_ids, is_api, 'ship_now')
+
+
+@books_bp.route('/validate_shipments', methods=['POST'])
+def validate_shipments():
+    """
+    End-of-day validation of many reserved transfers: done quantities =
+    reserved quantities, one button_validate for all of them, and the
+    immediate-transfer / backorder wizards answered automatically.
+    Form (picking_ids checkboxes) or JSON {"picking_ids": [...], "backorder": true}.
+    """
+    is_api, picking_ids, error_response = _batch_picking_ids()
+    if error_response is not None:
+        return error_response
+    if is_api:
+        create_backorder = bool((request.get_json(silent=True) or {}).get('backorder', True))
+    else:
+        create_backorder = request.form.get('backorder', '1') == '1'
+    # Log message translated
+    logging.info(f"[books_bp POST /validate_shipments] Request to VALIDATE {len(picking_ids)} transfer(s) (backorder={create_backorder}).")
+
+    def pipeline(client, ids, timer):
+        return validate_pickings(client, ids, create_backorder=create_backorder, timer=timer)
+    return _run_shipment_pipeline(pipeline, picking_ids, is_api, 'validate_shipments')
+
+
 # --- UPDATED ROUTE: REDIRECTS to show details for validation ---
 @books_bp.route('/validate_shipment/<int:picking_id>', methods=['POST']) # Keep POST for now due to the form
 def validate_shipment(picking_id):
@@ -1407,10 +1590,13 @@ def show_picking_details(picking_id):
     else:
         # If client exists, try getting data
         try:
-            PickingModel = client.env['stock.picking']
-            # Read picking header
+            # Picking header AND its DETAILED MOVE LINES (stock.move.line) in one round-trip:
+            # the lines are searched by picking_id in parallel with the header read
             picking_fields = ['id', 'name', 'state', 'origin', 'location_id', 'location_dest_id', 'scheduled_date']
-            picking_data_list = PickingModel.read(picking_id, fields=picking_fields)
+            line_fields = ['id', 'product_id', 'qty_done', 'product_uom_id', 'move_id']
+            picking_data_list = load_record_graph(client, 'stock.picking', picking_id, picking_fields, {
+                'move_lines': ('stock.move.line', 'picking_id', line_fields),
+            })
 
             if not picking_data_list:
                 # Flash message translated
@@ -1418,33 +1604,18 @@ def show_picking_details(picking_id):
                 return redirect(url_for('books.shipping_management'))
 
             picking_data = picking_data_list[0]
+            move_lines = picking_data.pop('move_lines')
              # Log message translated
             logging.info(f"Header data read for picking {picking_id}: {picking_data}")
-
-            # Read DETAILED MOVE LINES (stock.move.line)
-            # Use the 'move_line_ids' field of the picking.
-            picking_with_lines = PickingModel.read(picking_id, ['move_line_ids'])
-            move_line_ids = []
-            if picking_with_lines and picking_with_lines[0].get('move_line_ids'):
-                move_line_ids = picking_with_lines[0]['move_line_ids']
-
              # Log message translated
-            logging.info(f"Searching details of DETAILED LINES (stock.move.line) IDs: {move_line_ids}")
+            logging.info(f"Data of {len(move_lines)} detailed lines (stock.move.line) read.")
 
-            if move_line_ids:
-                # If detailed line IDs are found, read them
-                MoveLineModel = client.env['stock.move.line']
-                line_fields = ['id', 'product_id', 'qty_done', 'product_uom_id', 'move_id']
-                move_lines = MoveLineModel.read(move_line_ids, fields=line_fields)
-                 # Log message translated
-                logging.info(f"Data of {len(move_lines)} detailed lines (stock.move.line) read.")
-            else:
-                 # If NO move_line_ids, it's an important warning.
+            if not move_lines:
+                 # If NO move lines, it's an important warning.
                  # Log message translated
                 logging.warning(f"Transfer {picking_id} has no DETAILED LINES (stock.move.line). Was stock reserved with 'action_assign'?")
                  # Flash message translated
                 flash('Warning: Book details not found to enter quantities. Try "Reserve Stock" first in the shipment list.', 'warning')
-                # move_lines is already initialized as [] above, no need to reassign here.
 
         # Except blocks (correctly indented with try)
         except odoorpc.error.RPCError as e:
@@ -1548,29 +1719,22 @@ def process_validate_shipment(picking_id):
     # For error/success messages
     picking_ref = f"ID {picking_id}" 
     try:
-        PickingModel = client.env['stock.picking']
-        MoveLineModel = client.env['stock.move.line']
-
-        # Read picking name for messages
-        try:
-            p_info = PickingModel.read(picking_id, ['name'])
-            if p_info: picking_ref = p_info[0].get('name', picking_ref)
-        except Exception: pass
-
-         # Log message translated
-        logging.info(f"Validating picking '{picking_ref}'. Quantities to update: {move_quantities}")
+        PickingModel = odoo_model('stock.picking')
 
-        # 2. Find 'stock.move.line' IDs associated with our 'stock.move' IDs and this picking
+        # 2. Picking name (for messages) and the 'stock.move.line' of our 'stock.move' IDs, in one round-trip
         # Log message translated
         logging.info(f"Searching 'stock.move.line' for picking {picking_id} and move IDs {list(move_quantities.keys())}")
-        # Search for move_line belonging to the picking and whose move_id is in our list
-        search_domain_ml = [
-             ('picking_id', '=', picking_id),
-             ('move_id', 'in', list(move_quantities.keys()))
-        ]
+        picking_graph = load_record_graph(client, 'stock.picking', picking_id, ['name'], {
+            # Read ONLY id and move_id to map the correct line
+            'move_lines': ('stock.move.line', 'picking_id', ['id', 'move_id'],
+                           [('move_id', 'in', list(move_quantities.keys()))]),
+        })
+        if picking_graph:
+            picking_ref = picking_graph[0]['name']
+        move_line_ids_data = picking_graph[0]['move_lines'] if picking_graph else []
 
-        # Read ONLY id and move_id to map the correct line
-        move_line_ids_data = MoveLineModel.search_read(search_domain_ml, fields=['id', 'move_id'])
+         # Log message translated
+        logging.info(f"Validating picking '{picking_ref}'. Quantities to update: {move_quantities}")
 
         if not move_line_ids_data:
              # Log message translated
@@ -1608,6 +1772,8 @@ def process_validate_shipment(picking_id):
         # Log message translated
         logging.info(f"Attempting write on picking ID {picking_id} with commands: {write_commands}")
         write_ok = PickingModel.write([picking_id], {'move_line_ids': write_commands})
+        # Quantities just changed in Odoo: do not serve the old ones later in this request
+        forget_records('stock.move.line', [ml['id'] for ml in move_line_ids_data])
 
         if not write_ok:
              # Very rare if no exception, but can happen.
@@ -1626,6 +1792,13 @@ def process_validate_shipment(picking_id):
         validation_result = PickingModel.button_validate([picking_id])
          # Log message translated
         logging.info(f"'button_validate' executed for '{picking_ref}'. Result: {validation_result}")
+        # A wizard action (immediate transfer / backorder) is answered here instead of left pending in Odoo
+        if isinstance(validation_result, dict):
+            validation_result = process_validation_wizards(client, validation_result)
+            if isinstance(validation_result, dict):
+                # Flash message translated
+                flash(f"Shipment {picking_ref}: Odoo still asks for a confirmation ({validation_result.get('res_model')}). Finish it in Odoo.", 'warning')
+                return redirect(url_for('books.shipping_management'))
 
         # Flash message translated
         flash(f'Shipment {picking_ref} validated and completed successfully!', 'success')
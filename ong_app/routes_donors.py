@@ -1,8 +1,14 @@
 # ong_app/routes_donors.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 # We need to import this now! Comment translated
 from .odoo_connector import get_odoo_client 
+from .odoo_context import odoo_model
+from .donor_index import get_donor_index
+from .donor_import import DonorImportError, iter_donor_rows, import_donor_rows
+from .odoo_batch import StepTimer
+from .pagination import Page, get_page_args
 import logging
+import re
 # Import for RPC exceptions Comment translated
 import odoorpc 
 
@@ -46,13 +52,21 @@ def add_donor_submit():
     try:
         # Model for contacts in Odoo: res.partner Comment translated
 
-        # Simple search to avoid duplicates by email if provided Comment translated
+        # Simple check to avoid duplicates by email if provided Comment translated
+        # The in-memory contact index (normalized email) answers first; it can be up to
+        # DONOR_INDEX_TTL behind (and differs per worker), so a miss is confirmed in Odoo
         existing_partner_ids = []
         if email:
-            search_criteria = [('email', '=', email)]
              # Log message translated
-            logging.info(f"[donors_bp] Searching for existing partner by email: {email}")
-            existing_partner_ids = client.env['res.partner'].search(search_criteria)
+            logging.info(f"[donors_bp] Looking up existing partner by email: {email}")
+            existing_partner = get_donor_index().find_by_email(client, email)
+            if existing_partner is not None:
+                existing_partner_ids = [existing_partner.id]
+            else:
+                # Case-insensitive exact match: '_' and '%' would be wildcards for =ilike
+                pattern = re.sub(r'([\\%_])', r'\\\1', email.strip())
+                existing_partner_ids = client.execute_kw('res.partner', 'search', [[('email', '=ilike', pattern)]],
+                                                         {'limit': 1})
              # Log message translated
             logging.info(f"[donors_bp] IDs found: {existing_partner_ids}")
 
@@ -89,9 +103,11 @@ def add_donor_submit():
             # 'is_company': False,   # Another way to indicate it in some versions/views Comment translated
         }
 
-        new_partner_id = client.env['res.partner'].create(partner_data)
+        new_partner_id = odoo_model('res.partner').create(partner_data)
         # Log message translated
         logging.info(f"[donors_bp] Partner created successfully in Odoo! ID: {new_partner_id}")
+        # Selectable in the donor pickers right away
+        get_donor_index().add({'id': new_partner_id, 'name': name, 'email': email, 'phone': phone, 'is_company': False})
          # Flash message translated
         flash(f'Donor/Volunteer "{name}" added successfully to Odoo (ID: {new_partner_id}).', 'success')
 
@@ -110,11 +126,73 @@ def add_donor_submit():
     return redirect(url_for('donors.add_donor_form'))
 
 
+# --- Route for the BULK donor import (CSV / vCard upload) ---
+@donors_bp.route('/import_donors', methods=['GET', 'POST'])
+def import_donors():
+    """
+    GET shows the upload form. POST streams the file, checks each chunk of
+    rows against existing emails with one search_read and creates the new
+    contacts in batched create calls.
+    """
+    if request.method == 'GET':
+        return render_template('import_donors.html', report=None)
+
+    upload = request.files.get('import_file')
+    if not upload or not upload.filename:
+        flash('Select a CSV or vCard file to import.', 'error')
+        return redirect(url_for('donors.import_donors'))
+
+    client = get_odoo_client()
+    if not client:
+        flash('Odoo connection error. Could not import donors.', 'error')
+        return redirect(url_for('donors.import_donors'))
+
+    timer = StepTimer(f"import_donors '{upload.filename}'")
+    report = None
+    try:
+        rows = iter_donor_rows(upload)
+        report = import_donor_rows(client, rows, timer=timer)
+    except DonorImportError as e:
+        logging.warning(f"[donors_bp] Import file '{upload.filename}' rejected: {e}")
+        flash(f'Could not read the file: {e}', 'error')
+    except UnicodeDecodeError as e:
+        logging.warning(f"[donors_bp] Import file '{upload.filename}' is not UTF-8: {e}")
+        flash('Could not read the file: it must be UTF-8 encoded.', 'error')
+    except odoorpc.error.RPCError as e:
+        logging.error(f"[donors_bp] RPC Error importing donors: {e}", exc_info=True)
+        flash(f'Odoo RPC Error importing donors: {e}', 'error')
+    except Exception as e:
+        logging.error(f"[donors_bp] Unexpected error importing donors: {e}", exc_info=True)
+        flash(f'Unexpected server error importing donors: {e}', 'error')
+
+    logging.info(f"[donors_bp] Timings: {timer.summary()}")
+
+    if report is None:
+        return redirect(url_for('donors.import_donors'))
+
+    # Selectable in the donor pickers right away
+    index = get_donor_index()
+    for partner in report['created']:
+        index.add(partner)
+
+    counts = report['counts']
+    if report['read_error']:
+        flash(report['read_error'], 'error')
+    if counts['created']:
+        flash(f"{counts['created']} donor(s)/volunteer(s) added to Odoo.", 'success')
+    else:
+        flash('No new donors were created (see the report below).', 'info')
+    return render_template('import_donors.html', report=report)
+
+
 # --- NEW ROUTE TO LIST DONORS --- Comment translated
 @donors_bp.route('/list_donors')
 def list_donors():
     donors = []
+    page = None
     error_message = None
+    # The index always knows the total, so ?count=1 is not needed here
+    page_number, page_size, _ = get_page_args(request.args)
 
     client = get_odoo_client()
     if not client:
@@ -123,24 +201,18 @@ def list_donors():
          # Error message translated
         error_message = "Odoo connection error."
         # Render anyway to show error in list template Comment translated
-        return render_template('list_donors.html', donors=donors, error_message=error_message)
+        return render_template('list_donors.html', donors=donors, page=page, error_message=error_message)
 
     try:
         # Log message translated
-        logging.info("[donors_bp] Attempting to search and read donors (partners) from Odoo...")
-        # Search for partners who are individuals Comment translated
-        # Read id, name, email, phone fields. Limit just in case. Comment translated
-        # Note: We could sort from the search with 'order="name asc"' Comment translated
-        partner_ids = client.env['res.partner'].search([('company_type', '=', 'person')], limit=100, order="name asc")
+        logging.info("[donors_bp] Reading a page of donors from the in-memory contact index...")
+        # Partners who are individuals, sorted by name, served as a slice of the index
+        donors, total = get_donor_index().page(client, page_number, page_size)
+        page = Page(donors, page_number, page_size, has_next=page_number * page_size < total, total=total)
         # Log message translated
-        logging.info(f"[donors_bp] Partner IDs found: {partner_ids}")
+        logging.info(f"[donors_bp] {len(donors)} partners read (page {page_number} of {page.total_pages}).")
 
-        if partner_ids:
-            donors = client.env['res.partner'].read(partner_ids, ['id', 'name', 'email', 'phone'])
-             # Log message translated
-            logging.info(f"[donors_bp] Partner data read: {donors}")
-            # Search already sorted them by name if 'order' was specified Comment translated
-        else:
+        if not donors and page_number == 1:
             # Log message translated
             logging.info("[donors_bp] No partners of type 'person' found.")
             # Flash message translated
@@ -160,4 +232,32 @@ def list_donors():
         flash(error_message, 'error')
 
     # Render template passing donor list and possible error Comment translated
-    return render_template('list_donors.html', donors=donors, error_message=error_message)
\ No newline at end of file
+    return render_template('list_donors.html', donors=donors, page=page, error_message=error_message)
+
+
+@donors_bp.route('/api/donors/search')
+def search_donors_api():
+    """
+    Typeahead for the donor pickers: donors whose name or email matches q
+    (prefix matches first, then the other donors matching anywhere), answered
+    from the in-memory donor index.
+    Query string: q, limit (max 100), offset (next results while scrolling).
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers."}), 400
+
+    client = get_odoo_client()
+    if not client:
+        return jsonify({"error": "Odoo connection error."}), 503
+    try:
+        donors, has_more = get_donor_index().search(client, request.args.get('q', ''), limit=limit, offset=offset)
+    except odoorpc.error.RPCError as e:
+        logging.error(f"[donors_bp GET /api/donors/search] RPC Error loading the donor index: {e}", exc_info=True)
+        return jsonify({"error": f"RPC Error communicating with Odoo: {e}"}), 502
+    except Exception as e:
+        logging.error(f"[donors_bp GET /api/donors/search] Unexpected error: {e}", exc_info=True)
+        return jsonify({"error": f"Unexpected server error: {e}"}), 500
+    return jsonify({'results': [donor.as_dict() for donor in donors], 'has_more': has_more, 'offset': offset})
@@ -1,7 +1,12 @@
 # ong_app/routes_main.py
-from flask import Blueprint, render_template, jsonify, redirect, url_for
+from flask import Blueprint, render_template, jsonify, redirect, url_for, flash
 # Import the connection function Translated comment
 from .odoo_connector import get_odoo_client 
+from .odoo_refdata import invalidate_reference_data
+from .dashboard import TagCountsCache
+from .book_lifecycle import IN_TRANSIT_STATES, STATES
+from .routes_books import (LIST_ALL_LOGISTICS_TAGS, TAG_ID_LOGISTICS_READY,
+                           TAG_ID_LOGISTICS_DELIVERED)
 import logging
 # Import to handle specific Odoo exceptions Translated comment
 import odoorpc 
@@ -11,10 +16,19 @@ import odoorpc
 main_bp = Blueprint('main', __name__)
 
 
-# Renaming these later (e.g., TAG_ID_PENDING) would be consistent
-TAG_ID_PENDIENTE_MAIN = 4 # ID for Pending (as used in routes_books)
-TAG_ID_APROBADO_MAIN = 5  # ID for Approved
-TAG_ID_RECHAZADO_MAIN = 6 # ID for Rejected
+# Review tags, from the same definition as routes_books (book_lifecycle.STATES)
+TAG_ID_PENDIENTE_MAIN = STATES['pending']
+TAG_ID_APROBADO_MAIN = STATES['approved']
+TAG_ID_RECHAZADO_MAIN = STATES['rejected']
+
+# A book may carry the generic and a per-destination in-transit tag: counted once
+TAG_IDS_IN_TRANSIT_MAIN = tuple(STATES[state] for state in IN_TRANSIT_STATES)
+
+# Review tags + logistics tags, all counted by the same read_group
+_tag_counts_cache = TagCountsCache(
+    [TAG_ID_PENDIENTE_MAIN, TAG_ID_APROBADO_MAIN, TAG_ID_RECHAZADO_MAIN] + LIST_ALL_LOGISTICS_TAGS,
+    any_of=[TAG_IDS_IN_TRANSIT_MAIN],
+)
 
 
 
@@ -30,32 +44,29 @@ def index():
     counts = {
         'pending': 0,
         'approved': 0,
-        'rejected': 0
+        'rejected': 0,
+        'ready': 0,
+        'in_transit': 0,
+        'delivered': 0,
     }
      # For specific counting errors Translated comment
     count_error = None 
 
     if client:
-        # Log messages translated
-        logging.info("[main_bp index] **VERIFYING LOCAL IDs TO USE:**") 
-        logging.info(f"  - PENDING_MAIN = {TAG_ID_PENDIENTE_MAIN}")
-        logging.info(f"  - APPROVED_MAIN  = {TAG_ID_APROBADO_MAIN}")
-        logging.info(f"  - REJECTED_MAIN = {TAG_ID_RECHAZADO_MAIN}")
-        
-        logging.info("[main_bp index] Odoo client connected, getting counts...")
+        logging.info("[main_bp index] Odoo client connected, getting counts (one read_group, cached)...")
         try:
-            # Using product.template to count, as tags are there
-            ProductTemplateModel = client.env['product.template'] 
-            
-            # Use LOCAL '_MAIN' constants
-            counts['pending'] = ProductTemplateModel.search_count([('product_tag_ids', '=', TAG_ID_PENDIENTE_MAIN)])
-            logging.info(f"[main_bp index] >> RESULT search_count Pending (ID={TAG_ID_PENDIENTE_MAIN}): {counts['pending']}")
+            # One read_group over product_tag_ids on product.template (tags are there),
+            # served from a short-lived cache refreshed in the background
+            tag_counts, age = _tag_counts_cache.get(client)
+            logging.info(f"[main_bp index] >> Tag counts (age {age:.0f}s): {tag_counts}")
 
-            counts['approved'] = ProductTemplateModel.search_count([('product_tag_ids', '=', TAG_ID_APROBADO_MAIN)])
-            logging.info(f"[main_bp index] >> RESULT search_count Approved (ID={TAG_ID_APROBADO_MAIN}): {counts['approved']}")
-            
-            counts['rejected'] = ProductTemplateModel.search_count([('product_tag_ids', '=', TAG_ID_RECHAZADO_MAIN)])
-            logging.info(f"[main_bp index] >> RESULT search_count Rejected (ID={TAG_ID_RECHAZADO_MAIN}): {counts['rejected']}")
+            # Use LOCAL '_MAIN' constants
+            counts['pending'] = tag_counts[TAG_ID_PENDIENTE_MAIN]
+            counts['approved'] = tag_counts[TAG_ID_APROBADO_MAIN]
+            counts['rejected'] = tag_counts[TAG_ID_RECHAZADO_MAIN]
+            counts['ready'] = tag_counts[TAG_ID_LOGISTICS_READY]
+            counts['in_transit'] = tag_counts[TAG_IDS_IN_TRANSIT_MAIN]
+            counts['delivered'] = tag_counts[TAG_ID_LOGISTICS_DELIVERED]
 
         except odoorpc.error.RPCError as e:
              # Log message translated
@@ -89,6 +100,13 @@ def index():
                            count_fetch_error=count_error # Specific count error <-- Pass count error
                            )
 
+# --- Forget the cached reference data (after changing tags/locations/operation types in Odoo) ---
+@main_bp.route('/reference_data/refresh', methods=['POST'])
+def refresh_reference_data():
+    dropped = invalidate_reference_data()
+    flash(f'Reference data cache cleared ({dropped} entries). It will be reloaded from Odoo on next use.', 'success')
+    return redirect(url_for('main.index'))
+
 # --- ODOO TEST ROUTE --- Translated comment
 @main_bp.route('/api/odoo_version')
 def odoo_version_test():
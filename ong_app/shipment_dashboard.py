@@ -0,0 +1,145 @@
+# ong_app/shipment_dashboard.py
+"""
+Shipment tracking dashboard: counts per state and the pickings that changed.
+
+Logistics staff keep the shipments page open all day and it polls the
+dashboard API. Each poll costs at most:
+
+- one version probe (latest write_date and number of shipment pickings, two
+  tiny calls in one RpcBatch round-trip), shared by every poll made within
+  DASHBOARD_VERSION_TTL seconds. The version is the ETag: when it matches the
+  client's If-None-Match, nothing else is read and the answer is a 304;
+- otherwise one read_group by state (the counts, computed by Odoo) and one
+  search_read of the pickings written since the client's cursor, in parallel.
+
+A probe shared for a few seconds can only delay a change, never hide it: the
+version it returns is at most as new as the data read after it.
+
+The cursor is the latest write_date the client has seen. Pickings written at
+that same second are sent again (write_date >= cursor): the client replaces
+rows by ID, so a repeat is harmless while a strict '>' could miss a write.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from .odoo_batch import RpcBatch
+from .odoo_refdata import ref_id
+
+# Seconds one version probe is shared by all polls
+DASHBOARD_VERSION_TTL = float(os.environ.get('SHIPMENT_DASHBOARD_VERSION_TTL', 5))
+# Maximum pickings returned by one poll (the client polls again when 'more' is set)
+DASHBOARD_CHANGES_LIMIT = 200
+# Pickings returned when the client has no cursor yet (same size as the default page)
+DASHBOARD_INITIAL_LIMIT = 50
+
+# Fields of each returned picking (same as the shipping_management list, plus write_date)
+DASHBOARD_FIELDS = ['id', 'name', 'state', 'origin', 'location_id', 'location_dest_id',
+                    'scheduled_date', 'write_date']
+
+# Display order of the states (Odoo 16 stock.picking)
+PICKING_STATES = ['draft', 'waiting', 'confirmed', 'assigned', 'done', 'cancel']
+
+
+def _shipment_domain(client):
+    return [('picking_type_id', '=', ref_id(client, 'shipment_picking_type'))]
+
+
+def fetch_version(client):
+    """
+    Version of the shipment list: changes whenever a shipment picking is
+    created, written or deleted.
+
+    :param client: Connected odoorpc client instance.
+    :return: Dict with 'etag' (unquoted ETag value) and 'last_write' (latest write_date or None).
+    """
+    domain = _shipment_domain(client)
+    batch = RpcBatch(client, label='shipment dashboard version')
+    batch.add_kw('last', 'stock.picking', 'search_read', [domain],
+                 {'fields': ['write_date'], 'order': 'write_date desc', 'limit': 1})
+    # The count catches deletions, which do not move the latest write_date
+    batch.add_kw('count', 'stock.picking', 'search_count', [domain])
+    batch.run()
+    last = batch.result('last')
+    last_write = last[0]['write_date'] if last else None
+    digest = hashlib.sha1(f"{domain[0][2]}|{last_write}|{batch.result('count')}".encode()).hexdigest()[:16]
+    return {'etag': digest, 'last_write': last_write}
+
+
+class VersionProbe:
+    """
+    fetch_version() shared by the polls of the last ttl seconds, so a room full
+    of open dashboards makes one probe per period instead of one per poll.
+
+    :param ttl: Seconds a probe result is reused.
+    """
+
+    def __init__(self, ttl=DASHBOARD_VERSION_TTL):
+        self.ttl = ttl
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, client):
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at <= self.ttl:
+                return self._version
+        version = fetch_version(client)
+        with self._lock:
+            self._version = version
+            self._checked_at = time.monotonic()
+        return version
+
+
+def fetch_dashboard(client, since=None):
+    """
+    Counts per state and the pickings changed since a cursor, in one round-trip.
+
+    :param client: Connected odoorpc client instance.
+    :param since: Latest write_date already seen by the client ('YYYY-MM-DD HH:MM:SS'),
+                  or None for the first poll (latest DASHBOARD_INITIAL_LIMIT pickings).
+    :return: Dict with 'counts' ({state: count}, every state of PICKING_STATES),
+             'total', 'pickings' (oldest change first when since is given),
+             'cursor' (to send as since next time), 'more' (more changes are waiting) and
+             'reload' (too many changes at the cursor's second: reload the whole list).
+    """
+    domain = _shipment_domain(client)
+    batch = RpcBatch(client, label='shipment dashboard')
+    batch.add_kw('counts', 'stock.picking', 'read_group', [domain, ['state'], ['state']], {'lazy': False})
+    if since:
+        limit = DASHBOARD_CHANGES_LIMIT
+        batch.add_kw('pickings', 'stock.picking', 'search_read', [domain + [('write_date', '>=', since)]],
+                     {'fields': DASHBOARD_FIELDS, 'order': 'write_date asc, id asc', 'limit': limit})
+    else:
+        limit = DASHBOARD_INITIAL_LIMIT
+        batch.add_kw('pickings', 'stock.picking', 'search_read', [domain],
+                     {'fields': DASHBOARD_FIELDS, 'order': 'write_date desc, id desc', 'limit': limit})
+    batch.run()
+
+    counts = dict.fromkeys(PICKING_STATES, 0)
+    for group in batch.result('counts'):
+        counts[group['state']] = group.get('__count', group.get('state_count', 0))
+    pickings = batch.result('pickings')
+    write_dates = [picking['write_date'] for picking in pickings if picking.get('write_date')]
+    cursor = max(write_dates) if write_dates else since
+    # A full page of changes: the rest comes with the next poll, from the new cursor,
+    # unless the whole page was written in the cursor's second (it would never move)
+    full_page = bool(since) and len(pickings) >= limit
+    return {
+        'counts': counts,
+        'total': sum(counts.values()),
+        'pickings': pickings,
+        'cursor': cursor,
+        'more': full_page and cursor != since,
+        'reload': full_page and cursor == since,
+    }
+
+
+# Single probe shared by all requests
+_probe = VersionProbe()
+
+
+def get_version_probe():
+    """The process-wide VersionProbe instance."""
+    return _probe
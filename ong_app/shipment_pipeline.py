@@ -0,0 +1,312 @@
+# ong_app/shipment_pipeline.py
+"""
+"Ship now": confirm, reserve and validate transfers in one operation.
+
+The shipment list used to need three POSTs per picking (Confirm, Reserve
+Stock, then Validate from the details page). ship_pickings runs the whole
+chain for any number of pickings with a fixed number of calls:
+
+1. one read of their state;
+2. one action_assign on all of them (it confirms the drafts itself);
+3. one parallel round-trip (RpcBatch) reading the new states and the move lines;
+4. one qty_done write per distinct reserved quantity (done = reserved);
+5. one button_validate on every fully reserved picking;
+6. one read of the final states.
+
+A list call that fails (e.g. one picking blocks the whole action) is retried
+picking by picking, so one bad transfer does not stop the others. Every
+picking gets an outcome in the returned report.
+
+validate_pickings is the end of that chain on its own (end-of-day
+validation of already reserved pickings). When button_validate answers with
+a wizard instead of validating (stock.immediate.transfer: nothing marked as
+done; stock.backorder.confirmation: less done than planned), the wizard is
+created and processed for all the pickings it covers at once, as a user
+clicking "Apply" / "Create Backorder" would.
+"""
+import logging
+from collections import OrderedDict
+
+from odoorpc.error import RPCError
+
+from .odoo_batch import RpcBatch, StepTimer
+
+# Reserved quantity of a stock.move.line, in the line's unit of measure (Odoo 16)
+RESERVED_QTY_FIELD = 'reserved_uom_qty'
+
+# Validation wizards answered automatically -> method of the "yes" button
+VALIDATION_WIZARDS = {
+    'stock.immediate.transfer': 'process',
+    'stock.backorder.confirmation': 'process',
+}
+# Backorder wizard button used when no backorder is wanted
+NO_BACKORDER_METHOD = 'process_cancel_backorder'
+# An immediate transfer can be followed by a backorder question: a few rounds at most
+MAX_WIZARD_ROUNDS = 3
+
+# Outcomes of a picking
+SHIP_DONE = 'done'
+SHIP_SKIPPED = 'skipped'
+SHIP_WAITING = 'waiting'
+SHIP_WIZARD = 'wizard'
+SHIP_ERROR = 'error'
+
+
+def _outcome(picking_id):
+    return {'id': picking_id, 'name': f'ID {picking_id}', 'state_before': None, 'state': None,
+            'status': None, 'message': ''}
+
+
+def _call_each(client, method, picking_ids, outcomes, timer):
+    """
+    Calls method on all picking_ids at once; if Odoo rejects the call, retries
+    picking by picking so only the faulty ones are marked as errors.
+
+    :return: {picking ID: result} of the pickings the call succeeded for.
+    """
+    if not picking_ids:
+        return {}
+    try:
+        with timer.step(f'{method} ({len(picking_ids)})'):
+            result = client.execute_kw('stock.picking', method, [picking_ids])
+        return {picking_id: result for picking_id in picking_ids}
+    except RPCError as e:
+        if len(picking_ids) == 1:
+            _fail(outcomes[picking_ids[0]], method, e)
+            return {}
+        logging.warning(f"[shipment_pipeline] '{method}' failed for {len(picking_ids)} pickings, retrying one by one: {e}")
+    results = {}
+    with timer.step(f'{method} one by one'):
+        for picking_id in picking_ids:
+            try:
+                results[picking_id] = client.execute_kw('stock.picking', method, [[picking_id]])
+            except RPCError as e:
+                _fail(outcomes[picking_id], method, e)
+    return results
+
+
+def _fail(outcome, step, error):
+    # First line of the Odoo message is the readable part
+    message = str(error.args[0]) if error.args and isinstance(error.args[0], str) else str(error)
+    message = message.split('\n')[0]
+    logging.error(f"[shipment_pipeline] '{step}' failed for picking {outcome['name']}: {error}")
+    outcome.update(status=SHIP_ERROR, message=f"{step}: {message}")
+
+
+def fill_qty_done(client, move_lines, timer):
+    """
+    Sets qty_done = reserved quantity on move_lines (dicts with id, qty_done and
+    RESERVED_QTY_FIELD): one write per distinct quantity.
+
+    :return: Number of move lines written.
+    """
+    ids_by_qty = {}
+    for move_line in move_lines:
+        reserved = move_line.get(RESERVED_QTY_FIELD) or 0.0
+        if reserved > 0 and move_line.get('qty_done') != reserved:
+            ids_by_qty.setdefault(reserved, []).append(move_line['id'])
+    for qty, move_line_ids in ids_by_qty.items():
+        with timer.step(f'write qty_done={qty} ({len(move_line_ids)})'):
+            client.execute_kw('stock.move.line', 'write', [move_line_ids, {'qty_done': qty}])
+    return sum(len(move_line_ids) for move_line_ids in ids_by_qty.values())
+
+
+def ship_pickings(client, picking_ids, timer=None):
+    """
+    Confirms, reserves and validates pickings, as far as each one can go.
+
+    :param client: Connected odoorpc client instance.
+    :param picking_ids: stock.picking IDs.
+    :param timer: Optional StepTimer collecting per-step timings.
+    :return: List of outcome dicts (id, name, state_before, state, status, message), in
+             the order of picking_ids. status is SHIP_DONE, SHIP_SKIPPED (already done or
+             cancelled), SHIP_WAITING (stock not fully reserved), SHIP_WIZARD (Odoo asks
+             for a confirmation) or SHIP_ERROR.
+    """
+    if timer is None:
+        timer = StepTimer('ship_pickings')
+    picking_ids = list(dict.fromkeys(picking_ids))
+    outcomes = OrderedDict((picking_id, _outcome(picking_id)) for picking_id in picking_ids)
+    if not picking_ids:
+        return []
+
+    # 1. Current state
+    with timer.step('read pickings'):
+        # search_read (not read): IDs that no longer exist are simply missing from the answer
+        pickings = client.execute_kw('stock.picking', 'search_read', [[('id', 'in', picking_ids)]],
+                                     {'fields': ['name', 'state']})
+    for picking in pickings:
+        outcomes[picking['id']].update(name=picking['name'], state_before=picking['state'], state=picking['state'])
+    for outcome in outcomes.values():
+        if outcome['state_before'] is None:
+            outcome.update(status=SHIP_ERROR, message='Transfer not found.')
+        elif outcome['state_before'] in ('done', 'cancel'):
+            outcome.update(status=SHIP_SKIPPED, message=f"Already {outcome['state_before']}.")
+    pending = [picking_id for picking_id, outcome in outcomes.items() if outcome['status'] is None]
+
+    # 2. Confirm + reserve (action_assign confirms draft pickings first)
+    assigned = list(_call_each(client, 'action_assign', pending, outcomes, timer))
+
+    # 3. New states and move lines, in one parallel round-trip
+    if assigned:
+        batch = RpcBatch(client, timer=timer, label='read states + move lines')
+        batch.add_kw('pickings', 'stock.picking', 'read', [assigned], {'fields': ['state']})
+        batch.add_kw('move_lines', 'stock.move.line', 'search_read', [[('picking_id', 'in', assigned)]],
+                     {'fields': ['picking_id', 'qty_done', RESERVED_QTY_FIELD]})
+        batch.run()
+        for picking in batch.result('pickings'):
+            outcomes[picking['id']]['state'] = picking['state']
+        move_lines = batch.result('move_lines')
+    else:
+        move_lines = []
+
+    # Only fully reserved pickings are validated (a partial one would need a backorder decision)
+    ready = []
+    for picking_id in assigned:
+        outcome = outcomes[picking_id]
+        if outcome['state'] == 'assigned':
+            ready.append(picking_id)
+        else:
+            outcome.update(status=SHIP_WAITING, message=f"Stock not fully available (state '{outcome['state']}').")
+
+    # 4-6. Done quantities = reserved quantities, validate, final states
+    ready_set = set(ready)
+    _validate(client, ready, [move_line for move_line in move_lines if move_line['picking_id'][0] in ready_set],
+              outcomes, timer)
+
+    summary = ', '.join(f"{outcome['name']}={outcome['status']}" for outcome in outcomes.values())
+    logging.info(f"[shipment_pipeline] {len(picking_ids)} picking(s): {summary}")
+    return list(outcomes.values())
+
+
+def process_validation_wizards(client, action, create_backorder=True, timer=None):
+    """
+    Answers the wizards returned by button_validate (see VALIDATION_WIZARDS).
+    The wizard's context names every picking it covers, so one create + one
+    process call answer it for all of them.
+
+    :param client: Connected odoorpc client instance.
+    :param action: Result of button_validate.
+    :param create_backorder: Backorder wizard: True keeps the missing quantities in a
+                             new transfer, False drops them.
+    :param timer: Optional StepTimer collecting per-step timings.
+    :return: The last result: True when everything was processed, else the action dict
+             of a wizard that could not be answered.
+    """
+    if timer is None:
+        timer = StepTimer('validation_wizards')
+    for _ in range(MAX_WIZARD_ROUNDS):
+        if not isinstance(action, dict) or action.get('res_model') not in VALIDATION_WIZARDS:
+            return action
+        model = action['res_model']
+        context = action.get('context') or {}
+        method = VALIDATION_WIZARDS[model]
+        if model == 'stock.backorder.confirmation' and not create_backorder:
+            method = NO_BACKORDER_METHOD
+        with timer.step(f'{model}.{method}'):
+            # Wizard defaults (pickings, lines) come from the action's context
+            wizard_id = client.execute_kw(model, 'create', [{}], {'context': context})
+            action = client.execute_kw(model, method, [[wizard_id]], {'context': context})
+        logging.info(f"[shipment_pipeline] Wizard {model} answered with '{method}' "
+                     f"for pickings {context.get('button_validate_picking_ids')}.")
+    return action
+
+
+def _validate(client, picking_ids, move_lines, outcomes, timer, quantities=None, create_backorder=True):
+    """
+    Sets the done quantities, validates picking_ids with one button_validate,
+    answers the wizards and reads the final states (updates outcomes).
+
+    :param move_lines: Move lines of picking_ids (id, qty_done, RESERVED_QTY_FIELD).
+    :param quantities: Optional {move line ID: done quantity}; default: the reserved quantity.
+    """
+    if quantities:
+        ids_by_qty = {}
+        for move_line in move_lines:
+            if move_line['id'] in quantities and move_line.get('qty_done') != quantities[move_line['id']]:
+                ids_by_qty.setdefault(quantities[move_line['id']], []).append(move_line['id'])
+        for qty, move_line_ids in ids_by_qty.items():
+            with timer.step(f'write qty_done={qty} ({len(move_line_ids)})'):
+                client.execute_kw('stock.move.line', 'write', [move_line_ids, {'qty_done': qty}])
+    else:
+        fill_qty_done(client, move_lines, timer)
+
+    validated = _call_each(client, 'button_validate', picking_ids, outcomes, timer)
+    # A list call returns ONE answer for all its pickings: answer each distinct wizard once
+    answers = {}
+    for picking_id, result in validated.items():
+        if isinstance(result, dict):
+            answers.setdefault(id(result), (result, []))[1].append(picking_id)
+    for result, wizard_picking_ids in answers.values():
+        try:
+            final = process_validation_wizards(client, result, create_backorder=create_backorder, timer=timer)
+        except RPCError as e:
+            for picking_id in wizard_picking_ids:
+                _fail(outcomes[picking_id], result.get('res_model', 'wizard'), e)
+            continue
+        if isinstance(final, dict):
+            for picking_id in wizard_picking_ids:
+                outcomes[picking_id].update(status=SHIP_WIZARD,
+                                            message=f"Odoo asks for a confirmation ({final.get('res_model', 'wizard')}).")
+
+    if validated:
+        with timer.step('read final states'):
+            final_states = client.execute_kw('stock.picking', 'read', [list(validated)], {'fields': ['state']})
+        for picking in final_states:
+            outcome = outcomes[picking['id']]
+            outcome['state'] = picking['state']
+            if outcome['status'] is None:
+                if picking['state'] == 'done':
+                    outcome.update(status=SHIP_DONE, message='Shipped.')
+                else:
+                    outcome.update(status=SHIP_WAITING, message=f"Validated, but state is '{picking['state']}'.")
+
+
+def validate_pickings(client, picking_ids, quantities=None, create_backorder=True, timer=None):
+    """
+    Validates many pickings at once: one state read, one move line read, one
+    qty_done write per distinct quantity, ONE button_validate for the whole
+    list, the wizards answered in batch, one final state read.
+
+    :param client: Connected odoorpc client instance.
+    :param picking_ids: stock.picking IDs.
+    :param quantities: Optional {move line ID: done quantity}; lines not listed (and all
+                       lines by default) are done with their reserved quantity.
+    :param create_backorder: What to answer when less is done than planned.
+    :param timer: Optional StepTimer collecting per-step timings.
+    :return: List of outcome dicts, as ship_pickings.
+    """
+    if timer is None:
+        timer = StepTimer('validate_pickings')
+    picking_ids = list(dict.fromkeys(picking_ids))
+    outcomes = OrderedDict((picking_id, _outcome(picking_id)) for picking_id in picking_ids)
+    if not picking_ids:
+        return []
+
+    with timer.step('read pickings'):
+        pickings = client.execute_kw('stock.picking', 'search_read', [[('id', 'in', picking_ids)]],
+                                     {'fields': ['name', 'state']})
+    for picking in pickings:
+        outcomes[picking['id']].update(name=picking['name'], state_before=picking['state'], state=picking['state'])
+    for outcome in outcomes.values():
+        if outcome['state_before'] is None:
+            outcome.update(status=SHIP_ERROR, message='Transfer not found.')
+        elif outcome['state_before'] in ('done', 'cancel'):
+            outcome.update(status=SHIP_SKIPPED, message=f"Already {outcome['state_before']}.")
+        elif outcome['state_before'] == 'draft':
+            outcome.update(status=SHIP_WAITING, message='Draft: confirm and reserve it first (or use Ship Now).')
+    pending = [picking_id for picking_id, outcome in outcomes.items() if outcome['status'] is None]
+
+    move_lines = []
+    if pending:
+        with timer.step('read move lines'):
+            move_lines = client.execute_kw('stock.move.line', 'search_read', [[('picking_id', 'in', pending)]],
+                                           {'fields': ['qty_done', RESERVED_QTY_FIELD]})
+    if quantities:
+        # Listed lines get their quantity, the others their reserved quantity
+        fill_qty_done(client, [move_line for move_line in move_lines if move_line['id'] not in quantities], timer)
+    _validate(client, pending, move_lines, outcomes, timer, quantities=quantities, create_backorder=create_backorder)
+
+    summary = ', '.join(f"{outcome['name']}={outcome['status']}" for outcome in outcomes.values())
+    logging.info(f"[shipment_pipeline] Validated {len(picking_ids)} picking(s): {summary}")
+    return list(outcomes.values())
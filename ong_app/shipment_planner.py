@@ -0,0 +1,146 @@
+# ong_app/shipment_planner.py
+"""
+Shipment planner: the whole approved queue shipped in one planned operation.
+
+create_batch_shipment builds one picking for the books ticked on one page.
+To prepare a container, the planner instead takes every approved book that
+is not in the logistics flow yet, lets each one be assigned a destination
+branch (or a default one), and then:
+
+- reads the queue ONCE (names, templates and tags, with STATE_FIELDS);
+- creates one stock.picking per destination in ONE multi-record create;
+- removes the Approved tag (the 'ship' transition) with one write per
+  distinct command list, planned from the tags read up front (no re-read).
+"""
+import logging
+from collections import OrderedDict
+
+from .book_lifecycle import LOGISTICS_STATES, STATE_FIELDS, STATES, TRANSITIONS, plan_transition
+from .dashboard import invalidate_tag_counts
+from .odoo_batch import StepTimer
+from .odoo_refdata import ref_id
+
+# Destination branches (stock.location ID -> label), in display order
+BRANCH_DESTINATIONS = OrderedDict([
+    (29, 'EC - Quito'),
+    (34, 'VEN - Canaima Amazonas'),
+    (35, 'VEN - Andes (Tachira)'),
+    (32, 'Geneva Branch (Switzerland)'),
+])
+
+# Approved books not yet in the logistics flow (same queue as the approved_books view)
+APPROVED_QUEUE_DOMAIN = [
+    ('product_tag_ids', '=', STATES['approved']),
+    ('product_tag_ids', 'not in', [STATES[state] for state in LOGISTICS_STATES]),
+]
+
+
+def fetch_approved_queue(client):
+    """
+    Every book of the shipment queue, in one search_read.
+
+    :param client: Connected odoorpc client instance.
+    :return: List of product.product dicts (STATE_FIELDS + default_code), by name.
+    """
+    return client.execute_kw('product.product', 'search_read', [APPROVED_QUEUE_DOMAIN],
+                             {'fields': STATE_FIELDS + ['default_code'], 'order': 'name asc, id asc'})
+
+
+def plan_shipments(books, assignments, default_destination=None, shown_ids=()):
+    """
+    Groups the queue by destination.
+
+    The default destination only applies to the books the user saw on the
+    page (shown_ids): a book approved after the page was loaded stays in the
+    queue until it is planned explicitly.
+
+    :param books: Records from fetch_approved_queue().
+    :param assignments: {product ID: destination location ID or None}.
+    :param default_destination: Destination of the shown books without an assignment
+                                (None: they stay in the queue).
+    :param shown_ids: IDs of the books listed on the planner page.
+    :return: OrderedDict {destination ID: [books]} in BRANCH_DESTINATIONS order, and
+             the list of books left in the queue.
+    """
+    groups = OrderedDict((destination_id, []) for destination_id in BRANCH_DESTINATIONS)
+    unplanned = []
+    shown_ids = set(shown_ids)
+    for book in books:
+        destination_id = assignments.get(book['id'])
+        if not destination_id and book['id'] in shown_ids:
+            destination_id = default_destination
+        if destination_id in groups:
+            groups[destination_id].append(book)
+        else:
+            unplanned.append(book)
+    return OrderedDict((key, value) for key, value in groups.items() if value), unplanned
+
+
+def _picking_vals(books, source_location_id, destination_id, picking_type_id):
+    """Same picking and move values as create_batch_shipment (one unit per book)."""
+    return {
+        'picking_type_id': picking_type_id,
+        'location_id': source_location_id,
+        'location_dest_id': destination_id,
+        'origin': f'Shipment Plan from ONG Flask App ({BRANCH_DESTINATIONS[destination_id]})',
+        'move_ids_without_package': [(0, 0, {
+            'name': book.get('name') or f"Book ID {book['id']}",
+            'product_id': book['id'],
+            'product_uom_qty': 1.0,
+            'product_uom': 1,
+            'location_id': source_location_id,
+            'location_dest_id': destination_id,
+        }) for book in books],
+    }
+
+
+def execute_plan(client, groups, timer=None):
+    """
+    Creates the pickings of a plan and takes their books out of the approved queue.
+
+    :param client: Connected odoorpc client instance.
+    :param groups: {destination ID: [books]} from plan_shipments().
+    :param timer: Optional StepTimer collecting per-step timings.
+    :return: Dict with 'pickings' ([{'id', 'destination_id', 'destination', 'books'}]),
+             'shipped' (book count) and 'tag_error' (message if the tags could not be updated).
+    :raises odoorpc.error.RPCError: The pickings could not be created (nothing was created).
+    """
+    if timer is None:
+        timer = StepTimer('shipment_plan')
+    if not groups:
+        return {'pickings': [], 'shipped': 0, 'tag_error': None}
+
+    source_location_id = ref_id(client, 'book_stock_location')
+    picking_type_id = ref_id(client, 'shipment_picking_type')
+    destinations = list(groups)
+    vals_list = [_picking_vals(groups[destination_id], source_location_id, destination_id, picking_type_id)
+                 for destination_id in destinations]
+
+    # ONE create for every picking of the plan (Odoo creates them in one transaction)
+    with timer.step(f'create {len(vals_list)} pickings ({sum(len(books) for books in groups.values())} moves)'):
+        picking_ids = client.execute_kw('stock.picking', 'create', [vals_list])
+    if not isinstance(picking_ids, list):
+        picking_ids = [picking_ids]
+    report = {
+        'pickings': [{'id': picking_id, 'destination_id': destination_id,
+                      'destination': BRANCH_DESTINATIONS[destination_id], 'books': len(groups[destination_id])}
+                     for picking_id, destination_id in zip(picking_ids, destinations)],
+        'shipped': 0,
+        'tag_error': None,
+    }
+
+    # 'ship' transition planned from the tags read with the queue: no second read
+    books = [book for destination_id in destinations for book in groups[destination_id] if book.get('product_tmpl_id')]
+    writes, result = plan_transition(TRANSITIONS['ship'], books)
+    try:
+        for commands, template_ids in writes.items():
+            with timer.step(f'write tags of {len(template_ids)} templates'):
+                client.execute_kw('product.template', 'write', [template_ids, {'product_tag_ids': list(commands)}])
+        report['shipped'] = len(result.updated)
+        invalidate_tag_counts()
+    except Exception as e:
+        # Log message translated
+        logging.error(f"[shipment_planner] Pickings {picking_ids} created but the 'Approved' tag could not be removed: {e}", exc_info=True)
+        report['tag_error'] = f"Shipments created, but the books could not be taken out of the approved queue: {e}"
+    logging.info(f"[shipment_planner] Plan executed: pickings {picking_ids}, {len(result.updated)} book(s) shipped.")
+    return report
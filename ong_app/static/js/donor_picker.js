@@ -0,0 +1,126 @@
+// ong_app/static/js/donor_picker.js
+// Typeahead donor picker (templates/_donor_picker.html).
+// Queries /api/donors/search while typing (debounced) and loads the next
+// page of results when the list is scrolled to the bottom, so the form never
+// receives the whole donor table.
+(function () {
+    var PAGE_SIZE = 30;
+    var DEBOUNCE_MS = 250;
+
+    function initPicker(picker) {
+        var url = picker.dataset.searchUrl;
+        var input = picker.querySelector('.donor-picker-input');
+        var value = picker.querySelector('.donor-picker-value');
+        var nameField = picker.querySelector('.donor-picker-name');
+        var results = picker.querySelector('.donor-picker-results');
+        var query = '';
+        var offset = 0;
+        var hasMore = false;
+        var loading = false;
+        var requestId = 0;
+        var timer = null;
+
+        function choose(donor) {
+            value.value = donor.id;
+            nameField.value = donor.name;
+            input.value = donor.name;
+            // A required picker is only valid once a donor was chosen from the list
+            input.setCustomValidity('');
+            results.hidden = true;
+        }
+
+        function render(donors, append) {
+            if (!append) {
+                results.innerHTML = '';
+            }
+            donors.forEach(function (donor) {
+                var item = document.createElement('div');
+                item.className = 'donor-picker-item';
+                item.setAttribute('role', 'option');
+                item.textContent = donor.name + (donor.email ? ' <' + donor.email + '>' : '') + ' (ID: ' + donor.id + ')';
+                item.addEventListener('click', function () {
+                    choose(donor);
+                });
+                results.appendChild(item);
+            });
+            if (!append && !donors.length) {
+                var empty = document.createElement('div');
+                empty.className = 'donor-picker-empty';
+                empty.textContent = 'No donor found.';
+                results.appendChild(empty);
+            }
+            results.hidden = false;
+        }
+
+        function load(append) {
+            if (loading && append) {
+                return;
+            }
+            loading = true;
+            var current = ++requestId;
+            var params = new URLSearchParams({q: query, limit: PAGE_SIZE, offset: append ? offset : 0});
+            fetch(url + '?' + params.toString(), {headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // Answers to older queries are dropped
+                    if (current !== requestId) {
+                        return;
+                    }
+                    if (data.error) {
+                        results.textContent = data.error;
+                        results.hidden = false;
+                        return;
+                    }
+                    offset = (append ? offset : 0) + data.results.length;
+                    hasMore = data.has_more;
+                    render(data.results, append);
+                })
+                .catch(function (error) {
+                    results.textContent = 'Could not load donors: ' + error;
+                    results.hidden = false;
+                })
+                .finally(function () {
+                    if (current === requestId) {
+                        loading = false;
+                    }
+                });
+        }
+
+        input.addEventListener('input', function () {
+            // Typing again invalidates the previous choice
+            value.value = '';
+            nameField.value = '';
+            if (input.required) {
+                input.setCustomValidity('Select a donor from the list.');
+            }
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                query = input.value.trim();
+                load(false);
+            }, DEBOUNCE_MS);
+        });
+        input.addEventListener('focus', function () {
+            if (!value.value) {
+                query = input.value.trim();
+                load(false);
+            }
+        });
+        input.addEventListener('blur', function () {
+            results.hidden = true;
+        });
+        // Clicking an item or the scrollbar must not blur the input (which hides the list)
+        results.addEventListener('mousedown', function (event) {
+            event.preventDefault();
+        });
+        results.addEventListener('scroll', function () {
+            if (hasMore && !loading && results.scrollTop + results.clientHeight >= results.scrollHeight - 40) {
+                load(true);
+            }
+        });
+        if (input.required) {
+            input.setCustomValidity('Select a donor from the list.');
+        }
+    }
+
+    document.querySelectorAll('.donor-picker').forEach(initPicker);
+})();
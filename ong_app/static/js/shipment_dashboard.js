@@ -0,0 +1,110 @@
+// ong_app/static/js/shipment_dashboard.js
+// Live shipment counts on the shipping_management page.
+// Polls /api/shipments/dashboard with the cursor and ETag of the previous
+// answer: an unchanged list answers 304 without reading any transfer, and
+// only the transfers written since the cursor come back otherwise. Rows whose
+// status changed are highlighted and a notice offers to reload the list
+// (their action buttons depend on the status).
+(function () {
+    var CHANGED_STYLE = '#fff3cd';
+
+    function initDashboard(panel) {
+        var url = panel.dataset.url;
+        var interval = (parseInt(panel.dataset.interval, 10) || 30) * 1000;
+        var notice = document.getElementById('shipment-dashboard-notice');
+        var etag = null;
+        var cursor = null;
+        var changed = {};
+        var timer = null;
+
+        function schedule(delay) {
+            clearTimeout(timer);
+            timer = setTimeout(poll, delay);
+        }
+
+        function showNotice(text) {
+            notice.querySelector('span').textContent = text;
+            notice.hidden = false;
+        }
+
+        function apply(data, firstPoll) {
+            Object.keys(data.counts).forEach(function (state) {
+                var cell = panel.querySelector('[data-state-count="' + state + '"]');
+                if (cell) {
+                    cell.textContent = data.counts[state];
+                }
+            });
+            data.pickings.forEach(function (picking) {
+                var row = document.querySelector('tr[data-picking-id="' + picking.id + '"]');
+                if (row) {
+                    if (row.dataset.state !== picking.state) {
+                        row.style.backgroundColor = CHANGED_STYLE;
+                        changed[picking.id] = true;
+                    }
+                } else if (!firstPoll) {
+                    // New transfer, or one not on this page
+                    changed[picking.id] = true;
+                }
+            });
+            var count = Object.keys(changed).length;
+            if (data.reload) {
+                showNotice('Many shipments changed at once.');
+            } else if (count) {
+                showNotice(count + ' shipment(s) changed since this page was loaded.');
+            }
+        }
+
+        function poll() {
+            if (document.hidden) {
+                schedule(interval);
+                return;
+            }
+            var headers = {'Accept': 'application/json'};
+            if (etag) {
+                headers['If-None-Match'] = etag;
+            }
+            var firstPoll = cursor === null;
+            fetch(url + (cursor ? '?since=' + encodeURIComponent(cursor) : ''), {headers: headers, cache: 'no-store'})
+                .then(function (response) {
+                    if (response.status === 304) {
+                        return null;
+                    }
+                    if (!response.ok) {
+                        throw new Error('HTTP ' + response.status);
+                    }
+                    // No ETag while more changes are waiting: the next poll must not get a 304
+                    etag = response.headers.get('ETag');
+                    return response.json();
+                })
+                .then(function (data) {
+                    if (data) {
+                        apply(data, firstPoll);
+                        if (data.reload) {
+                            // Start again from the latest transfers
+                            cursor = null;
+                            etag = null;
+                        } else {
+                            cursor = data.cursor;
+                        }
+                        if (data.more) {
+                            schedule(0);
+                            return;
+                        }
+                    }
+                    schedule(interval);
+                })
+                .catch(function () {
+                    schedule(interval * 2);
+                });
+        }
+
+        poll();
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var panel = document.getElementById('shipment-dashboard');
+        if (panel) {
+            initDashboard(panel);
+        }
+    });
+})();
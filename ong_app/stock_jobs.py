@@ -0,0 +1,311 @@
+# ong_app/stock_jobs.py
+"""
+Durable background queue for initial-stock receipts.
+
+add_book_submit only records a job (product, quantity, target location) in a
+local SQLite file; a small pool of worker threads runs
+add_initial_stock_via_receipt out-of-band and retries with exponential
+backoff when Odoo fails or is unreachable.
+
+A running job holds a lease: its worker refreshes updated_at while it runs.
+A job still 'running' after its lease expired belonged to a process that
+crashed or was stopped, and is claimed again by any worker. Jobs that
+another live process (or a second app on the same instance/ database) is
+running are left alone.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+from odoorpc.error import RPCError
+
+from .odoo_connector import odoo_session
+from .odoo_inventory_utils import add_initial_stock_via_receipt
+
+# Job states shown in the UI
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_RETRY = 'retry'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Backoff between attempts: BASE * 2^(attempt-1) seconds, capped
+RETRY_BACKOFF_BASE = 5
+RETRY_BACKOFF_MAX = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    product_display_name TEXT,
+    product_uom_id INTEGER,
+    quantity REAL NOT NULL,
+    location_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    picking_id INTEGER,
+    next_run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stock_jobs_pending ON stock_jobs (status, next_run_at);
+"""
+
+
+class StockJobQueue:
+    """
+    SQLite-backed queue of initial-stock jobs.
+
+    Every method opens its own short-lived connection, so the queue can be
+    shared by request threads and worker threads alike.
+
+    :param db_path: Path of the SQLite file (created if missing).
+    :param max_attempts: Attempts before a job is marked as failed.
+    :param lease: Seconds without a heartbeat after which a running job is considered abandoned.
+    """
+
+    def __init__(self, db_path, max_attempts=5, lease=300):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.lease = lease
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, product_id, quantity, location_id, product_display_name=None, product_uom_id=None):
+        """Persist a new job and return its ID."""
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO stock_jobs (product_id, product_display_name, product_uom_id, quantity, location_id,"
+                " status, next_run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (product_id, product_display_name, product_uom_id, quantity, location_id,
+                 STATUS_QUEUED, now, now, now))
+            job_id = cursor.lastrowid
+        logging.info(f"[stock_jobs] Job {job_id} queued: product {product_id}, qty {quantity}, location {location_id}")
+        return job_id
+
+    def claim_next(self):
+        """
+        Atomically take the oldest due job and mark it running. Returns a dict or None.
+        Running jobs whose lease expired (their process is gone) are due again.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM stock_jobs WHERE (status IN (?, ?) AND next_run_at <= ?)"
+                " OR (status = ? AND updated_at < ?) ORDER BY id LIMIT 1",
+                (STATUS_QUEUED, STATUS_RETRY, now, STATUS_RUNNING, now - self.lease)).fetchone()
+            if row is not None and row['status'] == STATUS_RUNNING:
+                logging.warning(f"[stock_jobs] Job {row['id']} abandoned while running (no heartbeat for {self.lease}s); claiming it again.")
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE stock_jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                         (STATUS_RUNNING, now, row['id']))
+            conn.execute("COMMIT")
+            job = dict(row)
+            job['attempts'] += 1
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id):
+        """Renews the lease of a running job."""
+        with self._connection() as conn:
+            conn.execute("UPDATE stock_jobs SET updated_at = ? WHERE id = ? AND status = ?",
+                         (time.time(), job_id, STATUS_RUNNING))
+
+    def mark_done(self, job_id, picking_id=None):
+        self._update(job_id, status=STATUS_DONE, last_error=None, picking_id=picking_id)
+
+    def mark_failed(self, job_id, error):
+        self._update(job_id, status=STATUS_FAILED, last_error=str(error))
+
+    def mark_retry(self, job_id, attempts, error):
+        """Schedule another attempt with exponential backoff, or fail after max_attempts."""
+        if attempts >= self.max_attempts:
+            logging.error(f"[stock_jobs] Job {job_id} failed after {attempts} attempts: {error}")
+            self.mark_failed(job_id, error)
+            return
+        delay = min(RETRY_BACKOFF_BASE * 2 ** (attempts - 1), RETRY_BACKOFF_MAX)
+        logging.warning(f"[stock_jobs] Job {job_id} attempt {attempts} failed ({error}). Retrying in {delay}s.")
+        self._update(job_id, status=STATUS_RETRY, last_error=str(error), next_run_at=time.time() + delay)
+
+    def get(self, job_id):
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM stock_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def recent(self, limit=50):
+        with self._connection() as conn:
+            rows = conn.execute("SELECT * FROM stock_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def _update(self, job_id, **values):
+        values['updated_at'] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._connection() as conn:
+            conn.execute(f"UPDATE stock_jobs SET {assignments} WHERE id = ?", (*values.values(), job_id))
+
+
+def job_origin(job):
+    """Picking origin used for a job; lets a retry find what an earlier attempt left in Odoo."""
+    return f"Initial Stock Entry Auto (Flask): {job['product_display_name'] or job['product_id']} [job {job['id']}]"
+
+
+@contextmanager
+def _keep_lease(queue, job_id):
+    """Renews the job's lease from a side thread while the body runs."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(queue.lease / 3.0):
+            try:
+                queue.heartbeat(job_id)
+            except Exception as e:
+                logging.warning(f"[stock_jobs] Could not renew the lease of job {job_id}: {e}")
+
+    thread = threading.Thread(target=beat, name=f'stock-job-lease-{job_id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+def process_job(queue, job):
+    """Run one job against Odoo and record the outcome in the queue."""
+    job_id = job['id']
+    logging.info(f"[stock_jobs] Processing job {job_id} (attempt {job['attempts']})")
+    try:
+        with _keep_lease(queue, job_id), odoo_session() as client:
+            if client is None:
+                queue.mark_retry(job_id, job['attempts'], "Odoo connection not available")
+                return
+
+            origin = job_origin(job)
+            if job['attempts'] > 1:
+                # A previous attempt may have created (or even validated) its picking before failing
+                previous = client.execute_kw('stock.picking', 'search_read', [[('origin', '=', origin)]],
+                                             {'fields': ['id', 'state']})
+                done = [p['id'] for p in previous if p['state'] == 'done']
+                if done:
+                    logging.info(f"[stock_jobs] Job {job_id} already completed by an earlier attempt (picking {done[0]}).")
+                    queue.mark_done(job_id, picking_id=done[0])
+                    return
+                leftovers = [p['id'] for p in previous if p['state'] != 'cancel']
+                if leftovers:
+                    logging.info(f"[stock_jobs] Cancelling pickings {leftovers} left by an earlier attempt of job {job_id}.")
+                    client.execute_kw('stock.picking', 'action_cancel', [leftovers])
+
+            picking_id = add_initial_stock_via_receipt(
+                client, job['product_id'], job['quantity'], job['location_id'],
+                product_uom_id=job['product_uom_id'],
+                product_display_name=job['product_display_name'],
+                origin=origin,
+                raise_transient_errors=True,
+            )
+    except (RPCError, OSError) as e:
+        queue.mark_retry(job_id, job['attempts'], e)
+        return
+    except Exception as e:
+        logging.error(f"[stock_jobs] Unexpected error processing job {job_id}: {e}", exc_info=True)
+        queue.mark_failed(job_id, e)
+        return
+
+    if picking_id:
+        queue.mark_done(job_id, picking_id=picking_id)
+        logging.info(f"[stock_jobs] Job {job_id} done (picking {picking_id}).")
+    else:
+        # Non-transient problem (missing product info, no move line...): retrying would not help
+        queue.mark_failed(job_id, "add_initial_stock_via_receipt returned False (check logs and Odoo)")
+
+
+class StockJobWorkers:
+    """Pool of daemon threads polling the queue for due jobs."""
+
+    def __init__(self, queue, size=2, poll_interval=1.0):
+        self.queue = queue
+        self.size = size
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._loop, name=f'stock-job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"[stock_jobs] {self.size} worker(s) started.")
+
+    def notify(self):
+        """Wake the workers up right away (called after enqueue)."""
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            try:
+                job = self.queue.claim_next()
+            except Exception as e:
+                logging.error(f"[stock_jobs] Error claiming a job: {e}", exc_info=True)
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            process_job(self.queue, job)
+
+
+def init_stock_jobs(app):
+    """Create the queue (and start its workers) if STOCK_JOBS_ENABLED."""
+    if not app.config.get('STOCK_JOBS_ENABLED'):
+        logging.info("[stock_jobs] Background stock jobs disabled; initial stock runs inline.")
+        return
+    queue = StockJobQueue(app.config['STOCK_JOBS_DB'], max_attempts=app.config['STOCK_JOBS_MAX_ATTEMPTS'],
+                          lease=app.config['STOCK_JOBS_LEASE'])
+    workers = StockJobWorkers(queue, size=app.config['STOCK_JOBS_WORKERS'])
+    workers.start()
+    app.extensions['stock_jobs'] = (queue, workers)
+
+
+def enqueue_initial_stock(product_id, quantity, location_id, product_display_name=None, product_uom_id=None):
+    """
+    Queue an initial-stock receipt for the current app.
+    Returns the job ID, or None if the queue is disabled (caller runs it inline).
+    """
+    queue_and_workers = current_app.extensions.get('stock_jobs')
+    if not queue_and_workers:
+        return None
+    queue, workers = queue_and_workers
+    job_id = queue.enqueue(product_id, quantity, location_id, product_display_name, product_uom_id)
+    workers.notify()
+    return job_id
+
+
+def get_stock_job_queue():
+    """Return the StockJobQueue of the current app, or None if disabled."""
+    queue_and_workers = current_app.extensions.get('stock_jobs')
+    return queue_and_workers[0] if queue_and_workers else None